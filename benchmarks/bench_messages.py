@@ -0,0 +1,61 @@
+# benchmarks/bench_messages.py
+"""
+Compare the legacy inter-stage encoding (full-name JSON, decoded from the
+push body) with the versioned envelope in common/messages.py.
+
+    python benchmarks/bench_messages.py [iterations]
+"""
+
+import base64
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import messages  # noqa: E402
+
+EVENT = {
+    "job_id": "drbfo-uploads__uploads__3950_quarterly-report_final.csv",
+    "bucket": "drbfo-uploads",
+    "blob": "uploads/3950_quarterly-report_final.csv",
+    "name": "uploads/3950_quarterly-report_final.csv",
+    "mime_type": "text/csv",
+    "file_size": 1048576,
+    "ext": ".csv",
+    "classification": "spreadsheets",
+    "lane": "small",
+}
+
+
+def legacy_round_trip():
+    data = json.dumps(EVENT).encode("utf-8")
+    push = {"message": {"data": base64.b64encode(data).decode()}}
+    payload = json.loads(base64.b64decode(push["message"]["data"]).decode("utf-8"))
+    return payload
+
+
+def envelope_round_trip():
+    data, attributes = messages.encode(EVENT)
+    push = {
+        "message": {"data": base64.b64encode(data).decode(), "attributes": attributes}
+    }
+    return messages.decode_push(push)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    legacy_bytes = len(json.dumps(EVENT).encode("utf-8"))
+    data, attributes = messages.encode(EVENT)
+    attr_bytes = sum(len(k) + len(v) for k, v in attributes.items())
+
+    print(f"legacy   body {legacy_bytes:4d} B")
+    print(f"envelope body {len(data):4d} B + attributes {attr_bytes} B")
+    for name, fn in (("legacy", legacy_round_trip), ("envelope", envelope_round_trip)):
+        seconds = timeit.timeit(fn, number=n)
+        print(f"{name:8s} {seconds / n * 1e6:6.2f} µs per encode+decode")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/bench_serialization.py
+"""
+Per-row cost of GET /activity and per-message cost of decoding a push
+request, before and after the fast paths in common/fastjson.py.
+
+Imports the API module, so it needs the same environment as the tests
+(GOOGLE_APPLICATION_CREDENTIALS pointing at any service account file).
+
+    python benchmarks/bench_serialization.py [rows] [messages]
+"""
+
+import base64
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from common import fastjson, messages  # noqa: E402
+from services.api.main import ActivityEvent  # noqa: E402
+
+
+def activity_rows(n: int) -> List[dict]:
+    return [
+        {
+            "id": f"drbfo-uploads__uploads__{i:06d}_report.csv",
+            "timestamp": datetime(2026, 3, 1, 10, i % 60, i % 60, i),
+            "bucket": "drbfo-processed",
+            "object": f"spreadsheets/{i:06d}_report.csv",
+            "status": "processed",
+            "rule_name": "CSV reports",
+            "actions": ["classified:spreadsheets", "moved_to:spreadsheets"],
+            "error_message": None,
+        }
+        for i in range(n)
+    ]
+
+
+_adapter = TypeAdapter(List[ActivityEvent])
+
+
+def activity_validated(rows: List[dict]) -> bytes:
+    # What the endpoint did before: validate each row into a model, then
+    # FastAPI dumps, re-validates and serializes the list for response_model
+    events = [ActivityEvent(**row) for row in rows]
+    content = _adapter.validate_python([e.model_dump() for e in events])
+    return json.dumps(_adapter.dump_python(content, mode="json")).encode("utf-8")
+
+
+def activity_constructed(rows: List[dict]) -> bytes:
+    # model_construct() skips validation but is pure Python in pydantic 2
+    events = [ActivityEvent.model_construct(**row) for row in rows]
+    return fastjson.dumps([e.__dict__ for e in events])
+
+
+def activity_rows_direct(rows: List[dict]) -> bytes:
+    # What the endpoint does now: _activity_event() builds the dicts
+    return fastjson.dumps(rows)
+
+
+def push_body() -> bytes:
+    event = {
+        "job_id": "drbfo-uploads__uploads__3950_quarterly-report_final.csv",
+        "bucket": "drbfo-uploads",
+        "blob": "uploads/3950_quarterly-report_final.csv",
+        "mime_type": "text/csv",
+        "file_size": 1048576,
+        "ext": ".csv",
+        "classification": "spreadsheets",
+        "lane": "small",
+    }
+    data, attributes = messages.encode(event)
+    push = {
+        "message": {
+            "data": base64.b64encode(data).decode(),
+            "attributes": attributes,
+            "messageId": "9876543210",
+            "publishTime": "2026-03-01T10:00:00.000Z",
+        },
+        "subscription": "projects/cfo/subscriptions/act-small-push",
+    }
+    return json.dumps(push).encode("utf-8")
+
+
+def push_stdlib(raw: bytes) -> dict:
+    # request.json() followed by the old decode_push
+    envelope = json.loads(raw)
+    message = envelope["message"]
+    body = json.loads(base64.b64decode(message["data"]))
+    return messages._from_envelope(body, message.get("attributes") or {})
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_msgs = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    print(f"orjson installed: {fastjson.HAS_ORJSON}")
+
+    rows = activity_rows(n_rows)
+    assert json.loads(activity_validated(rows)) == json.loads(
+        activity_rows_direct(rows)
+    )
+    for name, fn in (
+        ("validated", activity_validated),
+        ("constructed", activity_constructed),
+        ("dicts", activity_rows_direct),
+    ):
+        seconds = min(timeit.repeat(lambda: fn(rows), number=1, repeat=5))
+        print(
+            f"/activity limit={n_rows} {name:11s} {seconds * 1e3:8.2f} ms "
+            f"({seconds / n_rows * 1e6:5.2f} µs per row)"
+        )
+
+    raw = push_body()
+    for name, fn in (
+        ("stdlib", push_stdlib),
+        ("decode_push", messages.decode_push),
+    ):
+        seconds = timeit.timeit(lambda: fn(raw), number=n_msgs)
+        print(f"push decode {name:11s} {seconds / n_msgs * 1e6:6.2f} µs per message")
+
+
+if __name__ == "__main__":
+    main()
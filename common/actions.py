@@ -0,0 +1,261 @@
+# common/actions.py
+
+import logging
+import os
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.api_core.exceptions import NotFound
+
+from common.config import PROCESSED_BUCKET
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# GCS JSON API accepts at most 100 calls per batch request.
+GCS_BATCH_LIMIT = 100
+
+# Read/write chunk for streaming compression (a multiple of 256 KiB, as GCS
+# resumable uploads require)
+COMPRESS_CHUNK_BYTES = int(os.getenv("COMPRESS_CHUNK_BYTES", str(1024 * 1024)))
+
+# Types worth compressing; everything else is usually compressed already
+COMPRESSIBLE_EXTENSIONS = {
+    ".txt",
+    ".csv",
+    ".tsv",
+    ".json",
+    ".ndjson",
+    ".jsonl",
+    ".log",
+    ".xml",
+    ".html",
+    ".md",
+    ".yaml",
+    ".yml",
+    ".sql",
+}
+COMPRESSIBLE_MIME_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/x-ndjson",
+    "application/sql",
+}
+
+
+def resolve_destinations(
+    applied: Dict[str, Any], classification: str, blob_name: str
+) -> List[Tuple[str, str, str]]:
+    """
+    Return (dest_bucket, dest_folder, dest_blob) for every destination of a
+    planned move, the primary one first. A destination without a folder of
+    its own uses the rule's folder, or else the classification.
+    """
+    targets = applied.get("destinations") or [{"bucket": applied.get("dest_bucket")}]
+    filename = blob_name.split("/")[-1]
+    resolved: List[Tuple[str, str, str]] = []
+    for target in targets:
+        dest_bucket_name = target.get("bucket") or PROCESSED_BUCKET
+        dest_folder = (
+            target.get("folder") or applied.get("dest_folder") or classification
+        )
+        dest = (dest_bucket_name, dest_folder, f"{dest_folder}/{filename}")
+        if dest not in resolved:
+            resolved.append(dest)
+    return resolved
+
+
+def resolve_destination(
+    applied: Dict[str, Any], classification: str, blob_name: str
+) -> Tuple[str, str, str]:
+    """
+    Return (dest_bucket, dest_folder, dest_blob) for a planned move.
+    """
+    return resolve_destinations(applied, classification, blob_name)[0]
+
+
+def copy_object(
+    storage_client,
+    src_bucket_name: str,
+    src_blob_name: str,
+    dest_bucket_name: str,
+    dest_blob_name: str,
+    *,
+    content_type: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+    storage_class: Optional[str] = None,
+    hold: Optional[str] = None,
+):
+    """
+    Server-side copy of one object; returns the destination blob.
+
+    Without extra properties this is a plain copy that keeps the source's
+    metadata. Otherwise the copy is a rewrite() whose request body carries
+    the destination's content type, custom metadata, storage class and hold,
+    so they are applied by the copy itself rather than by a follow-up PATCH
+    or second rewrite. A rewrite with a body replaces the source's metadata,
+    which is why the content type is passed explicitly.
+    """
+    src_bucket = storage_client.bucket(src_bucket_name)
+    src_blob = src_bucket.blob(src_blob_name)
+    dest_bucket = storage_client.bucket(dest_bucket_name)
+
+    if not (metadata or storage_class or hold):
+        return src_bucket.copy_blob(src_blob, dest_bucket, new_name=dest_blob_name)
+
+    dest_blob = dest_bucket.blob(dest_blob_name)
+    _set_properties(dest_blob, content_type, metadata, storage_class, hold)
+
+    # Large or cross-location rewrites may take several calls
+    token, _, _ = dest_blob.rewrite(src_blob)
+    while token is not None:
+        token, _, _ = dest_blob.rewrite(src_blob, token=token)
+    return dest_blob
+
+
+def _set_properties(
+    blob,
+    content_type: Optional[str],
+    metadata: Optional[Dict[str, str]],
+    storage_class: Optional[str],
+    hold: Optional[str],
+) -> None:
+    if content_type:
+        blob.content_type = content_type
+    if metadata:
+        blob.metadata = metadata
+    if storage_class:
+        blob.storage_class = storage_class
+    if hold == "event":
+        blob.event_based_hold = True
+    elif hold == "temporary":
+        blob.temporary_hold = True
+
+
+def is_compressible(mime_type: Optional[str], ext: Optional[str]) -> bool:
+    mime_type = (mime_type or "").lower()
+    return (
+        (ext or "").lower() in COMPRESSIBLE_EXTENSIONS
+        or mime_type.startswith("text/")
+        or mime_type in COMPRESSIBLE_MIME_TYPES
+    )
+
+
+def _compressor(encoding: str):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor().compressobj()
+    # wbits=31: zlib stream with a gzip header and trailer
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+
+def compress_object(
+    storage_client,
+    src_bucket_name: str,
+    src_blob_name: str,
+    dest_bucket_name: str,
+    dest_blob_name: str,
+    encoding: str = "gzip",
+    *,
+    content_type: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+    storage_class: Optional[str] = None,
+    hold: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Stream one object through gzip or zstd into its destination, holding at
+    most one COMPRESS_CHUNK_BYTES chunk (plus compressor state) in memory.
+
+    The destination keeps its name and content type and gets the matching
+    Content-Encoding, so GCS serves gzip objects decompressed to clients
+    that do not accept gzip. Falls back to gzip when zstandard is not
+    installed. Returns the encoding used and the byte counts.
+    """
+    if encoding == "zstd" and zstandard is None:
+        logger.warning("zstandard not installed; compressing with gzip instead")
+        encoding = "gzip"
+
+    src_blob = storage_client.bucket(src_bucket_name).blob(src_blob_name)
+    dest_blob = storage_client.bucket(dest_bucket_name).blob(dest_blob_name)
+    _set_properties(dest_blob, content_type, metadata, storage_class, hold)
+    dest_blob.content_encoding = encoding
+
+    compressor = _compressor(encoding)
+    original = stored = 0
+    with src_blob.open("rb", chunk_size=COMPRESS_CHUNK_BYTES) as reader:
+        with dest_blob.open("wb", chunk_size=COMPRESS_CHUNK_BYTES) as writer:
+            while True:
+                chunk = reader.read(COMPRESS_CHUNK_BYTES)
+                if not chunk:
+                    break
+                original += len(chunk)
+                out = compressor.compress(chunk)
+                stored += len(out)
+                writer.write(out)
+            out = compressor.flush()
+            stored += len(out)
+            writer.write(out)
+
+    return {
+        "encoding": encoding,
+        "original_bytes": original,
+        "stored_bytes": stored,
+        "ratio": round(original / stored, 3) if stored else None,
+    }
+
+
+def object_metadata(
+    file_meta: Dict[str, Any], applied: Dict[str, Any], rule: Optional[Dict[str, Any]]
+) -> Dict[str, str]:
+    """
+    Custom metadata written on the destination object: the rule's tags plus
+    the pipeline identifiers needed to trace an object back to its job and
+    tenant.
+    """
+    metadata = {
+        "job_id": str(file_meta.get("job_id") or ""),
+        "tenant_id": str(file_meta.get("tenant_id") or ""),
+        "classification": str(file_meta.get("classification") or ""),
+    }
+    if applied.get("tags"):
+        metadata["tags"] = ",".join(applied["tags"])
+        for tag in applied["tags"]:
+            metadata[f"tag-{tag}"] = "true"
+    if rule:
+        metadata["rule_id"] = str(rule.get("id") or "")
+    return {k: v for k, v in metadata.items() if v}
+
+
+def delete_objects(storage_client, bucket_name: str, blob_names: Iterable[str]) -> None:
+    """
+    Delete objects using batched requests of up to GCS_BATCH_LIMIT calls.
+
+    Objects that are already gone count as deleted, as in delete_quietly().
+    A batch raises for its first failed call only, so a chunk that hits a
+    404 is finished one object at a time; any other error still raises.
+    """
+    bucket = storage_client.bucket(bucket_name)
+    names = list(blob_names)
+    for start in range(0, len(names), GCS_BATCH_LIMIT):
+        chunk = names[start : start + GCS_BATCH_LIMIT]
+        try:
+            with storage_client.batch():
+                for name in chunk:
+                    bucket.blob(name).delete()
+        except NotFound:
+            for name in chunk:
+                delete_quietly(bucket.blob(name))
+
+
+def delete_quietly(blob, timeout: Optional[float] = None) -> None:
+    """
+    Delete `blob`, treating an already-missing object as success: a retried
+    delete can find that its first attempt went through after all.
+    """
+    try:
+        blob.delete(**({"timeout": timeout} if timeout else {}))
+    except NotFound:
+        pass
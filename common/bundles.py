@@ -0,0 +1,282 @@
+# common/bundles.py
+
+import datetime as dt
+import io
+import json
+import logging
+import tarfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import NotFound
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".index.json"
+
+# (dest_bucket, dest_folder, storage_class, tenant_id): files sharing a key
+# share bundles; tenants never share one
+BundleKey = Tuple[str, str, Optional[str], str]
+
+
+class PendingBundle:
+    """
+    Files waiting to be written out together.
+    """
+
+    def __init__(self, key: BundleKey):
+        self.key = key
+        self.members: Dict[str, Dict[str, Any]] = {}  # job_id -> member
+        self.size = 0
+        self.opened_at = time.monotonic()
+
+
+def bundle_name(dest_folder: str) -> str:
+    stamp = dt.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return f"{dest_folder}/_bundles/{stamp}-{uuid.uuid4().hex[:8]}.tar"
+
+
+def _tar_blocks(size: int) -> int:
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+class Bundler:
+    """
+    Packs small files into uncompressed tar bundles, one stream per
+    destination folder, storage class and tenant.
+
+    A bundle is written when it reaches `max_bytes` or `max_files`, or when
+    its oldest file has waited `max_age` seconds. Next to each bundle a JSON
+    sidecar index records every member's byte offset and size inside the
+    tar, so one file can later be fetched with a single ranged read (see
+    read_member()).
+
+    Pending files live only in memory and their sources are not touched
+    until the bundle is written; `on_flush(bundle, entries)` is then called
+    to complete the jobs and delete the sources. If the process dies first,
+    the sources are still in place and the jobs are still CLASSIFIED, so the
+    reconciler re-publishes them. The same holds when `on_flush` fails: the
+    error is logged and the jobs are left to the reconciler.
+
+    Once start() has been called, bundles are written on its thread: add()
+    only hands a full bundle over, so the request that fills one does not
+    download and upload all of its members.
+    """
+
+    def __init__(
+        self,
+        storage_client,
+        on_flush: Callable[[Dict[str, Any], List[Dict[str, Any]]], None],
+        max_bytes: int = 64 * 1024 * 1024,
+        max_files: int = 1000,
+        max_age: float = 60,
+    ):
+        self.storage_client = storage_client
+        self.on_flush = on_flush
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_age = max_age
+        self._pending: Dict[BundleKey, PendingBundle] = {}
+        # Full bundles waiting for the flush thread
+        self._ready: List[PendingBundle] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, key: BundleKey, member: Dict[str, Any]) -> None:
+        """
+        Queue one file. `member` needs job_id, bucket, blob, name and
+        file_size; anything else is copied into its index entry.
+        """
+        ready = None
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = PendingBundle(key)
+            if member["job_id"] in pending.members:
+                # Redelivery of a file that is already waiting
+                return
+            pending.members[member["job_id"]] = member
+            pending.size += int(member.get("file_size") or 0)
+            if pending.size >= self.max_bytes or len(pending.members) >= self.max_files:
+                ready = self._pending.pop(key)
+                if self._thread is not None:
+                    self._ready.append(ready)
+        if ready is None:
+            return
+        if self._thread is not None:
+            self._wake.set()
+        else:
+            self._write(ready)
+
+    def flush_due(self) -> int:
+        """
+        Write every full bundle and every bundle older than max_age;
+        returns how many were written.
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                key
+                for key, pending in self._pending.items()
+                if now - pending.opened_at >= self.max_age
+            ]
+            ready, self._ready = self._ready, []
+            ready += [self._pending.pop(key) for key in due]
+        for pending in ready:
+            self._write(pending)
+        return len(ready)
+
+    def flush_all(self) -> int:
+        with self._lock:
+            ready, self._ready = self._ready, []
+            ready += list(self._pending.values())
+            self._pending.clear()
+        for pending in ready:
+            self._write(pending)
+        return len(ready)
+
+    def start(self, interval: float = 5) -> threading.Thread:
+        """
+        Write full bundles as they come in, and aged ones every `interval`
+        seconds, from a daemon thread.
+        """
+
+        def loop():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                try:
+                    self.flush_due()
+                except Exception as e:
+                    logger.error("Bundler: periodic flush failed: %s", e)
+
+        thread = threading.Thread(target=loop, name="bundle-flush", daemon=True)
+        self._thread = thread
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            bundles = list(self._pending.values()) + self._ready
+            return {
+                "pending_bundles": len(bundles),
+                "pending_files": sum(len(p.members) for p in bundles),
+            }
+
+    # ------------------------------- writing --------------------------------
+
+    def _write(self, pending: PendingBundle) -> None:
+        dest_bucket_name, dest_folder, storage_class, tenant_id = pending.key
+        name = bundle_name(dest_folder)
+        try:
+            entries = self._write_tar(dest_bucket_name, name, storage_class, pending)
+            if not entries:
+                return
+            bundle = {
+                "bucket": dest_bucket_name,
+                "blob": name,
+                "index": name + INDEX_SUFFIX,
+                "format": "tar",
+                "storage_class": storage_class,
+                "tenant_id": tenant_id,
+                "created_at": dt.datetime.utcnow().isoformat() + "Z",
+            }
+            self._write_index(bundle, entries)
+        except Exception as e:
+            # Sources are untouched; the reconciler will re-publish the jobs.
+            logger.error(
+                "Bundler: writing gs://%s/%s (%s files) failed: %s",
+                dest_bucket_name,
+                name,
+                len(pending.members),
+                e,
+            )
+            return
+
+        logger.info(
+            "Bundler: wrote %s files to gs://%s/%s",
+            len(entries),
+            dest_bucket_name,
+            name,
+        )
+        try:
+            self.on_flush(bundle, entries)
+        except Exception as e:
+            # Jobs not completed yet are still CLASSIFIED; the reconciler
+            # re-publishes them
+            logger.error(
+                "Bundler: completing the jobs of gs://%s/%s failed: %s",
+                dest_bucket_name,
+                name,
+                e,
+            )
+
+    def _write_tar(
+        self,
+        dest_bucket_name: str,
+        name: str,
+        storage_class: Optional[str],
+        pending: PendingBundle,
+    ) -> List[Dict[str, Any]]:
+        dest_blob = self.storage_client.bucket(dest_bucket_name).blob(name)
+        if storage_class:
+            dest_blob.storage_class = storage_class
+
+        entries: List[Dict[str, Any]] = []
+        seen = set()
+        # The uploaded object is written as a stream; nothing is buffered
+        # beyond the member currently being added.
+        with dest_blob.open("wb", content_type="application/x-tar") as out:
+            with tarfile.open(fileobj=out, mode="w|") as tar:
+                for member in pending.members.values():
+                    src = self.storage_client.bucket(member["bucket"]).blob(
+                        member["blob"]
+                    )
+                    try:
+                        data = src.download_as_bytes()
+                    except NotFound:
+                        # Already handled by an earlier delivery
+                        continue
+
+                    arcname = member["name"]
+                    if arcname in seen:
+                        arcname = f"{member['job_id']}/{arcname}"
+                    seen.add(arcname)
+
+                    info = tarfile.TarInfo(arcname)
+                    info.size = len(data)
+                    info.mtime = int(time.time())
+                    tar.addfile(info, io.BytesIO(data))
+
+                    entry = dict(member)
+                    entry.update(
+                        {
+                            "name": arcname,
+                            "offset": tar.offset - _tar_blocks(len(data)),
+                            "size": len(data),
+                        }
+                    )
+                    entries.append(entry)
+        return entries
+
+    def _write_index(
+        self, bundle: Dict[str, Any], entries: List[Dict[str, Any]]
+    ) -> None:
+        index = dict(bundle, members=entries)
+        blob = self.storage_client.bucket(bundle["bucket"]).blob(bundle["index"])
+        blob.upload_from_string(json.dumps(index), content_type="application/json")
+
+
+def read_member(
+    storage_client, bucket_name: str, bundle_blob: str, offset: int, size: int
+) -> bytes:
+    """
+    Fetch one file out of a bundle with a single ranged read.
+    """
+    if size <= 0:
+        return b""
+    blob = storage_client.bucket(bucket_name).blob(bundle_blob)
+    return blob.download_as_bytes(start=offset, end=offset + size - 1)
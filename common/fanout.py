@@ -0,0 +1,165 @@
+# common/fanout.py
+
+import asyncio
+import functools
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """
+    One connected client's pending updates.
+
+    Updates are keyed by id, so a job that changes several times before the
+    client catches up is sent once, in its latest state. At most
+    `max_pending` ids are held; beyond that the oldest is dropped and
+    counted, and the client is told how many it missed.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.loop = loop
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+
+    def push(self, key: str, item: Dict[str, Any]) -> None:
+        # Called from the listener thread
+        with self._lock:
+            self._pending.pop(key, None)
+            self._pending[key] = item
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Loop already closed; the client is going away
+            pass
+
+    async def next(self, timeout: float) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Wait up to `timeout` seconds for updates; returns (items, dropped
+        since the last call). Both are empty on timeout.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return [], 0
+        with self._lock:
+            self._ready.clear()
+            items = list(self._pending.values())
+            self._pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        return items, dropped
+
+
+class Fanout:
+    """
+    Shares one Firestore `on_snapshot` listener among any number of
+    streaming clients.
+
+    The listener is started when the first client subscribes and stopped
+    when the last one leaves, so Firestore reads depend on how often the
+    watched documents change, not on how many clients are watching. The
+    current result set is kept in memory; a new client starts from it
+    without running the query again.
+
+    `query_factory()` returns the query to watch; `to_item(doc)` turns a
+    document snapshot into what the clients receive.
+    """
+
+    def __init__(
+        self,
+        query_factory: Callable[[], Any],
+        to_item: Callable[[Any], Dict[str, Any]],
+        max_pending: int = 100,
+    ):
+        self.query_factory = query_factory
+        self.to_item = to_item
+        self.max_pending = max_pending
+        self._subscribers: List[Subscriber] = []
+        self._current: Dict[str, Dict[str, Any]] = {}
+        self._watch = None
+        # Set before the listener is registered, since its first snapshot
+        # can arrive before on_snapshot() returns; the generation tells a
+        # late callback from a stopped listener apart from the current one
+        self._active = False
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> Tuple[Subscriber, List[Dict[str, Any]]]:
+        """
+        Register a client; returns it with the current result set.
+        """
+        subscriber = Subscriber(asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._subscribers.append(subscriber)
+            if not self._active:
+                self._active = True
+                self._generation += 1
+                callback = functools.partial(self._on_snapshot, self._generation)
+                self._watch = self.query_factory().on_snapshot(callback)
+            current = list(self._current.values())
+        return subscriber, current
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+            if self._subscribers or not self._active:
+                return
+            self._active = False
+            watch, self._watch = self._watch, None
+            self._current.clear()
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            logger.warning("Fanout: stopping listener failed: %s", e)
+
+    def _on_snapshot(self, generation: int, docs, changes, read_time) -> None:
+        # Runs on the Firestore listener's thread
+        if not self._is_current(generation):
+            # Late callback from a listener that was just stopped
+            return
+        updates, removed = [], []
+        for change in changes:
+            if getattr(change.type, "name", change.type) == "REMOVED":
+                # Only fell out of the window (e.g. older than the newest N)
+                removed.append(change.document.id)
+                continue
+            try:
+                item = self.to_item(change.document)
+            except Exception as e:
+                logger.warning("Fanout: skipping %s: %s", change.document.id, e)
+                continue
+            updates.append((change.document.id, item))
+
+        with self._lock:
+            if not (self._active and generation == self._generation):
+                return
+            for key in removed:
+                self._current.pop(key, None)
+            for key, item in updates:
+                self._current[key] = item
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for key, item in updates:
+                subscriber.push(key, item)
+
+    def _is_current(self, generation: int) -> bool:
+        with self._lock:
+            return self._active and generation == self._generation
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "listening": self._active,
+                "subscribers": len(self._subscribers),
+                "pending": sum(len(s._pending) for s in self._subscribers),
+            }
@@ -0,0 +1,47 @@
+# common/fingerprint.py
+
+import base64
+import hashlib
+from typing import Any, BinaryIO, Dict
+
+try:
+    import google_crc32c
+
+    HAS_CRC32C = True
+except ImportError:
+    HAS_CRC32C = False
+
+# Enough for sniff_mime(); matches the inspect worker's ranged header read
+HEADER_BYTES = 2048
+CHUNK_BYTES = 1024 * 1024
+
+
+def fingerprint(fileobj: BinaryIO, chunk_size: int = CHUNK_BYTES) -> Dict[str, Any]:
+    """
+    Size, SHA-256 and CRC32C of `fileobj` plus its first HEADER_BYTES, in a
+    single pass. The file is left at its end.
+
+    crc32c is base64 of the big-endian checksum (the form GCS uses for
+    Blob.crc32c), or None when google-crc32c is not installed.
+    """
+    sha256 = hashlib.sha256()
+    crc = google_crc32c.Checksum() if HAS_CRC32C else None
+    header = b""
+    size = 0
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        if len(header) < HEADER_BYTES:
+            header += chunk[: HEADER_BYTES - len(header)]
+        sha256.update(chunk)
+        if crc is not None:
+            crc.update(chunk)
+        size += len(chunk)
+
+    return {
+        "size": size,
+        "sha256": sha256.hexdigest(),
+        "crc32c": base64.b64encode(crc.digest()).decode("ascii") if crc else None,
+        "header": header,
+    }
@@ -0,0 +1,217 @@
+# common/inspectors.py
+#
+# CPU-bound inspectors. They run in the inspect worker's process pool, so
+# they must be module-level functions that take and return plain data.
+
+import logging
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import puremagic
+
+    HAS_PUREMAGIC = True
+    logging.info("puremagic imported successfully")
+except ImportError:
+    HAS_PUREMAGIC = False
+    logging.warning("puremagic not available")
+
+
+def sniff_mime(header: bytes) -> Optional[str]:
+    """
+    MIME type from the magic bytes in `header`, or None if puremagic finds
+    no signature (or is not installed).
+    """
+    if not HAS_PUREMAGIC or len(header) < 4:
+        return None
+    try:
+        result = puremagic.from_string(header)
+    except Exception:
+        return None
+
+    # Handles both old (str) and new (MagicMatch) return types
+    if isinstance(result, str):
+        return result or None
+    return getattr(result, "mime", None) or None
+
+
+# ------------------------------ ZIP archives --------------------------------
+#
+# A ZIP file ends with its table of contents: the central directory, then
+# the end-of-central-directory (EOCD) record saying where the directory
+# starts and how long it is. Listing an archive therefore takes a ranged
+# read of the tail and one of the directory, however large the archive.
+
+ZIP_ENTRY = b"PK\x01\x02"
+ZIP_EOCD = b"PK\x05\x06"
+ZIP64_EOCD = b"PK\x06\x06"
+ZIP64_LOCATOR = b"PK\x06\x07"
+
+_EOCD = struct.Struct("<4s4H2LH")
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+_ENTRY = struct.Struct("<4s6H3L5H2L")
+
+# The EOCD record is followed by a comment of up to 65535 bytes
+EOCD_MAX_TAIL = _EOCD.size + 0xFFFF
+
+# Compression methods by id (APPNOTE 4.4.5); others are reported by number
+ZIP_METHODS = {
+    0: "stored",
+    8: "deflate",
+    9: "deflate64",
+    12: "bzip2",
+    14: "lzma",
+    93: "zstd",
+    95: "xz",
+    99: "aes",
+}
+
+# Formats that are ZIP archives underneath
+ZIP_EXTENSIONS = frozenset(
+    {".zip", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".jar", ".epub"}
+)
+ZIP_MIME_TYPES = frozenset(
+    {
+        "application/zip",
+        "application/x-zip-compressed",
+        "application/java-archive",
+        "application/epub+zip",
+    }
+)
+
+
+def is_zip(mime_type: Optional[str], ext: Optional[str], header: bytes = b"") -> bool:
+    """
+    Whether a file is worth listing as a ZIP archive, from its MIME type,
+    extension or first bytes.
+    """
+    mime = (mime_type or "").lower()
+    return (
+        mime in ZIP_MIME_TYPES
+        or "openxmlformats" in mime
+        or mime.startswith("application/vnd.oasis.opendocument")
+        or (ext or "").lower() in ZIP_EXTENSIONS
+        or header[:4] in (b"PK\x03\x04", ZIP_EOCD)
+    )
+
+
+def zip_directory_range(tail: bytes, file_size: int) -> Optional[Tuple[int, int, int]]:
+    """
+    (offset, length, entry_count) of the central directory of a ZIP file
+    of `file_size` bytes, from `tail`, its last bytes.
+
+    None if `tail` holds no EOCD record (not a ZIP, or a comment longer
+    than the tail), for archives split over several disks, and when the
+    record points outside the file.
+    """
+    tail_start = file_size - len(tail)
+    end = len(tail) - _EOCD.size + len(ZIP_EOCD)
+    while True:
+        pos = tail.rfind(ZIP_EOCD, 0, end)
+        if pos < 0:
+            return None
+        _, disk, cd_disk, _, entries, cd_size, cd_offset, comment_len = (
+            _EOCD.unpack_from(tail, pos)
+        )
+        # The signature may also occur inside the comment
+        if pos + _EOCD.size + comment_len <= len(tail):
+            break
+        end = pos + len(ZIP_EOCD) - 1
+
+    if entries == 0xFFFF or cd_size == 0xFFFFFFFF or cd_offset == 0xFFFFFFFF:
+        # ZIP64: the real values are in a larger record, found through the
+        # locator just before the EOCD; both normally sit in the tail
+        locator = pos - _ZIP64_LOCATOR.size
+        if locator < 0 or tail[locator : locator + 4] != ZIP64_LOCATOR:
+            return None
+        _, disk, record_offset, _ = _ZIP64_LOCATOR.unpack_from(tail, locator)
+        record = record_offset - tail_start
+        if record < 0 or tail[record : record + 4] != ZIP64_EOCD:
+            return None
+        _, _, _, _, disk, cd_disk, _, entries, cd_size, cd_offset = (
+            _ZIP64_EOCD.unpack_from(tail, record)
+        )
+
+    if disk != 0 or cd_disk != 0 or cd_offset + cd_size > file_size:
+        return None
+    return cd_offset, cd_size, entries
+
+
+def _zip64_sizes(extra: bytes, size: int, compressed: int) -> Tuple[int, int]:
+    # Extra field 0x0001 holds the 64-bit values of the fields set to
+    # 0xFFFFFFFF, uncompressed size first
+    pos = 0
+    while pos + 4 <= len(extra):
+        field_id, length = struct.unpack_from("<2H", extra, pos)
+        if field_id == 0x0001:
+            values = iter(
+                struct.unpack_from(f"<{min(length, 16) // 8}Q", extra, pos + 4)
+            )
+            if size == 0xFFFFFFFF:
+                size = next(values, size)
+            if compressed == 0xFFFFFFFF:
+                compressed = next(values, compressed)
+            break
+        pos += 4 + length
+    return size, compressed
+
+
+def list_zip_entries(
+    directory: bytes, entry_count: int, max_names: int = 1000
+) -> Dict[str, Any]:
+    """
+    Summarize a ZIP central directory that should hold `entry_count`
+    entries: sizes, compression methods, and the first `max_names` entry
+    names in directory order. `complete` is False when `directory` was
+    truncated or damaged and only some entries could be listed;
+    `names_truncated` is True whenever `names` misses any entry.
+    """
+    listed = files = size_total = compressed_total = 0
+    methods: Dict[str, int] = {}
+    names: List[str] = []
+    encrypted = False
+
+    pos = 0
+    while pos + _ENTRY.size <= len(directory) and listed < entry_count:
+        entry = _ENTRY.unpack_from(directory, pos)
+        if entry[0] != ZIP_ENTRY:
+            break
+        flags, method = entry[3], entry[4]
+        compressed, size = entry[8], entry[9]
+        name_len, extra_len, comment_len = entry[10], entry[11], entry[12]
+        start = pos + _ENTRY.size
+        pos = start + name_len + extra_len + comment_len
+        if pos > len(directory):
+            break
+
+        raw = directory[start : start + name_len]
+        # Bit 11: the name is UTF-8; otherwise it is code page 437
+        name = raw.decode("utf-8" if flags & 0x800 else "cp437", "replace")
+        if size == 0xFFFFFFFF or compressed == 0xFFFFFFFF:
+            extra = directory[start + name_len : start + name_len + extra_len]
+            size, compressed = _zip64_sizes(extra, size, compressed)
+
+        listed += 1
+        if len(names) < max_names:
+            names.append(name)
+        if name.endswith("/"):
+            continue
+        files += 1
+        size_total += size
+        compressed_total += compressed
+        label = ZIP_METHODS.get(method, str(method))
+        methods[label] = methods.get(label, 0) + 1
+        encrypted = encrypted or bool(flags & 0x1)
+
+    return {
+        "entries": entry_count,
+        "files": files,
+        "uncompressed_size": size_total,
+        "compressed_size": compressed_total,
+        "methods": methods,
+        "encrypted": encrypted,
+        "names": names,
+        "names_truncated": len(names) < entry_count,
+        "complete": listed == entry_count,
+    }
@@ -0,0 +1,164 @@
+# common/limits.py
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.responses import Response
+from google.api_core import exceptions as gexc
+
+# Errors that mean "the dependency is overloaded", as opposed to errors about
+# the request itself (NotFound, PermissionDenied, ...).
+OVERLOAD_ERRORS = (
+    gexc.TooManyRequests,
+    gexc.ResourceExhausted,
+    gexc.ServiceUnavailable,
+    gexc.DeadlineExceeded,
+    gexc.InternalServerError,
+    TimeoutError,
+)
+
+
+class Saturated(Exception):
+    """
+    Raised when a dependency limiter cannot admit a call in time.
+    """
+
+    def __init__(self, dependency: str):
+        super().__init__(f"{dependency} concurrency limit reached")
+        self.dependency = dependency
+
+
+def _env(name: str, field: str, default: float) -> float:
+    value = os.getenv(f"LIMIT_{name.upper()}_{field}") or os.getenv(f"LIMIT_{field}")
+    return float(value) if value else default
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one downstream dependency.
+
+    Each call that completes near the best latency seen so far grows the
+    limit by 1/limit (about +1 per round trip of calls). A call that is much
+    slower than that baseline, or fails with an overload error, shrinks the
+    limit multiplicatively. The baseline is a minimum that slowly drifts up,
+    so it follows genuine changes in the dependency's speed.
+
+    Calls whose duration grows with the work they do (copies of files of
+    any size) pass a `cost`, e.g. MB moved; their latency is compared per
+    unit of cost.
+
+    Callers wait at most `max_wait` seconds for a slot and at most
+    `max_queue` callers may wait at once; beyond that Saturated is raised.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = 16,
+        min_limit: float = 1,
+        max_limit: float = 256,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+        max_wait: float = 0.5,
+        max_queue: int = 32,
+    ):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.inflight = 0
+        self.waiting = 0
+        self.baseline: Optional[float] = None
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, name: str) -> "AdaptiveLimiter":
+        return cls(
+            name,
+            initial=_env(name, "INITIAL", 16),
+            min_limit=_env(name, "MIN", 1),
+            max_limit=_env(name, "MAX", 256),
+            tolerance=_env(name, "TOLERANCE", 2.0),
+            max_wait=_env(name, "MAX_WAIT_MS", 500) / 1000.0,
+            max_queue=int(_env(name, "MAX_QUEUE", 32)),
+        )
+
+    @property
+    def saturated(self) -> bool:
+        return self.inflight >= int(self.limit) and self.waiting >= self.max_queue
+
+    def acquire(self) -> None:
+        with self._cond:
+            if self.inflight < int(self.limit):
+                self.inflight += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise Saturated(self.name)
+
+            deadline = time.monotonic() + self.max_wait
+            self.waiting += 1
+            try:
+                while self.inflight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Saturated(self.name)
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.inflight += 1
+
+    def release(
+        self, latency: float, overloaded: bool = False, cost: float = 1.0
+    ) -> None:
+        latency /= max(cost, 1e-9)
+        with self._cond:
+            self.inflight -= 1
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline *= 1.001
+
+            if overloaded or latency > self.baseline * self.tolerance:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif self.inflight + 1 >= int(self.limit):
+                # Only grow when the current limit is actually being used
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify()
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return self.call_with_cost(1.0, fn, *args, **kwargs)
+
+    def call_with_cost(
+        self, cost: float, fn: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Any:
+        self.acquire()
+        start = time.monotonic()
+        overloaded = False
+        try:
+            return fn(*args, **kwargs)
+        except OVERLOAD_ERRORS:
+            overloaded = True
+            raise
+        finally:
+            self.release(time.monotonic() - start, overloaded, cost)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "baseline_ms": round((self.baseline or 0) * 1000, 2),
+        }
+
+
+def saturated_response(request, exc: Saturated) -> Response:
+    """
+    Exception handler: answer 429 so Pub/Sub push backs off and redelivers.
+    """
+    return Response(status_code=429, headers={"Retry-After": "1"})
@@ -0,0 +1,81 @@
+# common/push_auth.py
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from fastapi import Header, HTTPException
+from google.auth import jwt
+
+# Google's signing keys for the OIDC tokens Pub/Sub attaches to pushes
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+
+class PushVerifier:
+    """
+    FastAPI dependency for a Pub/Sub push endpoint: accepts only requests
+    carrying an OIDC token signed by Google for `audience` (the subscription's
+    --push-auth-token-audience, or the endpoint URL by default) and, when
+    `service_account` is set, issued to that account.
+
+    Google's certificates are fetched at most once per `certs_ttl` seconds
+    rather than per push.
+    """
+
+    def __init__(
+        self,
+        audience: str,
+        service_account: str = "",
+        certs_ttl: float = 3600,
+    ):
+        self.audience = audience
+        self.service_account = service_account
+        self.certs_ttl = certs_ttl
+        self._certs: Optional[Dict[str, str]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "PushVerifier":
+        return cls(
+            os.getenv("PUSH_AUDIENCE", ""),
+            os.getenv("PUSH_SERVICE_ACCOUNT", ""),
+        )
+
+    def certs(self) -> Dict[str, str]:
+        with self._lock:
+            if self._certs is None or time.time() - self._fetched_at > self.certs_ttl:
+                resp = requests.get(GOOGLE_CERTS_URL, timeout=10)
+                resp.raise_for_status()
+                self._certs = resp.json()
+                self._fetched_at = time.time()
+            return self._certs
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Claims of a valid token; raises ValueError otherwise.
+        """
+        claims = jwt.decode(token, certs=self.certs(), audience=self.audience)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"unexpected issuer {claims.get('iss')!r}")
+        if self.service_account and (
+            claims.get("email") != self.service_account
+            or not claims.get("email_verified")
+        ):
+            raise ValueError(f"unexpected service account {claims.get('email')!r}")
+        return claims
+
+    def __call__(self, authorization: Optional[str] = Header(None)) -> None:
+        if not self.audience:
+            # Without an audience any Google-signed token would pass
+            raise HTTPException(status_code=503, detail="PUSH_AUDIENCE is not set")
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Missing bearer token")
+        try:
+            self.verify(token)
+        except ValueError as e:
+            raise HTTPException(status_code=403, detail=f"Invalid push token: {e}")
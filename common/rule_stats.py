@@ -0,0 +1,131 @@
+# common/rule_stats.py
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("evaluations", "hits", "eval_ns")
+
+
+class NotApplied(Exception):
+    """
+    Raised by a flusher whose write is known not to have been applied
+    (e.g. it was never sent), so its deltas can be counted again.
+    """
+
+
+class RuleStats:
+    """
+    In-memory per-rule counters: how often each rule was tested, how often
+    it matched, and the time spent testing it.
+
+    Counting is a dict update under a lock; the counts are handed to
+    `flusher({rule_id: {"evaluations", "hits", "eval_ns"}})` as deltas
+    every `interval` seconds, so several instances can add theirs to the
+    same stored totals. Each flusher call gets at most `batch_size` rules,
+    so it can commit them as one write.
+
+    Counting is at most once: increments are not idempotent, and a write
+    that failed may still have landed, so a failed call's deltas are
+    dropped unless the flusher raises NotApplied. Deltas not yet handed
+    over are always kept for the next round.
+    """
+
+    def __init__(
+        self,
+        flusher: Callable[[Dict[str, Dict[str, int]]], None],
+        batch_size: Optional[int] = None,
+    ):
+        self.flusher = flusher
+        self.batch_size = batch_size
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, evaluated: Iterable[Tuple[Optional[str], bool, int]]) -> None:
+        """
+        Add one file's evaluation: (rule_id, matched, nanoseconds) per rule
+        tested.
+        """
+        with self._lock:
+            for rule_id, hit, elapsed_ns in evaluated:
+                if not rule_id:
+                    continue
+                counts = self._counts.get(rule_id)
+                if counts is None:
+                    counts = self._counts[rule_id] = dict.fromkeys(COUNTERS, 0)
+                counts["evaluations"] += 1
+                counts["hits"] += hit
+                counts["eval_ns"] += elapsed_ns
+
+    def pending(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {rule_id: dict(c) for rule_id, c in self._counts.items()}
+
+    def flush(self) -> int:
+        """
+        Hand the counts gathered since the last flush to the flusher;
+        returns the number of rules flushed.
+        """
+        with self._lock:
+            deltas, self._counts = self._counts, {}
+        items = list(deltas.items())
+        size = self.batch_size or len(items) or 1
+        for start in range(0, len(items), size):
+            try:
+                self.flusher(dict(items[start : start + size]))
+            except NotApplied:
+                # Earlier batches are committed; only these are retried
+                self._restore(items[start:])
+                raise
+            except Exception:
+                # This batch may have been written; counting it again could
+                # double it, so it is dropped
+                self._restore(items[start + size :])
+                raise
+        return len(items)
+
+    def _restore(self, items: List[Tuple[str, Dict[str, int]]]) -> None:
+        with self._lock:
+            for rule_id, delta in items:
+                counts = self._counts.setdefault(rule_id, dict.fromkeys(COUNTERS, 0))
+                for key in COUNTERS:
+                    counts[key] += delta[key]
+
+    def start(self, interval: float = 60) -> threading.Thread:
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error("Rule stats: flush failed: %s", e)
+
+        thread = threading.Thread(target=loop, name="rule-stats-flush", daemon=True)
+        thread.start()
+        return thread
+
+
+def summarize(totals: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Stored totals for one rule as hit rate and evaluation cost.
+
+    A rule pinned to an extension is only tested on files with that
+    extension, so its hit rate is relative to those files.
+    """
+    totals = totals or {}
+    evaluations = int(totals.get("evaluations") or 0)
+    hits = int(totals.get("hits") or 0)
+    eval_ns = int(totals.get("eval_ns") or 0)
+    return {
+        "evaluations": evaluations,
+        "hits": hits,
+        "hit_rate": round(hits / evaluations, 4) if evaluations else None,
+        "avg_eval_us": (
+            round(eval_ns / evaluations / 1000, 3) if evaluations else None
+        ),
+        "total_eval_ms": round(eval_ns / 1e6, 3),
+        "last_hit_at": totals.get("last_hit_at"),
+    }
@@ -0,0 +1,281 @@
+# common/search_index.py
+
+import datetime as dt
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from common.tenants import tenant_of
+
+logger = logging.getLogger(__name__)
+
+# /upload names objects "uploads/<uuid hex>__<original name>"
+_UPLOAD_PREFIX = re.compile(r"^[0-9a-f]{32}__")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    job_id         TEXT PRIMARY KEY,
+    tenant_id      TEXT NOT NULL,
+    name           TEXT NOT NULL,
+    name_lc        TEXT NOT NULL,
+    source_bucket  TEXT,
+    source_blob    TEXT,
+    dest_bucket    TEXT,
+    dest_blob      TEXT,
+    classification TEXT,
+    rule_id        TEXT,
+    tags           TEXT,
+    action         TEXT,
+    completed_at   TEXT
+);
+CREATE INDEX IF NOT EXISTS files_by_name
+    ON files (tenant_id, name_lc);
+CREATE INDEX IF NOT EXISTS files_by_date
+    ON files (tenant_id, completed_at);
+CREATE INDEX IF NOT EXISTS files_by_classification
+    ON files (tenant_id, classification, completed_at);
+CREATE INDEX IF NOT EXISTS files_by_rule
+    ON files (tenant_id, rule_id, completed_at);
+
+-- Trigram tokens make any substring of 3+ characters an index lookup
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5 (
+    name, dest_blob, tags,
+    content='files', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts (rowid, name, dest_blob, tags)
+    VALUES (new.rowid, new.name, new.dest_blob, new.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, name, dest_blob, tags)
+    VALUES ('delete', old.rowid, old.name, old.dest_blob, old.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, name, dest_blob, tags)
+    VALUES ('delete', old.rowid, old.name, old.dest_blob, old.tags);
+    INSERT INTO files_fts (rowid, name, dest_blob, tags)
+    VALUES (new.rowid, new.name, new.dest_blob, new.tags);
+END;
+"""
+
+_COLUMNS = (
+    "job_id",
+    "tenant_id",
+    "name",
+    "name_lc",
+    "source_bucket",
+    "source_blob",
+    "dest_bucket",
+    "dest_blob",
+    "classification",
+    "rule_id",
+    "tags",
+    "action",
+    "completed_at",
+)
+
+_UPSERT = (
+    f"INSERT INTO files ({', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _COLUMNS)}) "
+    "ON CONFLICT (job_id) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in _COLUMNS[1:])
+)
+
+
+def display_name(blob_name: str) -> str:
+    """
+    The file name a user would search for: the object's base name without
+    the uuid prefix /upload adds.
+    """
+    return _UPLOAD_PREFIX.sub("", os.path.basename(blob_name or ""))
+
+
+def _row(record: Dict[str, Any]) -> tuple:
+    name = display_name(record.get("source_blob") or record.get("dest_blob") or "")
+    completed_at = record.get("completed_at")
+    if isinstance(completed_at, dt.datetime):
+        completed_at = completed_at.isoformat()
+    values = {
+        **record,
+        "tenant_id": tenant_of(record),
+        "name": name,
+        "name_lc": name.lower(),
+        "tags": " ".join(record.get("tags") or []),
+        "completed_at": completed_at,
+    }
+    return tuple(values.get(c) for c in _COLUMNS)
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    # Smallest string greater than every string starting with `prefix`
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SearchIndex:
+    """
+    Incrementally maintained SQLite index of processed files.
+
+    One row per job (re-processing a file replaces its row), with B-tree
+    indexes for filename prefixes and the classification/rule/date filters
+    and an FTS5 trigram index for substring search, so lookups stay in the
+    millisecond range at millions of rows.
+
+    The database lives in a local file; snapshot() copies a consistent
+    image of it to GCS and restore() brings it back on a fresh instance.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def upsert(self, records: Iterable[Dict[str, Any]]) -> int:
+        rows = [_row(r) for r in records if r.get("job_id")]
+        with self._lock, self._conn:
+            self._conn.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def search(
+        self,
+        tenant_id: str,
+        q: str = "",
+        mode: str = "substring",
+        classification: Optional[str] = None,
+        rule_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """
+        Newest matching files first.
+
+        mode="prefix" matches the start of the file name; "substring"
+        matches anywhere in the name, the destination path or the tags.
+        Both ignore case. since/until are ISO dates or timestamps compared
+        against completed_at.
+        """
+        where: List[str] = []
+        params: List[Any] = []
+        q = q.strip()
+
+        # A substring match is resolved through the trigram index first; the
+        # unary "+" then keeps SQLite from preferring a date-ordered index
+        # scan that would probe the match once per row.
+        matched = bool(q) and mode != "prefix" and len(q) >= 3
+        col = "+f." if matched else "f."
+
+        if q and mode == "prefix":
+            where.append("f.name_lc >= ? AND f.name_lc < ?")
+            params += [q.lower(), _prefix_upper_bound(q.lower())]
+        elif matched:
+            where.append(
+                "f.rowid IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)"
+            )
+            params.append('"' + q.replace('"', '""') + '"')
+        elif q:
+            # Too short for a trigram; fall back to a scan of the names
+            where.append("f.name_lc LIKE ? ESCAPE '\\'")
+            escaped = re.sub(r"([%_\\])", r"\\\1", q.lower())
+            params.append(f"%{escaped}%")
+
+        where.append(f"{col}tenant_id = ?")
+        params.append(tenant_id)
+        for column, value in (("classification", classification), ("rule_id", rule_id)):
+            if value:
+                where.append(f"{col}{column} = ?")
+                params.append(value)
+        if since:
+            where.append(f"{col}completed_at >= ?")
+            params.append(since)
+        if until:
+            where.append(f"{col}completed_at < ?")
+            params.append(until)
+
+        sql = (
+            f"SELECT f.* FROM files f WHERE {' AND '.join(where)} "
+            f"ORDER BY {col}completed_at DESC LIMIT ?"
+        )
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        results = []
+        for row in rows:
+            item = {k: row[k] for k in row.keys() if k != "name_lc"}
+            item["tags"] = item["tags"].split() if item["tags"] else []
+            results.append(item)
+        return results
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    # ------------------------------ snapshots -------------------------------
+
+    def snapshot(self, storage_client, uri: str) -> None:
+        """
+        Upload a consistent copy of the index to gs://bucket/path.
+        """
+        bucket_name, _, blob_name = uri[len("gs://") :].partition("/")
+        with tempfile.NamedTemporaryFile(suffix=".sqlite") as tmp:
+            target = sqlite3.connect(tmp.name)
+            try:
+                with self._lock:
+                    self._conn.backup(target)
+            finally:
+                target.close()
+            storage_client.bucket(bucket_name).blob(blob_name).upload_from_filename(
+                tmp.name, content_type="application/vnd.sqlite3"
+            )
+
+    @classmethod
+    def restore(cls, storage_client, uri: str, path: str) -> "SearchIndex":
+        """
+        Open the index at `path`, first downloading the snapshot at `uri`
+        if there is no local copy yet.
+        """
+        if not os.path.exists(path):
+            bucket_name, _, blob_name = uri[len("gs://") :].partition("/")
+            blob = storage_client.bucket(bucket_name).blob(blob_name)
+            try:
+                blob.download_to_filename(path)
+            except Exception as e:
+                logger.warning("Search index: no snapshot restored from %s: %s", uri, e)
+                if os.path.exists(path):
+                    os.remove(path)
+        return cls(path)
+
+    def start_snapshots(
+        self, storage_client, uri: str, interval: float = 300
+    ) -> threading.Thread:
+        """
+        Snapshot to `uri` from a daemon thread every `interval` seconds,
+        skipping rounds in which nothing changed.
+        """
+
+        def loop():
+            last_changes = None
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    changes = self._conn.total_changes
+                if changes == last_changes:
+                    continue
+                try:
+                    self.snapshot(storage_client, uri)
+                    last_changes = changes
+                except Exception as e:
+                    logger.error("Search index: snapshot to %s failed: %s", uri, e)
+
+        thread = threading.Thread(target=loop, name="search-snapshot", daemon=True)
+        thread.start()
+        return thread
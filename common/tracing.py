@@ -0,0 +1,225 @@
+# common/tracing.py
+
+import contextlib
+import contextvars
+import importlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# W3C Trace Context: version-traceid-parentid-flags
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """
+    One timed operation. `trace_id` ties together every span of one file's
+    trip through the pipeline; `parent_id` is the span that caused it,
+    possibly in another service.
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "sampled",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "status",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        sampled: bool,
+        attributes: Dict[str, Any],
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = "ok"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "service": SERVICE,
+            "attributes": self.attributes,
+        }
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "span", default=None
+)
+
+# ------------------------------- Exporters ----------------------------------
+
+
+class FileExporter:
+    """
+    Appends finished spans as JSON lines to a local file, for offline
+    analysis (e.g. `jq`, DuckDB or pandas) without any tracing backend.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Dict[str, Any]) -> None:
+        line = json.dumps(span, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def log_exporter(span: Dict[str, Any]) -> None:
+    """
+    Writes finished spans to the service log as "span" events, so they can
+    be sampled with LOG_SAMPLE_RATES=span=... like any per-message line.
+    """
+    logger.info(
+        "span %s %sms",
+        span["name"],
+        span["duration_ms"],
+        extra={"event": "span", "span": span},
+    )
+
+
+def exporter_from_env() -> Optional[Callable[[Dict[str, Any]], None]]:
+    """
+    TRACE_EXPORTER: "file" (TRACE_FILE, default traces.jsonl), "log",
+    "module:callable" for a custom exporter taking one span dict, or unset
+    for none.
+    """
+    name = os.getenv("TRACE_EXPORTER", "").strip()
+    if not name or name == "none":
+        return None
+    if name == "file":
+        return FileExporter(os.getenv("TRACE_FILE", "traces.jsonl"))
+    if name == "log":
+        return log_exporter
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+SERVICE = os.getenv("K_SERVICE", "")
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+_exporter = exporter_from_env()
+
+
+def configure(
+    service: Optional[str] = None,
+    exporter: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> None:
+    """
+    Name the service in exported spans and, optionally, replace the
+    exporter chosen by TRACE_EXPORTER.
+    """
+    global SERVICE, _exporter
+    if service:
+        SERVICE = service
+    if exporter is not None:
+        _exporter = exporter
+
+
+def _export(span: Span) -> None:
+    try:
+        _exporter(span.to_dict())
+    except Exception as e:
+        logger.warning("Tracing: export of %s failed: %s", span.name, e)
+
+
+# -------------------------------- Context -----------------------------------
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple]:
+    """
+    (trace_id, parent_span_id, sampled) from a traceparent header, or None
+    if it is missing or malformed.
+    """
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def current_traceparent() -> Optional[str]:
+    current = _current.get()
+    return current.traceparent if current is not None else None
+
+
+@contextlib.contextmanager
+def span(name: str, parent: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Time the block as a child of `parent` (a traceparent from a message or
+    request) or, without one, of the current span; with neither it starts a
+    new trace. Exceptions mark the span as an error and propagate.
+    """
+    remote = parse_traceparent(parent) if parent else None
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+    else:
+        outer = _current.get()
+        if outer is not None:
+            trace_id, parent_id, sampled = outer.trace_id, outer.span_id, outer.sampled
+        else:
+            trace_id = f"{random.getrandbits(128):032x}"
+            parent_id = None
+            sampled = random.random() < SAMPLE_RATE
+
+    current = Span(name, trace_id, parent_id, sampled, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        if sampled and _exporter is not None:
+            _export(current)
+
+
+def install_request_tracing(app) -> None:
+    """
+    One span per HTTP request, continuing the caller's `traceparent` header,
+    which is echoed back in the response.
+    """
+
+    @app.middleware("http")
+    async def trace_requests(request, call_next):
+        with span(
+            f"{request.method} {request.url.path}",
+            parent=request.headers.get("traceparent"),
+        ) as current:
+            response = await call_next(request)
+            current.attributes["status"] = response.status_code
+            response.headers["traceparent"] = current.traceparent
+            return response
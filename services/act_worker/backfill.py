@@ -0,0 +1,469 @@
+# services/act_worker/backfill.py
+#
+# Re-evaluate the current rules against objects already sitting in a bucket.
+#
+#   python backfill.py --bucket drbfo-organized --prefix reports/ \
+#       --checkpoint backfill.json --rate 50 --workers 16 --shards 8
+#
+# Run it from services/act_worker (same image as the worker), or as
+# `python -m services.act_worker.backfill` from the repo root.
+
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from google.cloud import storage, firestore
+
+from common.actions import (
+    GCS_BATCH_LIMIT,
+    compress_object,
+    copy_object,
+    delete_objects,
+    is_compressible,
+    object_metadata,
+    resolve_destinations,
+)
+from common.classification import simple_classification
+from common.config import (
+    GCP_PROJECT_ID,
+    UPLOAD_BUCKET,
+    PROCESSED_BUCKET,
+    JOBS_COLLECTION,
+)
+from common.ratelimit import TokenBucket
+from common.rules import apply_actions, compile_rules
+from common.tenants import DEFAULT_TENANT, load_tenant_rules, tenant_of
+
+logger = logging.getLogger(__name__)
+
+RULES_COLLECTION = os.getenv("RULES_COLLECTION", "rules")
+
+# Firestore rejects commits with more than 500 writes.
+FIRESTORE_BATCH_LIMIT = 500
+
+# Shard boundaries are spread over the characters object names usually
+# start with; the first and last shards are open-ended, so every name is
+# covered by exactly one shard.
+SHARD_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def shard_ranges(prefix: str, shards: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Split the key space under `prefix` into `shards` (start, end) ranges
+    suitable for list_blobs(start_offset=..., end_offset=...).
+    """
+    shards = max(1, min(shards, len(SHARD_ALPHABET)))
+    bounds = [
+        prefix + SHARD_ALPHABET[round(i * len(SHARD_ALPHABET) / shards)]
+        for i in range(1, shards)
+    ]
+    starts = [None] + bounds
+    ends = bounds + [None]
+    return list(zip(starts, ends))
+
+
+class Checkpoint:
+    """
+    Per-shard progress stored as a small JSON file.
+
+    Each shard records the last object name whose work completed, so a
+    resumed run restarts every shard just after that name. After a failure
+    the name stops advancing, so a resumed run retries the failed objects.
+    """
+
+    def __init__(self, path: Optional[str], run: Dict[str, Any]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: Dict[str, Any] = {"run": run, "shards": {}}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("run") != run:
+                raise SystemExit(
+                    f"Checkpoint {path} belongs to a different run: {saved.get('run')}"
+                )
+            self._state = saved
+
+    def shard(self, index: int) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._state["shards"].get(str(index), {}))
+
+    def update(self, index: int, **fields: Any) -> None:
+        with self._lock:
+            self._state["shards"].setdefault(str(index), {}).update(fields)
+            if not self.path:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._state, f)
+            os.replace(tmp, self.path)
+
+
+class Backfill:
+    """
+    Lists `bucket`/`prefix` in parallel shards and applies the current rules.
+
+    Copies run on a bounded thread pool; source deletes are sent as batched
+    GCS requests once the page's copies have finished. Every object
+    operation takes a token from a shared rate limiter.
+    """
+
+    def __init__(
+        self,
+        storage_client,
+        db,
+        bucket: str,
+        prefix: str = "",
+        *,
+        shards: int = 8,
+        workers: int = 16,
+        rate: float = 50.0,
+        page_size: int = 200,
+        checkpoint_path: Optional[str] = None,
+        dry_run: bool = False,
+        move_unmatched: bool = False,
+        tenant: str = DEFAULT_TENANT,
+    ):
+        self.storage_client = storage_client
+        self.db = db
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ranges = shard_ranges(prefix, shards)
+        self.workers = workers
+        self.page_size = page_size
+        self.dry_run = dry_run
+        self.move_unmatched = move_unmatched
+        self.tenant = tenant
+        self.limiter = TokenBucket(rate)
+        self.checkpoint = Checkpoint(
+            None if dry_run else checkpoint_path,
+            {"bucket": bucket, "prefix": prefix, "shards": len(self.ranges)},
+        )
+        self.ruleset = compile_rules(self._load_rules())
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _load_rules(self) -> List[Dict[str, Any]]:
+        return load_tenant_rules(
+            self.db.collection(RULES_COLLECTION), self.tenant, enabled_only=True
+        )
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # ------------------------------ planning --------------------------------
+
+    def plan(self, blob) -> Optional[Dict[str, Any]]:
+        """
+        Decide what the current rules would do with an existing object.
+        Returns None when the object should be left where it is.
+        """
+        _, ext = os.path.splitext(blob.name)
+        file_meta = {
+            "name": blob.name,
+            "ext": ext,
+            "file_size": blob.size or 0,
+            "mime_type": blob.content_type,
+        }
+        classification = simple_classification(blob.content_type, ext)
+
+        rule = self.ruleset.first_match(file_meta)
+        if rule is None:
+            if not self.move_unmatched:
+                return None
+            applied = {"dest_bucket": PROCESSED_BUCKET, "dest_folder": None}
+        else:
+            applied = apply_actions(rule, file_meta)
+
+        if rule is not None and applied.get("delete_source_only"):
+            return {"op": "delete", "rule": rule}
+
+        targets = resolve_destinations(applied, classification, blob.name)
+        dest_bucket, dest_folder, dest_blob = targets[0]
+        if (dest_bucket, dest_blob) == (self.bucket, blob.name):
+            return None
+        return {
+            "op": "move",
+            "rule": rule,
+            "dest_bucket": dest_bucket,
+            "dest_folder": dest_folder,
+            "dest_blob": dest_blob,
+            # Further destinations of a fan-out rule, copied before the
+            # source is deleted
+            "replicas": [(bucket, blob_name) for bucket, _, blob_name in targets[1:]],
+            "tags": applied.get("tags", []),
+            "storage_class": applied.get("storage_class"),
+            "hold": applied.get("hold"),
+            "compress": (
+                applied.get("compress")
+                if is_compressible(blob.content_type, ext)
+                else None
+            ),
+            "content_type": blob.content_type,
+            "classification": classification,
+        }
+
+    # ------------------------------ execution -------------------------------
+
+    def _copy(self, blob_name: str, plan: Dict[str, Any]) -> bool:
+        self.limiter.acquire()
+        try:
+            options: Dict[str, Any] = {}
+            if (
+                plan["tags"]
+                or plan["storage_class"]
+                or plan["hold"]
+                or plan["compress"]
+            ):
+                options = {
+                    "content_type": plan["content_type"],
+                    "metadata": object_metadata(
+                        {
+                            "classification": plan["classification"],
+                            "tenant_id": self.tenant,
+                        },
+                        plan,
+                        plan["rule"],
+                    ),
+                    "storage_class": plan["storage_class"],
+                    "hold": plan["hold"],
+                }
+            destinations = [(plan["dest_bucket"], plan["dest_blob"])]
+            for dest_bucket, dest_blob in destinations + plan.get("replicas", []):
+                if plan["compress"]:
+                    compress_object(
+                        self.storage_client,
+                        self.bucket,
+                        blob_name,
+                        dest_bucket,
+                        dest_blob,
+                        plan["compress"],
+                        **options,
+                    )
+                else:
+                    copy_object(
+                        self.storage_client,
+                        self.bucket,
+                        blob_name,
+                        dest_bucket,
+                        dest_blob,
+                        **options,
+                    )
+            return True
+        except Exception as e:
+            logger.error(
+                "Backfill: copy of gs://%s/%s failed: %s", self.bucket, blob_name, e
+            )
+            self._count("failed")
+            return False
+
+    def _delete(self, blob_names: List[str]) -> List[str]:
+        deleted: List[str] = []
+        for start in range(0, len(blob_names), GCS_BATCH_LIMIT):
+            chunk = blob_names[start : start + GCS_BATCH_LIMIT]
+            for _ in chunk:
+                self.limiter.acquire()
+            try:
+                delete_objects(self.storage_client, self.bucket, chunk)
+                deleted.extend(chunk)
+            except Exception as e:
+                logger.error("Backfill: batched delete failed: %s", e)
+                self._count("failed", len(chunk))
+        return deleted
+
+    def _record_jobs(self, done: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Mirror the act worker's job update for objects still in the upload
+        bucket; their job id can be derived the same way the inspect worker
+        derives it. Objects elsewhere have no recoverable job id.
+        """
+        if self.bucket != UPLOAD_BUCKET or not done:
+            return
+        now = dt.datetime.utcnow().isoformat() + "Z"
+        for start in range(0, len(done), FIRESTORE_BATCH_LIMIT):
+            chunk = done[start : start + FIRESTORE_BATCH_LIMIT]
+            try:
+                self._record_chunk(chunk, now)
+            except Exception as e:
+                # The objects have already moved; only their job docs are stale
+                logger.error("Backfill: job update failed: %s", e)
+                self._count("failed_job_updates", len(chunk))
+
+    def _record_chunk(self, done: List[Tuple[str, Dict[str, Any]]], now: str) -> None:
+        batch = self.db.batch()
+        for blob_name, plan in done:
+            job_id = f"{self.bucket}/{blob_name}".replace("/", "__")
+            rule = plan.get("rule") or {}
+            action: Dict[str, Any] = {"backfill": True, "acted_at": now}
+            if plan["op"] == "delete":
+                action.update(
+                    action="delete", deleted_bucket=self.bucket, deleted_blob=blob_name
+                )
+            else:
+                action.update(
+                    dest_bucket=plan["dest_bucket"],
+                    dest_blob=plan["dest_blob"],
+                    dest_folder=plan["dest_folder"],
+                    classification=plan["classification"],
+                    tags=plan["tags"],
+                )
+            if rule:
+                action.update(rule_id=rule.get("id"), rule_name=rule.get("name"))
+            batch.set(
+                self.db.collection(JOBS_COLLECTION).document(job_id),
+                {"action": action, "status": "COMPLETED", "updated_at": now},
+                merge=True,
+            )
+        batch.commit()
+
+    def process_page(self, blobs: List[Any]) -> Set[str]:
+        """
+        Apply the rules to one page of objects; returns the names of the
+        objects whose copy or delete failed. Objects of other tenants (by
+        their tenant_id metadata) are left alone.
+        """
+        own = [b for b in blobs if tenant_of(b.metadata or {}) == self.tenant]
+        planned = [(blob.name, self.plan(blob)) for blob in own]
+        planned = [(name, plan) for name, plan in planned if plan]
+        self._count("listed", len(blobs))
+        self._count("other_tenant", len(blobs) - len(own))
+        self._count("unchanged", len(own) - len(planned))
+        if not planned:
+            return set()
+
+        if self.dry_run:
+            for name, plan in planned:
+                target = (
+                    "delete"
+                    if plan["op"] == "delete"
+                    else f"gs://{plan['dest_bucket']}/{plan['dest_blob']}"
+                )
+                logger.info(
+                    "Backfill (dry run): gs://%s/%s → %s", self.bucket, name, target
+                )
+                self._count(plan["op"])
+            return set()
+
+        moves = [(name, plan) for name, plan in planned if plan["op"] == "move"]
+        copied = list(self._pool.map(lambda item: self._copy(*item), moves))
+
+        to_delete = [name for name, plan in planned if plan["op"] == "delete"]
+        to_delete += [name for (name, _), ok in zip(moves, copied) if ok]
+        deleted = set(self._delete(to_delete))
+
+        done = [(name, plan) for name, plan in planned if name in deleted]
+        self._record_jobs(done)
+        for _, plan in done:
+            self._count(plan["op"])
+        return {name for name, _ in planned if name not in deleted}
+
+    def run_shard(self, index: int) -> None:
+        state = self.checkpoint.shard(index)
+        if state.get("done"):
+            return
+
+        start, end = self.ranges[index]
+        last = state.get("last")
+        if last:
+            start = last
+
+        pages = self.storage_client.list_blobs(
+            self.bucket,
+            prefix=self.prefix or None,
+            start_offset=start,
+            end_offset=end,
+            page_size=self.page_size,
+        ).pages
+        held = False
+        for page in pages:
+            blobs = [b for b in page if b.name != last]
+            if not blobs:
+                continue
+            failed = self.process_page(blobs)
+            if held:
+                continue
+            if failed:
+                # Stop just before the first failure; the objects after it
+                # that did move are no longer listed on resume
+                first = next(i for i, b in enumerate(blobs) if b.name in failed)
+                if first:
+                    self.checkpoint.update(index, last=blobs[first - 1].name)
+                held = True
+            else:
+                self.checkpoint.update(index, last=blobs[-1].name)
+
+        if held:
+            logger.warning(
+                "Backfill: shard %d/%d had failures; resume to retry them",
+                index + 1,
+                len(self.ranges),
+            )
+            return
+        self.checkpoint.update(index, done=True)
+        logger.info("Backfill: shard %d/%d finished", index + 1, len(self.ranges))
+
+    def run(self) -> Counter:
+        with ThreadPoolExecutor(self.workers) as pool:
+            self._pool = pool
+            with ThreadPoolExecutor(len(self.ranges)) as shard_pool:
+                list(shard_pool.map(self.run_shard, range(len(self.ranges))))
+        return self.stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Re-apply the current rules to objects already in a bucket."
+    )
+    parser.add_argument("--bucket", default=PROCESSED_BUCKET)
+    parser.add_argument("--prefix", default="")
+    parser.add_argument("--shards", type=int, default=8, help="parallel listings")
+    parser.add_argument("--workers", type=int, default=16, help="concurrent copies")
+    parser.add_argument(
+        "--rate", type=float, default=50.0, help="object operations/sec (0 = unlimited)"
+    )
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--checkpoint", help="JSON file used to resume the run")
+    parser.add_argument(
+        "--move-unmatched",
+        action="store_true",
+        help="move objects no rule matches to their default classification folder",
+    )
+    parser.add_argument(
+        "--tenant",
+        default=DEFAULT_TENANT,
+        help="whose rules to apply, and to whose objects",
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
+
+    backfill = Backfill(
+        storage.Client(),
+        firestore.Client(project=GCP_PROJECT_ID),
+        args.bucket,
+        args.prefix,
+        shards=args.shards,
+        workers=args.workers,
+        rate=args.rate,
+        page_size=args.page_size,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run,
+        move_unmatched=args.move_unmatched,
+        tenant=args.tenant,
+    )
+    stats = backfill.run()
+    logger.info("Backfill finished: %s", dict(stats))
+
+
+if __name__ == "__main__":
+    main()
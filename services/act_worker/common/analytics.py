@@ -0,0 +1,214 @@
+# common/analytics.py
+
+import datetime as dt
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+if HAS_PYARROW:
+    SCHEMA = pa.schema(
+        [
+            ("job_id", pa.string()),
+            ("tenant_id", pa.string()),
+            ("completed_at", pa.timestamp("ms", tz="UTC")),
+            ("action", pa.string()),
+            ("source_bucket", pa.string()),
+            ("source_blob", pa.string()),
+            ("dest_bucket", pa.string()),
+            ("dest_blob", pa.string()),
+            ("classification", pa.string()),
+            ("mime_type", pa.string()),
+            ("file_size", pa.int64()),
+            ("lane", pa.string()),
+            ("rule_id", pa.string()),
+            ("tags", pa.list_(pa.string())),
+            ("storage_class", pa.string()),
+            ("compression_ratio", pa.float64()),
+        ]
+    )
+
+
+def job_record(
+    file_meta: Dict[str, Any], action: str, action_doc: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Flatten one completed job into an analytics row.
+    """
+    return {
+        "job_id": file_meta.get("job_id"),
+        "tenant_id": file_meta.get("tenant_id"),
+        "completed_at": dt.datetime.now(dt.timezone.utc),
+        "action": action,
+        "source_bucket": file_meta.get("bucket"),
+        "source_blob": file_meta.get("blob"),
+        "dest_bucket": action_doc.get("dest_bucket"),
+        "dest_blob": action_doc.get("dest_blob"),
+        "classification": file_meta.get("classification"),
+        "mime_type": file_meta.get("mime_type"),
+        "file_size": int(file_meta.get("file_size") or 0),
+        "lane": file_meta.get("lane"),
+        "rule_id": action_doc.get("rule_id"),
+        "tags": list(action_doc.get("tags") or []),
+        "storage_class": action_doc.get("storage_class"),
+        "compression_ratio": (action_doc.get("compression") or {}).get("ratio"),
+    }
+
+
+def partition_path(target: str, day: dt.date) -> str:
+    """
+    Hive-style date partition, understood by BigQuery external tables,
+    DuckDB, Spark and pyarrow.dataset alike.
+    """
+    return f"{target.rstrip('/')}/date={day.isoformat()}"
+
+
+def write_parquet(storage_client, path: str, rows: List[Dict[str, Any]]) -> None:
+    """
+    Write `rows` as one Parquet file to a local path or a gs:// URI.
+    """
+    table = pa.Table.from_pylist(rows, schema=SCHEMA)
+    if not path.startswith("gs://"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table, path, compression="zstd")
+        return
+
+    buf = io.BytesIO()
+    pq.write_table(table, buf, compression="zstd")
+    bucket_name, _, blob_name = path[len("gs://") :].partition("/")
+    blob = storage_client.bucket(bucket_name).blob(blob_name)
+    blob.upload_from_string(
+        buf.getvalue(), content_type="application/vnd.apache.parquet"
+    )
+
+
+class AnalyticsSink:
+    """
+    Micro-batches completed-job rows into date-partitioned Parquet files
+    under `target` (a local directory or gs://bucket/prefix).
+
+    A batch is written when it holds `max_rows` rows or its oldest row is
+    `max_age` seconds old. Once start()ed, batches are written by the
+    flush thread, never by the thread recording the row. Rows are buffered
+    in memory only, so a crash loses at most one unwritten batch; the jobs
+    collection stays the system of record.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        storage_client=None,
+        max_rows: int = 5000,
+        max_age: float = 300,
+        writer: Callable[[Any, str, List[Dict[str, Any]]], None] = write_parquet,
+    ):
+        self.target = target
+        self.storage_client = storage_client
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.writer = writer
+        self._rows: List[Dict[str, Any]] = []
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            if not self._rows:
+                self._opened_at = time.monotonic()
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_rows
+        if not full:
+            return
+        if self._thread is not None:
+            self._wake.set()
+        else:
+            self.flush()
+
+    def flush(self, force: bool = True) -> int:
+        """
+        Write buffered rows (only a full or old enough batch unless
+        `force`); returns the number of rows written.
+        """
+        with self._lock:
+            if not self._rows:
+                return 0
+            if (
+                not force
+                and len(self._rows) < self.max_rows
+                and time.monotonic() - self._opened_at < self.max_age
+            ):
+                return 0
+            ready, self._rows = self._rows, []
+        self._write(ready)
+        return len(ready)
+
+    def start(self, interval: float = 10) -> threading.Thread:
+        def loop():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                try:
+                    self.flush(force=False)
+                except Exception as e:
+                    logger.error("Analytics: periodic flush failed: %s", e)
+
+        thread = threading.Thread(target=loop, name="analytics-flush", daemon=True)
+        self._thread = thread
+        thread.start()
+        return thread
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        by_day: Dict[dt.date, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_day.setdefault(row["completed_at"].date(), []).append(row)
+
+        stamp = dt.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        for day, day_rows in by_day.items():
+            path = (
+                f"{partition_path(self.target, day)}/"
+                f"part-{stamp}-{uuid.uuid4().hex[:8]}.parquet"
+            )
+            try:
+                self.writer(self.storage_client, path, day_rows)
+            except Exception as e:
+                logger.error(
+                    "Analytics: dropped %s rows for %s: %s", len(day_rows), path, e
+                )
+                continue
+            logger.info("Analytics: wrote %s rows to %s", len(day_rows), path)
+
+
+def sink_from_env(storage_client=None) -> Optional[AnalyticsSink]:
+    """
+    The sink configured by ANALYTICS_TARGET, or None when it is unset or
+    pyarrow is not installed.
+    """
+    target = os.getenv("ANALYTICS_TARGET", "")
+    if not target:
+        return None
+    if not HAS_PYARROW:
+        logger.warning("ANALYTICS_TARGET is set but pyarrow is not installed")
+        return None
+    sink = AnalyticsSink(
+        target,
+        storage_client,
+        max_rows=int(os.getenv("ANALYTICS_MAX_ROWS", "5000")),
+        max_age=float(os.getenv("ANALYTICS_MAX_AGE_SECONDS", "300")),
+    )
+    sink.start()
+    return sink
@@ -0,0 +1,40 @@
+# common/classification.py
+
+from typing import Iterable, Optional
+
+# Entries that identify Office Open XML files, which are ZIP archives
+_OFFICE_PARTS = (
+    ("word/document.xml", "documents"),
+    ("xl/workbook.xml", "spreadsheets"),
+    ("ppt/presentation.xml", "presentations"),
+)
+
+
+def simple_classification(
+    mime_type: str, ext: str, archive_names: Optional[Iterable[str]] = None
+) -> str:
+    """
+    Very basic classifier based on extension/MIME.
+    You can replace this with your more advanced logic.
+
+    `archive_names` are the entry names of a file the inspect worker
+    listed as a ZIP archive; what it contains wins over its extension.
+    """
+    ext = (ext or "").lower()
+    mime = (mime_type or "").lower()
+
+    if archive_names is not None:
+        names = set(archive_names)
+        for part, label in _OFFICE_PARTS:
+            if part in names:
+                return label
+        return "archives"
+    if ext in [".jpg", ".jpeg", ".png", ".gif"] or mime.startswith("image/"):
+        return "images"
+    if ext in [".csv", ".xlsx"] or "spreadsheet" in mime or "csv" in mime:
+        return "spreadsheets"
+    if ext in [".pdf"]:
+        return "pdfs"
+    if ext in [".txt"]:
+        return "text"
+    return "uncategorized"
@@ -1,147 +1,363 @@
 # services/act_worker/main.py
 
-import base64
-import json
+import asyncio
+import contextlib
+import contextvars
 import datetime as dt
 import logging
 import os
-from typing import Any, Dict, List
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, Request
 from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
 
-from google.cloud import storage, firestore
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import storage, firestore, pubsub_v1
 
 from common.config import (
     GCP_PROJECT_ID,
+    INGEST_TOPIC,
     UPLOAD_BUCKET,
     PROCESSED_BUCKET,
     JOBS_COLLECTION,
 )
+from common import fastjson, messages, tracing
+from common.actions import (
+    compress_object,
+    copy_object,
+    delete_objects,
+    delete_quietly,
+    is_compressible,
+    object_metadata,
+    resolve_destinations,
+)
+from common.analytics import job_record, sink_from_env
+from common.bundles import Bundler
+from common.fairness import FairScheduler
+from common.lanes import LANES, LARGE_LANE, SMALL_LANE, lane_of
+from common.limits import Saturated, saturated_response
+from common.log import install_request_logging, job_context, setup_logging
+from common.resilience import CircuitOpen, Dependencies, circuit_open_response
+from common.rule_stats import NotApplied, RuleStats
+from common.rules import STAGE_ACT, RuleSetCache, apply_actions
+from common.tenants import load_tenant_rules, tenant_of
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
+setup_logging("act-worker")
+tracing.configure("act-worker")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Cloud Run sends SIGTERM before it scales an instance in or replaces
+    # it; write out whatever is still held only in memory
+    await run_in_threadpool(flush_on_shutdown)
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+install_request_logging(app, logger)
 storage_client = storage.Client()
 db = firestore.Client(project=GCP_PROJECT_ID)
+publisher = pubsub_v1.PublisherClient()
+
+# Breaker + adaptive limit + retries around every downstream call. GCS has
+# one limiter for metadata calls (deletes) and one per lane for transfers
+# (copies, rewrites, compression), measured per MB moved, so multi-GB copies
+# in the large lane cannot shrink the limit small files are copied under.
+deps = Dependencies(("gcs", "gcs_small", "gcs_large", "firestore", "pubsub"))
+app.add_exception_handler(Saturated, saturated_response)
+app.add_exception_handler(CircuitOpen, circuit_open_response)
+
+
+def transfer_dependency(lane: str) -> str:
+    return f"gcs_{lane}"
+
+
+def transfer_cost(file_meta: Dict[str, Any]) -> float:
+    return max(1.0, (file_meta.get("file_size") or 0) / (1024 * 1024))
+
+
+def lane_dependencies(lane: str) -> Tuple[str, ...]:
+    """
+    Dependencies a job in `lane` goes through; only these can reject it.
+    """
+    return ("gcs", transfer_dependency(lane), "firestore", "pubsub")
+
 
 RULES_COLLECTION = os.getenv("RULES_COLLECTION", "rules")
+RULES_CACHE_TTL_SECONDS = float(os.getenv("RULES_CACHE_TTL_SECONDS", "5"))
+# Per-rule evaluation counters, added to one document per rule
+RULE_STATS_COLLECTION = os.getenv("RULE_STATS_COLLECTION", "rule_stats")
+RULE_STATS_FLUSH_SECONDS = float(os.getenv("RULE_STATS_FLUSH_SECONDS", "60"))
+# One short-lived marker per flush makes a retried commit idempotent
+RULE_STATS_FLUSHES_COLLECTION = os.getenv(
+    "RULE_STATS_FLUSHES_COLLECTION", "rule_stats_flushes"
+)
+# Firestore accepts at most 500 writes per batch
+FIRESTORE_BATCH_LIMIT = 500
+
+# Each lane gets its own thread pool, so multi-GB copies in the large lane
+# can never occupy the threads small files are waiting for.
+LANE_CONCURRENCY = {
+    SMALL_LANE: int(os.getenv("SMALL_LANE_CONCURRENCY", "32")),
+    LARGE_LANE: int(os.getenv("LARGE_LANE_CONCURRENCY", "4")),
+}
+# Pushes allowed to wait for a lane thread before we answer 429
+LANE_MAX_QUEUED = int(os.getenv("LANE_MAX_QUEUED", "16"))
+
+LANE_EXECUTORS = {
+    lane: ThreadPoolExecutor(
+        max_workers=LANE_CONCURRENCY[lane], thread_name_prefix=f"act-{lane}"
+    )
+    for lane in LANES
+}
+lane_inflight = {lane: 0 for lane in LANES}
+
+# Copies for rules with several destinations run here, all at once. Shared
+# by both lanes and bounded, so fan-out cannot multiply GCS concurrency.
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "16"))
+fanout_executor = ThreadPoolExecutor(
+    max_workers=FANOUT_CONCURRENCY, thread_name_prefix="act-fanout"
+)
+# Within a lane, threads are shared between tenants by weighted fair
+# queueing, with a per-tenant quota (TENANT_WEIGHTS, TENANT_MAX_SHARE,
+# TENANT_MAX_QUEUED)
+lane_schedulers = {
+    lane: FairScheduler.from_env(f"act-{lane}", LANE_CONCURRENCY[lane])
+    for lane in LANES
+}
+
+# Completed jobs are exported as Parquet when ANALYTICS_TARGET is set
+analytics = sink_from_env(storage_client)
+
+# ...and published to SEARCH_TOPIC, when set, for the indexer's file search
+SEARCH_TOPIC = os.getenv("SEARCH_TOPIC", "")
+
+# Optional small-file bundling: files up to BUNDLE_MAX_FILE_BYTES are packed
+# into tar bundles per destination folder instead of becoming one object each.
+BUNDLE_ENABLED = os.getenv("BUNDLE_ENABLED", "false").lower() == "true"
+BUNDLE_MAX_FILE_BYTES = int(os.getenv("BUNDLE_MAX_FILE_BYTES", str(1024 * 1024)))
+BUNDLE_MAX_BYTES = int(os.getenv("BUNDLE_MAX_BYTES", str(64 * 1024 * 1024)))
+BUNDLE_MAX_FILES = int(os.getenv("BUNDLE_MAX_FILES", "1000"))
+# Keep well below the reconciler's STRANDED_AFTER_SECONDS
+BUNDLE_MAX_AGE_SECONDS = float(os.getenv("BUNDLE_MAX_AGE_SECONDS", "60"))
+
+
+def _log_search_publish(future) -> None:
+    if future.exception() is not None:
+        logger.warning("Search index update not published: %s", future.exception())
+
+
+def record_completed(row: Dict[str, Any]) -> None:
+    """
+    Hand one completed job (an analytics.job_record row) to the analytics
+    export and the search index. Neither is the system of record, so the
+    search publish is not waited on.
+    """
+    if analytics is not None:
+        analytics.record(row)
+    if SEARCH_TOPIC:
+        future = publisher.publish(
+            publisher.topic_path(GCP_PROJECT_ID, SEARCH_TOPIC),
+            data=fastjson.dumps(row),
+            tenant_id=tenant_of(row),
+        )
+        future.add_done_callback(_log_search_publish)
+
+
+def publish_event(
+    topic_name: str, event: Dict[str, Any], timeout: Optional[float] = None
+) -> None:
+    """
+    Publish and wait for Pub/Sub to accept the message.
+    """
+    data, attributes = messages.encode(event)
+    publisher.publish(
+        publisher.topic_path(GCP_PROJECT_ID, topic_name), data=data, **attributes
+    ).result(timeout=timeout)
 
 
 # -------------------------- Rule evaluation helpers --------------------------
 
 
-def load_rules() -> List[Dict[str, Any]]:
+def load_rules(tenant_id: str) -> List[Dict[str, Any]]:
     """
-    Load enabled rules from Firestore, sorted by priority.
+    Load a tenant's enabled rules from Firestore, sorted by priority.
     """
-    docs = db.collection(RULES_COLLECTION).where("enabled", "==", True).stream()
-    rules: List[Dict[str, Any]] = []
-    for d in docs:
-        data = d.to_dict() or {}
-        data["id"] = d.id
-        rules.append(data)
+    rules = load_tenant_rules(
+        db.collection(RULES_COLLECTION), tenant_id, enabled_only=True
+    )
 
     # Lowest priority number = highest priority
     rules.sort(key=lambda r: r.get("priority", 0))
     return rules
 
 
-def rule_matches(rule: Dict[str, Any], file_meta: Dict[str, Any]) -> bool:
+# Compiled rules per tenant, so one tenant's rule changes or burst never
+# forces a reload for the others
+rulesets = RuleSetCache(
+    lambda tenant_id: deps.call("firestore", load_rules, tenant_id, idempotent=True),
+    RULES_CACHE_TTL_SECONDS,
+)
+
+
+def flush_rule_stats(deltas: Dict[str, Dict[str, int]]) -> None:
     """
-    Supported condition types:
-      - extension: ".csv"  or "csv"
-      - name_contains: "report"
-      - size_gt_mb: "10"
-      - size_lt_mb: "1"
+    Add this instance's counts to the per-rule totals in Firestore, as one
+    batch (RuleStats hands over at most FIRESTORE_BATCH_LIMIT - 1 rules).
+
+    Increments are not idempotent, so the batch also creates a marker
+    document named after this flush: if an attempt landed but reported an
+    error, the retry fails with AlreadyExists instead of counting twice.
     """
-    if not rule.get("enabled", True):
-        return False
-
-    conditions = rule.get("conditions") or []
-    name = (file_meta.get("name") or "").lower()
-    ext = (file_meta.get("ext") or "").lower()
-    size_bytes = file_meta.get("file_size") or 0
-
-    for cond in conditions:
-        ctype = (cond.get("type") or "").lower()
-        value = (cond.get("value") or "").strip()
-
-        if not value:
-            continue
-
-        if ctype == "extension":
-            v = value.lower()
-            if not v.startswith("."):
-                v = "." + v
-            if ext != v:
-                return False
-
-        elif ctype == "name_contains":
-            if value.lower() not in name:
-                return False
-
-        elif ctype == "size_gt_mb":
-            try:
-                threshold = float(value) * 1024 * 1024
-            except ValueError:
-                continue
-            if size_bytes <= threshold:
-                return False
-
-        elif ctype == "size_lt_mb":
-            try:
-                threshold = float(value) * 1024 * 1024
-            except ValueError:
-                continue
-            if size_bytes >= threshold:
-                return False
+    flushed_at = dt.datetime.utcnow()
+    now = flushed_at.isoformat() + "Z"
+    batch = db.batch()
+    batch.create(
+        db.collection(RULE_STATS_FLUSHES_COLLECTION).document(uuid.uuid4().hex),
+        {
+            "rules": len(deltas),
+            "flushed_at": now,
+            # Removed by a Firestore TTL policy on this field
+            "expire_at": flushed_at + dt.timedelta(days=1),
+        },
+    )
+    for rule_id, delta in deltas.items():
+        fields: Dict[str, Any] = {
+            key: firestore.Increment(value) for key, value in delta.items()
+        }
+        fields["updated_at"] = now
+        if delta["hits"]:
+            fields["last_hit_at"] = now
+        batch.set(
+            db.collection(RULE_STATS_COLLECTION).document(rule_id),
+            fields,
+            merge=True,
+        )
+    try:
+        deps.call("firestore", batch.commit, idempotent=True)
+    except AlreadyExists:
+        # An earlier attempt of this very commit went through
+        pass
+    except (Saturated, CircuitOpen) as e:
+        # Rejected before it was sent
+        raise NotApplied(str(e)) from e
 
-        else:
-            # Unknown condition: ignore it
-            continue
 
-    return True
+rule_stats = RuleStats(flush_rule_stats, batch_size=FIRESTORE_BATCH_LIMIT - 1)
+rule_stats.start(RULE_STATS_FLUSH_SECONDS)
 
 
-def apply_actions(rule: Dict[str, Any], file_meta: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Supported actions:
-      - move_to_folder: "reports/2025"
-      - tag: "confidential"
-      - delete: "true" (value ignored)
-      - copy_to_bucket: "some-other-bucket"
-    """
-    actions = rule.get("actions") or []
-    dest_bucket = PROCESSED_BUCKET
-    dest_folder = None
-    tags: List[str] = []
-    delete_source_only = False
+# ------------------------------ Small-file bundles ------------------------------
 
-    for action in actions:
-        atype = (action.get("type") or "").lower()
-        value = (action.get("value") or "").strip()
 
-        if atype == "move_to_folder":
-            dest_folder = value
+def complete_bundled_jobs(bundle: Dict[str, Any], entries: List[Dict[str, Any]]):
+    """
+    Bundler callback, once a bundle and its index are written: complete
+    each job with its bundle location, then delete the sources.
+    """
+    now = dt.datetime.utcnow().isoformat() + "Z"
+    for start in range(0, len(entries), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        rows = []
+        for entry in entries[start : start + FIRESTORE_BATCH_LIMIT]:
+            action_doc = {
+                "dest_bucket": bundle["bucket"],
+                "dest_blob": bundle["blob"],
+                "classification": entry["classification"],
+                "dest_folder": entry["dest_folder"],
+                "tags": entry["tags"],
+                "storage_class": bundle["storage_class"],
+                "hold": None,
+                "bundle": {
+                    "blob": bundle["blob"],
+                    "index": bundle["index"],
+                    "member": entry["name"],
+                    "offset": entry["offset"],
+                    "size": entry["size"],
+                },
+                "acted_at": now,
+            }
+            if entry.get("rule_id"):
+                action_doc["rule_id"] = entry["rule_id"]
+                action_doc["rule_name"] = entry.get("rule_name")
+            batch.set(
+                db.collection(JOBS_COLLECTION).document(entry["job_id"]),
+                {"action": action_doc, "status": "COMPLETED", "updated_at": now},
+                merge=True,
+            )
+            rows.append(job_record(entry, "bundle", action_doc))
+        deps.call("firestore", batch.commit, idempotent=True)
+        for row in rows:
+            record_completed(row)
+
+    # Sources go only once every job is recorded as COMPLETED, so a failed
+    # commit cannot leave deleted sources without a record; a failed delete
+    # leaves a stray source next to a completed job
+    by_bucket: Dict[str, List[str]] = {}
+    for entry in entries:
+        by_bucket.setdefault(entry["bucket"], []).append(entry["blob"])
+    for bucket_name, blob_names in by_bucket.items():
+        deps.call(
+            "gcs",
+            delete_objects,
+            storage_client,
+            bucket_name,
+            blob_names,
+            idempotent=True,
+        )
 
-        elif atype == "copy_to_bucket":
-            dest_bucket = value or dest_bucket
 
-        elif atype == "tag":
-            if value:
-                tags.append(value)
+bundler = None
+if BUNDLE_ENABLED:
+    bundler = Bundler(
+        storage_client,
+        complete_bundled_jobs,
+        max_bytes=BUNDLE_MAX_BYTES,
+        max_files=BUNDLE_MAX_FILES,
+        max_age=BUNDLE_MAX_AGE_SECONDS,
+    )
+    bundler.start()
 
-        elif atype == "delete":
-            delete_source_only = True
 
-    return {
-        "dest_bucket": dest_bucket,
-        "dest_folder": dest_folder,
-        "tags": tags,
-        "delete_source_only": delete_source_only,
-    }
+def flush_on_shutdown() -> None:
+    """
+    Write open bundles, whose jobs are already acked, buffered analytics
+    rows and unflushed rule counters before the instance goes away.
+    """
+    if bundler is not None:
+        try:
+            written = bundler.flush_all()
+            logger.info("Act worker: wrote %d open bundles on shutdown", written)
+        except Exception as e:
+            logger.error("Act worker: bundle flush on shutdown failed: %s", e)
+    if analytics is not None:
+        try:
+            analytics.flush()
+        except Exception as e:
+            logger.error("Act worker: analytics flush on shutdown failed: %s", e)
+    try:
+        rule_stats.flush()
+    except Exception as e:
+        logger.error("Act worker: rule stats flush on shutdown failed: %s", e)
+
+
+def bundle_eligible(file_meta: Dict[str, Any], applied: Dict[str, Any]) -> bool:
+    """
+    Holds are per object and compression is per object, so files with
+    either always get their own object.
+    """
+    size = file_meta.get("file_size") or 0
+    return (
+        bundler is not None
+        and 0 < size <= BUNDLE_MAX_FILE_BYTES
+        and not applied["hold"]
+        and not applied["compress"]
+    )
 
 
 # ------------------------------- Pub/Sub entry -------------------------------
@@ -149,26 +365,24 @@ def apply_actions(rule: Dict[str, Any], file_meta: Dict[str, Any]) -> Dict[str,
 
 @app.post("/pubsub-push")
 async def pubsub_push(request: Request):
-    envelope = await request.json()
-    message = envelope.get("message", {})
-    data_b64 = message.get("data")
-    if not data_b64:
+    payload = messages.decode_push(await request.body())
+    if payload is None:
         logger.warning("Act worker: received Pub/Sub push with no data")
         return Response(status_code=204)
-
-    payload_json = base64.b64decode(data_b64).decode("utf-8")
-    payload = json.loads(payload_json)
-    logger.info(f"Act worker: received payload: {payload}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Act worker: received %s", messages.describe(payload))
 
     job_id = payload.get("job_id")
     bucket_name = payload.get("bucket") or UPLOAD_BUCKET
-    blob_name = payload.get("blob") or payload.get("name")
+    blob_name = payload.get("blob")
     classification = payload.get("classification") or "uncategorized"
 
     if not job_id or not bucket_name or not blob_name:
         logger.warning(
-            f"Act worker: missing required fields "
-            f"(job_id={job_id}, bucket={bucket_name}, blob={blob_name})"
+            "Act worker: missing required fields (job_id=%s, bucket=%s, blob=%s)",
+            job_id,
+            bucket_name,
+            blob_name,
         )
         return Response(status_code=204)
 
@@ -182,30 +396,113 @@ async def pubsub_push(request: Request):
         "file_size": payload.get("file_size") or 0,
         "ext": payload.get("ext") or "",
         "classification": classification,
+        "lane": lane_of(payload),
+        "tenant_id": tenant_of(payload),
+        "archive_entries": payload.get("archive_entries"),
+        "archive_names": payload.get("archive_names"),
+        "archive_names_truncated": payload.get("archive_names_truncated"),
     }
 
+    busy = deps.saturated(lane_dependencies(file_meta["lane"]))
+    if busy:
+        logger.warning("Act worker: %s saturated, rejecting %s", busy, job_id)
+        return Response(status_code=429)
+
+    if payload.get("ruleset_version"):
+        # This job skipped inspect/classify on the strength of that ruleset.
+        # If the rules have changed since and now need its content, send it
+        # back through the full pipeline instead of acting on a guess.
+        ruleset = await run_in_threadpool(rulesets.get, file_meta["tenant_id"])
+        if (
+            ruleset.version != payload["ruleset_version"]
+            and ruleset.route(file_meta) != STAGE_ACT
+        ):
+            logger.info(
+                "Act worker: rules changed, re-inspecting %s (%s -> %s)",
+                job_id,
+                payload["ruleset_version"],
+                ruleset.version,
+            )
+            await run_in_threadpool(
+                deps.call,
+                "pubsub",
+                publish_event,
+                INGEST_TOPIC,
+                {
+                    "job_id": job_id,
+                    "bucket": bucket_name,
+                    "blob": blob_name,
+                    "mime_type": file_meta["mime_type"],
+                    "file_size": file_meta["file_size"],
+                    "tenant_id": file_meta["tenant_id"],
+                    "full_inspection": True,
+                    "traceparent": payload.get("traceparent"),
+                },
+            )
+            return Response(status_code=204)
+
+    lane = file_meta["lane"]
+    if lane_inflight[lane] >= LANE_CONCURRENCY[lane] + LANE_MAX_QUEUED:
+        # Saturated: let Pub/Sub back off this lane's subscription
+        logger.warning("Act worker: %s lane saturated, rejecting %s", lane, job_id)
+        return Response(status_code=429)
+
+    lane_inflight[lane] += 1
+    try:
+        with job_context(job_id), tracing.span(
+            "act", parent=payload.get("traceparent"), job_id=job_id, lane=lane
+        ):
+            async with lane_schedulers[lane].slot(file_meta["tenant_id"]):
+                loop = asyncio.get_running_loop()
+                # copy_context() carries the job id and span onto the thread
+                await loop.run_in_executor(
+                    LANE_EXECUTORS[lane],
+                    contextvars.copy_context().run,
+                    act_on_file,
+                    file_meta,
+                )
+    finally:
+        lane_inflight[lane] -= 1
+
+    return Response(status_code=204)
+
+
+def act_on_file(file_meta: Dict[str, Any]) -> None:
+    """
+    Evaluate rules for one file and carry out the resulting action.
+    Blocking; runs on the thread pool of the file's lane.
+    """
+    job_id = file_meta["job_id"]
+    bucket_name = file_meta["bucket"]
+    blob_name = file_meta["blob"]
+    classification = file_meta["classification"]
+
     # -------------------- Evaluate rules --------------------
-    rules = load_rules()
     matched_rule = None
     applied = {
         "dest_bucket": PROCESSED_BUCKET,
         "dest_folder": classification,
         "tags": [],
         "delete_source_only": False,
+        "storage_class": None,
+        "hold": None,
+        "compress": None,
     }
 
-    for rule in rules:
-        if rule_matches(rule, file_meta):
-            matched_rule = rule
-            applied = apply_actions(rule, file_meta)
-            logger.info(
-                f"Act worker: matched rule {rule.get('name')} ({rule.get('id')})"
-            )
-            break
+    matched_rule = rulesets.get(file_meta["tenant_id"]).first_match(
+        file_meta, stats=rule_stats
+    )
+    if matched_rule:
+        applied = apply_actions(matched_rule, file_meta)
+        logger.info(
+            "Act worker: matched rule %s (%s)",
+            matched_rule.get("name"),
+            matched_rule.get("id"),
+            extra={"event": "message"},
+        )
 
     src_bucket = storage_client.bucket(bucket_name)
     src_blob = src_bucket.blob(blob_name)
-    filename = blob_name.split("/")[-1]
 
     # Case: delete only
     if matched_rule and applied["delete_source_only"]:
@@ -215,45 +512,95 @@ async def pubsub_push(request: Request):
             blob_name,
             matched_rule.get("name"),
         )
-        src_blob.delete()
-
+        deps.call("gcs", delete_quietly, src_blob, idempotent=True)
+
+        delete_doc = {
+            "action": "delete",
+            "rule_id": matched_rule.get("id"),
+            "rule_name": matched_rule.get("name"),
+            "deleted_bucket": bucket_name,
+            "deleted_blob": blob_name,
+            "tags": applied["tags"],
+            "acted_at": dt.datetime.utcnow().isoformat() + "Z",
+        }
         doc_ref = db.collection(JOBS_COLLECTION).document(job_id)
-        doc_ref.set(
+        deps.call(
+            "firestore",
+            doc_ref.set,
             {
-                "action": {
-                    "action": "delete",
-                    "rule_id": matched_rule.get("id"),
-                    "rule_name": matched_rule.get("name"),
-                    "deleted_bucket": bucket_name,
-                    "deleted_blob": blob_name,
-                    "tags": applied["tags"],
-                    "acted_at": dt.datetime.utcnow().isoformat() + "Z",
-                },
+                "action": delete_doc,
                 "status": "COMPLETED",
                 "updated_at": dt.datetime.utcnow().isoformat() + "Z",
             },
             merge=True,
+            idempotent=True,
         )
-        return Response(status_code=204)
+        record_completed(job_record(file_meta, "delete", delete_doc))
+        return
 
-    # Case: move/copy to processed bucket
-    dest_bucket_name = applied["dest_bucket"] or PROCESSED_BUCKET
-    dest_folder = applied["dest_folder"] or classification
-    dest_bucket = storage_client.bucket(dest_bucket_name)
-    dest_blob_name = f"{dest_folder}/{filename}"
-    dest_blob = dest_bucket.blob(dest_blob_name)
+    # Case: move/copy to processed bucket (or to several destinations)
+    targets = resolve_destinations(applied, classification, blob_name)
+    dest_bucket_name, dest_folder, dest_blob_name = targets[0]
 
     logger.info(
-        "Act worker: moving gs://%s/%s → gs://%s/%s",
+        "Act worker: moving gs://%s/%s → %s",
         bucket_name,
         blob_name,
-        dest_bucket_name,
-        dest_blob_name,
+        ", ".join(f"gs://{bucket}/{blob}" for bucket, _, blob in targets),
+        extra={"event": "message"},
     )
 
-    # copy + delete = move
-    src_bucket.copy_blob(src_blob, dest_bucket, new_name=dest_blob_name)
-    src_blob.delete()
+    if len(targets) == 1 and bundle_eligible(file_meta, applied):
+        # The job stays CLASSIFIED until its bundle is written.
+        bundler.add(
+            (
+                dest_bucket_name,
+                dest_folder,
+                applied["storage_class"],
+                file_meta["tenant_id"],
+            ),
+            {
+                "job_id": job_id,
+                "bucket": bucket_name,
+                "blob": blob_name,
+                "name": dest_blob_name.split("/")[-1],
+                "file_size": file_meta.get("file_size") or 0,
+                "mime_type": file_meta.get("mime_type"),
+                "lane": file_meta.get("lane"),
+                "tenant_id": file_meta["tenant_id"],
+                "classification": classification,
+                "dest_folder": dest_folder,
+                "tags": applied["tags"],
+                "rule_id": matched_rule.get("id") if matched_rule else None,
+                "rule_name": matched_rule.get("name") if matched_rule else None,
+            },
+        )
+        return
+
+    destinations = None
+    if len(targets) == 1:
+        compression = store_copy(
+            file_meta, applied, matched_rule, dest_bucket_name, dest_blob_name
+        )
+    else:
+        destinations, error = replicate(file_meta, applied, matched_rule, targets)
+        if error is not None:
+            # Keep the source: the copies that failed are retried on redelivery
+            deps.call(
+                "firestore",
+                db.collection(JOBS_COLLECTION).document(job_id).set,
+                {
+                    "action": {"destinations": destinations},
+                    "error_message": f"replication failed: {error}",
+                    "updated_at": dt.datetime.utcnow().isoformat() + "Z",
+                },
+                merge=True,
+                idempotent=True,
+            )
+            raise error
+        compression = destinations[0].get("compression")
+    # copy + delete = move; only once every destination has its copy
+    deps.call("gcs", delete_quietly, src_blob, idempotent=True)
 
     action_doc: Dict[str, Any] = {
         "dest_bucket": dest_bucket_name,
@@ -261,20 +608,137 @@ async def pubsub_push(request: Request):
         "classification": classification,
         "dest_folder": dest_folder,
         "tags": applied["tags"],
+        "storage_class": applied["storage_class"],
+        "hold": applied["hold"],
         "acted_at": dt.datetime.utcnow().isoformat() + "Z",
     }
+    if destinations:
+        action_doc["destinations"] = destinations
+    if compression:
+        action_doc["compression"] = compression
     if matched_rule:
         action_doc["rule_id"] = matched_rule.get("id")
         action_doc["rule_name"] = matched_rule.get("name")
 
     doc_ref = db.collection(JOBS_COLLECTION).document(job_id)
-    doc_ref.set(
+    deps.call(
+        "firestore",
+        doc_ref.set,
         {
             "action": action_doc,
             "status": "COMPLETED",
             "updated_at": dt.datetime.utcnow().isoformat() + "Z",
         },
         merge=True,
+        idempotent=True,
     )
+    record_completed(job_record(file_meta, "move", action_doc))
 
-    return Response(status_code=204)
+
+def store_copy(
+    file_meta: Dict[str, Any],
+    applied: Dict[str, Any],
+    matched_rule: Optional[Dict[str, Any]],
+    dest_bucket_name: str,
+    dest_blob_name: str,
+) -> Optional[Dict[str, Any]]:
+    """
+    Write one destination copy of the source; returns the compression
+    result when the copy was compressed.
+    """
+    bucket_name = file_meta["bucket"]
+    blob_name = file_meta["blob"]
+
+    if applied["compress"] and is_compressible(
+        file_meta.get("mime_type"), file_meta.get("ext")
+    ):
+        # compress + delete = move, streamed in bounded chunks
+        compression = deps.call(
+            transfer_dependency(lane_of(file_meta)),
+            compress_object,
+            storage_client,
+            bucket_name,
+            blob_name,
+            dest_bucket_name,
+            dest_blob_name,
+            applied["compress"],
+            content_type=file_meta.get("mime_type"),
+            metadata=object_metadata(file_meta, applied, matched_rule),
+            storage_class=applied["storage_class"],
+            hold=applied["hold"],
+            idempotent=True,
+            cost=transfer_cost(file_meta),
+        )
+        logger.info(
+            "Act worker: %s stored %s at ratio %s",
+            compression["encoding"],
+            blob_name,
+            compression["ratio"],
+        )
+        return compression
+
+    # Tags, storage class and hold are applied by the copy itself. Only then
+    # is the copy a rewrite with explicit metadata; otherwise the source's
+    # metadata is kept as-is.
+    rewrite_props = applied["tags"] or applied["storage_class"] or applied["hold"]
+    deps.call(
+        transfer_dependency(lane_of(file_meta)),
+        copy_object,
+        storage_client,
+        bucket_name,
+        blob_name,
+        dest_bucket_name,
+        dest_blob_name,
+        content_type=file_meta.get("mime_type"),
+        metadata=(
+            object_metadata(file_meta, applied, matched_rule) if rewrite_props else None
+        ),
+        storage_class=applied["storage_class"],
+        hold=applied["hold"],
+        idempotent=True,
+        cost=transfer_cost(file_meta),
+    )
+    return None
+
+
+def replicate(
+    file_meta: Dict[str, Any],
+    applied: Dict[str, Any],
+    matched_rule: Optional[Dict[str, Any]],
+    targets: List[Tuple[str, str, str]],
+) -> Tuple[List[Dict[str, Any]], Optional[Exception]]:
+    """
+    Copy the source to every target at once on the shared fan-out pool, so a
+    rule with N destinations takes about as long as its slowest copy.
+
+    Returns one result per target, in order, and the first error if any copy
+    failed.
+    """
+    futures = [
+        fanout_executor.submit(
+            contextvars.copy_context().run,
+            store_copy,
+            file_meta,
+            applied,
+            matched_rule,
+            bucket,
+            blob,
+        )
+        for bucket, _, blob in targets
+    ]
+    results: List[Dict[str, Any]] = []
+    error: Optional[Exception] = None
+    for (bucket, folder, blob), future in zip(targets, futures):
+        result: Dict[str, Any] = {"bucket": bucket, "folder": folder, "blob": blob}
+        try:
+            compression = future.result()
+        except Exception as e:
+            logger.error("Act worker: copy to gs://%s/%s failed: %s", bucket, blob, e)
+            result.update(status="failed", error=str(e))
+            error = error or e
+        else:
+            result["status"] = "ok"
+            if compression:
+                result["compression"] = compression
+        results.append(result)
+    return results, error
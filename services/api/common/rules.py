@@ -0,0 +1,577 @@
+# common/rules.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from common.config import PROCESSED_BUCKET
+
+_MB = 1024 * 1024
+
+STORAGE_CLASSES = ("STANDARD", "NEARLINE", "COLDLINE", "ARCHIVE")
+HOLD_TYPES = ("event", "temporary")
+COMPRESSIONS = ("gzip", "zstd")
+
+# ------------------------------ Dependencies ---------------------------------
+#
+# File attributes a decision can depend on. name, ext and size are in every
+# Cloud Storage notification; "content" stands for anything that needs the
+# object's bytes (the sniffed MIME type), and "classification" for the
+# classify stage's label, which is derived from the sniffed MIME type.
+# The entries of a ZIP archive are read by the inspect worker, so they are
+# "content" too.
+
+METADATA_ATTRIBUTES = frozenset({"name", "ext", "size"})
+
+# (lower-cased entry names, entry count, whether the names were capped)
+Archive = Tuple[Tuple[str, ...], int, bool]
+
+# Attributes each condition type reads. Unknown condition types are ignored
+# by the matcher, so they read nothing.
+CONDITION_NEEDS: Dict[str, FrozenSet[str]] = {
+    "extension": frozenset({"ext"}),
+    "name_contains": frozenset({"name"}),
+    "size_gt_mb": frozenset({"size"}),
+    "size_lt_mb": frozenset({"size"}),
+    "archive_contains": frozenset({"content"}),
+    "archive_entries_gt": frozenset({"content"}),
+}
+
+# simple_classification() looks at the extension, the sniffed MIME type and
+# the archive entries
+CLASSIFICATION_NEEDS = frozenset({"ext", "content"})
+
+# Earliest stage that can decide a file, in pipeline order
+STAGE_INSPECT = "inspect"
+STAGE_CLASSIFY = "classify"
+STAGE_ACT = "act"
+
+
+def rule_matches(rule: Dict[str, Any], file_meta: Dict[str, Any]) -> bool:
+    """
+    Supported condition types:
+      - extension: ".csv"  or "csv"
+      - name_contains: "report"
+      - size_gt_mb: "10"
+      - size_lt_mb: "1"
+      - archive_contains: "xl/workbook.xml" (any entry name contains it)
+      - archive_entries_gt: "1000"
+
+    Archive conditions only match files listed as ZIP archives. The inspect
+    worker keeps only the first ARCHIVE_MAX_NAMES entry names (default
+    1000), so archive_contains does not see entries beyond them; such
+    archives carry archive_names_truncated and explain_rule() says so.
+    """
+    return CompiledRule(rule, 0).matches(
+        *normalize_file_meta(file_meta), normalize_archive(file_meta)
+    )
+
+
+def explain_rule(
+    rule: Dict[str, Any], file_meta: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Why `rule` does not match `file_meta`: the first condition that rejects
+    it, as {"type", "value", "reason"}, or None when the rule matches.
+    """
+    return CompiledRule(rule, 0).explain(
+        *normalize_file_meta(file_meta), normalize_archive(file_meta)
+    )
+
+
+def apply_actions(rule: Dict[str, Any], file_meta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Supported actions:
+      - move_to_folder: "reports/2025"
+      - tag: "confidential"
+      - delete: "true" (value ignored)
+      - copy_to_bucket: "some-other-bucket" or "some-other-bucket/folder";
+        repeat it to write the file to several destinations, the first
+        being the primary one
+      - storage_class: "NEARLINE" | "COLDLINE" | "ARCHIVE" | "STANDARD"
+      - hold: "event" | "temporary"
+      - compress: "gzip" | "zstd"
+    """
+    actions = rule.get("actions") or []
+    dest_bucket = PROCESSED_BUCKET
+    dest_folder = None
+    destinations: List[Dict[str, Optional[str]]] = []
+    tags: List[str] = []
+    delete_source_only = False
+    storage_class = None
+    hold = None
+    compress = None
+
+    for action in actions:
+        atype = (action.get("type") or "").lower()
+        value = (action.get("value") or "").strip()
+
+        if atype == "move_to_folder":
+            dest_folder = value
+
+        elif atype == "copy_to_bucket":
+            bucket, _, folder = value.partition("/")
+            if bucket:
+                destinations.append(
+                    {"bucket": bucket, "folder": folder.strip("/") or None}
+                )
+                dest_bucket = destinations[0]["bucket"]
+
+        elif atype == "tag":
+            if value:
+                tags.append(value)
+
+        elif atype == "delete":
+            delete_source_only = True
+
+        elif atype == "storage_class":
+            if value.upper() in STORAGE_CLASSES:
+                storage_class = value.upper()
+
+        elif atype == "hold":
+            if value.lower() in HOLD_TYPES:
+                hold = value.lower()
+
+        elif atype == "compress":
+            if value.lower() in COMPRESSIONS:
+                compress = value.lower()
+
+    return {
+        "dest_bucket": dest_bucket,
+        "dest_folder": dest_folder,
+        "destinations": destinations,
+        "tags": tags,
+        "delete_source_only": delete_source_only,
+        "storage_class": storage_class,
+        "hold": hold,
+        "compress": compress,
+    }
+
+
+# ------------------------------ Compiled rules -------------------------------
+
+
+class CompiledRule:
+    """
+    A rule with its conditions folded into plain comparisons.
+
+    Conditions are ANDed, empty values and unparsable sizes are ignored,
+    and unknown condition types never reject. `checks` keeps the conditions
+    that can reject, in order, for explain().
+    """
+
+    __slots__ = (
+        "rule",
+        "position",
+        "ext",
+        "never",
+        "name_terms",
+        "min_size",
+        "max_size",
+        "archive_terms",
+        "min_entries",
+        "reads_archive",
+        "checks",
+        "needs",
+        "action_needs",
+    )
+
+    def __init__(self, rule: Dict[str, Any], position: int):
+        self.rule = rule
+        self.position = position
+        self.ext: Optional[str] = None
+        self.never = not rule.get("enabled", True)
+        self.name_terms: List[str] = []
+        self.min_size = float("-inf")  # size must be > min_size
+        self.max_size = float("inf")  # size must be < max_size
+        self.archive_terms: List[str] = []
+        self.min_entries = float("-inf")  # entry count must be > min_entries
+        # Only files listed as archives can match
+        self.reads_archive = False
+        # (type, value, operand) per condition that can reject
+        self.checks: List[Tuple[str, str, Any]] = []
+        # Attributes needed to decide whether the rule matches
+        self.needs: FrozenSet[str] = frozenset()
+        # Attributes its actions need once it does
+        self.action_needs = _action_needs(rule)
+
+        for cond in rule.get("conditions") or []:
+            ctype = (cond.get("type") or "").lower()
+            value = (cond.get("value") or "").strip()
+            if not value:
+                continue
+            self.needs |= CONDITION_NEEDS.get(ctype, frozenset())
+
+            if ctype == "extension":
+                v = value.lower()
+                if not v.startswith("."):
+                    v = "." + v
+                if self.ext is not None and self.ext != v:
+                    self.never = True
+                self.ext = v
+                self.checks.append((ctype, value, v))
+
+            elif ctype == "name_contains":
+                self.name_terms.append(value.lower())
+                self.checks.append((ctype, value, value.lower()))
+
+            elif ctype in ("size_gt_mb", "size_lt_mb"):
+                try:
+                    threshold = float(value) * _MB
+                except ValueError:
+                    continue
+                if ctype == "size_gt_mb":
+                    self.min_size = max(self.min_size, threshold)
+                else:
+                    self.max_size = min(self.max_size, threshold)
+                self.checks.append((ctype, value, threshold))
+
+            elif ctype == "archive_contains":
+                self.archive_terms.append(value.lower())
+                self.reads_archive = True
+                self.checks.append((ctype, value, value.lower()))
+
+            elif ctype == "archive_entries_gt":
+                try:
+                    threshold = float(value)
+                except ValueError:
+                    continue
+                self.min_entries = max(self.min_entries, threshold)
+                self.reads_archive = True
+                self.checks.append((ctype, value, threshold))
+
+    def matches(
+        self,
+        name: str,
+        ext: str,
+        size: float,
+        archive: Optional[Archive] = None,
+    ) -> bool:
+        """
+        `name` and `ext` must already be lower-cased, and `archive` be
+        normalize_archive() of the file.
+        """
+        if self.never:
+            return False
+        if self.ext is not None and ext != self.ext:
+            return False
+        if not self.min_size < size < self.max_size:
+            return False
+        for term in self.name_terms:
+            if term not in name:
+                return False
+        if self.reads_archive:
+            if archive is None:
+                return False
+            names, count, _ = archive
+            if not count > self.min_entries:
+                return False
+            for term in self.archive_terms:
+                if not any(term in n for n in names):
+                    return False
+        return True
+
+    def explain(
+        self,
+        name: str,
+        ext: str,
+        size: float,
+        archive: Optional[Archive] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        The first condition that rejects the file, as {"type", "value",
+        "reason"}, or None when the rule matches. Same arguments as
+        matches().
+        """
+        if not self.rule.get("enabled", True):
+            return {"type": "enabled", "value": "false", "reason": "rule is disabled"}
+        if self.matches(name, ext, size, archive):
+            return None
+        for ctype, value, operand in self.checks:
+            reason = _rejects(ctype, value, operand, name, ext, size, archive)
+            if reason:
+                return {"type": ctype, "value": value, "reason": reason}
+        return None
+
+
+def _rejects(
+    ctype: str,
+    value: str,
+    operand: Any,
+    name: str,
+    ext: str,
+    size: float,
+    archive: Optional[Archive],
+) -> Optional[str]:
+    # Why one condition of a CompiledRule rejects a file, if it does
+    if ctype == "extension":
+        if ext != operand:
+            return f"extension is {ext or 'empty'!r}, not {operand!r}"
+    elif ctype == "name_contains":
+        if operand not in name:
+            return f"name does not contain {operand!r}"
+    elif ctype == "size_gt_mb":
+        if not size > operand:
+            return f"size {round(size / _MB, 3)} MB is not above {value} MB"
+    elif ctype == "size_lt_mb":
+        if not size < operand:
+            return f"size {round(size / _MB, 3)} MB is not below {value} MB"
+    elif archive is None:
+        return "not a listed archive"
+    elif ctype == "archive_contains":
+        if not any(operand in n for n in archive[0]):
+            if archive[2]:
+                return (
+                    f"none of the first {len(archive[0])} of {archive[1]} "
+                    f"archive entries contains {operand!r} (names were capped)"
+                )
+            return f"no archive entry contains {operand!r}"
+    elif ctype == "archive_entries_gt":
+        if not archive[1] > operand:
+            return f"{archive[1]} archive entries is not above {value}"
+    return None
+
+
+def _action_needs(rule: Dict[str, Any]) -> FrozenSet[str]:
+    types = {(a.get("type") or "").lower() for a in rule.get("actions") or []}
+    needs = set()
+    if "delete" not in types and "move_to_folder" not in types:
+        # The destination folder defaults to the classification
+        needs.add("classification")
+    if "compress" in types:
+        # Whether a file is compressible depends on its real MIME type
+        needs.add("content")
+    return frozenset(needs)
+
+
+def _resolve(needs: FrozenSet[str]) -> FrozenSet[str]:
+    if "classification" in needs:
+        needs = (needs - {"classification"}) | CLASSIFICATION_NEEDS
+    return needs
+
+
+def normalize_file_meta(record: Dict[str, Any]) -> Tuple[str, str, float]:
+    """
+    Return the (name, ext, size) triple rules are evaluated against.
+
+    Accepts both the pipeline's field names (file_size) and the shorter ones
+    used by simulation inputs (size). A missing ext is derived from the name.
+    """
+    name = str(record.get("name") or record.get("blob") or "").lower()
+    ext = record.get("ext")
+    if ext is None:
+        _, ext = os.path.splitext(name)
+    ext = str(ext or "").lower()
+    if ext and not ext.startswith("."):
+        ext = "." + ext
+    size = record.get("file_size")
+    if size is None:
+        size = record.get("size")
+    try:
+        size = float(size or 0)
+    except (TypeError, ValueError):
+        size = 0.0
+    return name, ext, size
+
+
+def normalize_archive(
+    record: Dict[str, Any],
+) -> Optional[Archive]:
+    """
+    Return the (lower-cased entry names, entry count, names capped) triple
+    archive conditions are evaluated against, or None for files not listed
+    as an archive. The count is the archive's own; when the names are
+    capped they are only its first entries.
+    """
+    names = record.get("archive_names")
+    count = record.get("archive_entries")
+    if names is None and count is None:
+        return None
+    names = tuple(str(n).lower() for n in names or ())
+    try:
+        count = int(count) if count is not None else len(names)
+    except (TypeError, ValueError):
+        count = len(names)
+    truncated = bool(record.get("archive_names_truncated")) or len(names) < count
+    return names, count, truncated
+
+
+class RuleSet:
+    """
+    An ordered, compiled ruleset.
+
+    Rules that pin an extension are indexed by it, so a file is only tested
+    against the rules for its own extension plus the extension-agnostic ones.
+    The merged candidate list per extension is built once and reused.
+    """
+
+    def __init__(self, rules: Iterable[Dict[str, Any]]):
+        ordered = sorted(rules, key=lambda r: r.get("priority", 0))
+        self.rules = [CompiledRule(r, i) for i, r in enumerate(ordered)]
+        self._generic: List[CompiledRule] = []
+        self._by_ext: Dict[str, List[CompiledRule]] = {}
+        for compiled in self.rules:
+            if compiled.never:
+                continue
+            if compiled.ext is None:
+                self._generic.append(compiled)
+            else:
+                self._by_ext.setdefault(compiled.ext, []).append(compiled)
+        self._candidates: Dict[str, Tuple[CompiledRule, ...]] = {}
+        # Entry names are only normalized when some rule looks at them
+        self._reads_archive = any(c.reads_archive for c in self.rules if not c.never)
+        # Changes whenever any rule does; events routed past a stage carry
+        # it so the act worker can tell whether the decision still holds
+        self.version = hashlib.sha1(
+            json.dumps(ordered, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+        # Everything this ruleset can ever need, no-match default included
+        needs = set(CLASSIFICATION_NEEDS)
+        for compiled in self.rules:
+            if not compiled.never:
+                needs |= compiled.needs | _resolve(compiled.action_needs)
+        self.needs: FrozenSet[str] = frozenset(needs)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _archive(self, file_meta: Dict[str, Any]) -> Optional[Archive]:
+        return normalize_archive(file_meta) if self._reads_archive else None
+
+    def candidates(self, ext: str) -> Tuple[CompiledRule, ...]:
+        cached = self._candidates.get(ext)
+        if cached is None:
+            merged = self._generic + self._by_ext.get(ext, [])
+            merged.sort(key=lambda c: c.position)
+            cached = self._candidates[ext] = tuple(merged)
+        return cached
+
+    def first_match(
+        self, file_meta: Dict[str, Any], stats=None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the highest-priority rule matching `file_meta`, or None.
+
+        With a `stats` (a rule_stats.RuleStats), every rule tested is timed
+        and recorded there, hit or not.
+        """
+        name, ext, size = normalize_file_meta(file_meta)
+        archive = self._archive(file_meta)
+        if stats is None:
+            for compiled in self.candidates(ext):
+                if compiled.matches(name, ext, size, archive):
+                    return compiled.rule
+            return None
+
+        clock = time.perf_counter_ns
+        evaluated: List[Tuple[Optional[str], bool, int]] = []
+        matched = None
+        for compiled in self.candidates(ext):
+            start = clock()
+            hit = compiled.matches(name, ext, size, archive)
+            evaluated.append((compiled.rule.get("id"), hit, clock() - start))
+            if hit:
+                matched = compiled.rule
+                break
+        stats.record(evaluated)
+        return matched
+
+    def route(
+        self, file_meta: Dict[str, Any], known: FrozenSet[str] = METADATA_ATTRIBUTES
+    ) -> str:
+        """
+        The earliest stage that can decide `file_meta` when only the `known`
+        attributes are available.
+
+        Rules are walked in priority order. If a rule ahead of the match
+        needs an unknown attribute, nothing can be decided yet; otherwise
+        the matched rule's actions (or, with no match, the default
+        classification folder) say what else is needed.
+        """
+        name, ext, size = normalize_file_meta(file_meta)
+        archive = self._archive(file_meta)
+        needs: FrozenSet[str] = frozenset({"classification"})
+        for compiled in self.candidates(ext):
+            if not compiled.needs <= known:
+                return STAGE_INSPECT
+            if compiled.matches(name, ext, size, archive):
+                needs = compiled.action_needs
+                break
+
+        if needs <= known:
+            return STAGE_ACT
+        if _resolve(needs) <= known:
+            # Only the classification is missing, and it can be computed
+            return STAGE_CLASSIFY
+        return STAGE_INSPECT
+
+    def explain(self, file_meta: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Every rule in priority order with whether it matches `file_meta` and,
+        if not, the condition that rejected it. `selected` marks the rule
+        the act worker would apply.
+        """
+        selected = self.first_match(file_meta)
+        name, ext, size = normalize_file_meta(file_meta)
+        archive = self._archive(file_meta)
+        return [
+            {
+                "id": compiled.rule.get("id"),
+                "name": compiled.rule.get("name"),
+                "priority": compiled.rule.get("priority"),
+                "matched": rejected is None,
+                "selected": compiled.rule is selected,
+                "rejected_by": rejected,
+            }
+            for compiled in self.rules
+            for rejected in (compiled.explain(name, ext, size, archive),)
+        ]
+
+    def all_matches(self, file_meta: Dict[str, Any]) -> List[CompiledRule]:
+        """
+        Return every rule matching `file_meta`, in priority order.
+        """
+        name, ext, size = normalize_file_meta(file_meta)
+        archive = self._archive(file_meta)
+        return [c for c in self.candidates(ext) if c.matches(name, ext, size, archive)]
+
+
+def compile_rules(rules: Iterable[Dict[str, Any]]) -> RuleSet:
+    return RuleSet(rules)
+
+
+class RuleSetCache:
+    """
+    Compiled rulesets per tenant, each reloaded once it is older than
+    `ttl_seconds`. A tenant's burst therefore costs one rules query per TTL,
+    and never delays or invalidates another tenant's ruleset.
+    """
+
+    def __init__(
+        self, loader: Callable[[str], List[Dict[str, Any]]], ttl_seconds: float = 5.0
+    ):
+        self._loader = loader
+        self._ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[RuleSet, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id: str) -> RuleSet:
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+        if entry is not None and time.monotonic() - entry[1] < self._ttl_seconds:
+            return entry[0]
+
+        ruleset = compile_rules(self._loader(tenant_id))
+        with self._lock:
+            self._entries[tenant_id] = (ruleset, time.monotonic())
+        return ruleset
+
+    def invalidate(self, tenant_id: Optional[str] = None) -> None:
+        with self._lock:
+            if tenant_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(tenant_id, None)
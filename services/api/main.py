@@ -1,25 +1,67 @@
 # services/api/main.py
 
+import functools
+import hashlib
+import logging
 import os
+import threading
+import time
 import uuid
 from datetime import datetime
-from typing import List, Literal, Optional
-
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body
+from typing import Any, Callable, Dict, List, Literal, Optional
+
+from fastapi import (
+    Body,
+    Depends,
+    FastAPI,
+    File,
+    Header,
+    HTTPException,
+    Request,
+    UploadFile,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+import requests
+from google.api_core.exceptions import NotFound
+from google.auth.transport.requests import AuthorizedSession
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from google.oauth2 import id_token
+from google.cloud import storage, firestore, pubsub_v1
+
+from common import fastjson, messages, tracing
+from common.config import (  # <- added JOBS_COLLECTION
+    GCP_PROJECT_ID,
+    INGEST_TOPIC,
+    JOBS_COLLECTION,
+)
+from common.fanout import Fanout
+from common.fingerprint import fingerprint
+from common.inspectors import sniff_mime
+from common.log import install_request_logging, setup_logging
+from common.rule_stats import summarize
+from common.rules import METADATA_ATTRIBUTES, apply_actions, compile_rules
+from common.tenants import (
+    DEFAULT_TENANT,
+    load_tenant_rules,
+    normalize_tenant,
+    tenant_of,
+)
 
-from google.cloud import storage, firestore
-
-from common.config import GCP_PROJECT_ID, JOBS_COLLECTION  # <- added JOBS_COLLECTION
-
-import re  # (unused but harmless if you had it before)
+logger = logging.getLogger(__name__)
+setup_logging("api")
+tracing.configure("api")
 
 # -----------------------------------------------------------------------------
 # App + CORS (for UI)
 # -----------------------------------------------------------------------------
 
 app = FastAPI(title="Cloud File Orchestrator API")
+install_request_logging(app, logger)
+tracing.install_request_tracing(app)
 
 UI_ORIGINS = os.getenv("UI_ORIGINS", "*")  # e.g. "http://localhost:5173"
 if UI_ORIGINS == "*":
@@ -33,6 +75,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # -----------------------------------------------------------------------------
@@ -41,19 +84,57 @@ app.add_middleware(
 
 SOURCE_BUCKET = os.getenv("SOURCE_BUCKET", "")  # set in Cloud Run / .env
 if not SOURCE_BUCKET:
-    print("[WARN] SOURCE_BUCKET is not set. /upload will fail until it is.")
+    logger.warning("SOURCE_BUCKET is not set. /upload will fail until it is.")
 
 storage_client = storage.Client()
 db = firestore.Client(project=GCP_PROJECT_ID)
+publisher = pubsub_v1.PublisherClient()
 
 RULES_COLLECTION = os.getenv("RULES_COLLECTION", "rules")
+RULES_CACHE_TTL_SECONDS = float(os.getenv("RULES_CACHE_TTL_SECONDS", "5"))
+# Per-rule counters written by the act worker
+RULE_STATS_COLLECTION = os.getenv("RULE_STATS_COLLECTION", "rule_stats")
+
+# Firestore rejects commits with more than 500 writes.
+FIRESTORE_BATCH_LIMIT = 500
+
+# /rules/simulate emits a progress line every N records
+SIMULATION_PROGRESS_EVERY = int(os.getenv("SIMULATION_PROGRESS_EVERY", "10000"))
+# ...and buffers JSON bodies up to this size; larger inputs must be NDJSON
+SIMULATE_MAX_JSON_BYTES = int(os.getenv("SIMULATE_MAX_JSON_BYTES", str(10 << 20)))
+
+# /activity/stream: how many recent jobs the shared listener watches, how
+# many undelivered updates each client may hold, and the keep-alive period
+ACTIVITY_STREAM_WINDOW = int(os.getenv("ACTIVITY_STREAM_WINDOW", "50"))
+ACTIVITY_CLIENT_BUFFER = int(os.getenv("ACTIVITY_CLIENT_BUFFER", "200"))
+ACTIVITY_KEEPALIVE_SECONDS = float(os.getenv("ACTIVITY_KEEPALIVE_SECONDS", "15"))
+
+# /search is answered by the indexer service (services/indexer), the one
+# owner of the search index; SEARCH_SERVICE_URL is its URL
+SEARCH_SERVICE_URL = os.getenv("SEARCH_SERVICE_URL", "").rstrip("/")
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "10"))
 
 # -----------------------------------------------------------------------------
 # Models: Rules & Activity
 # -----------------------------------------------------------------------------
 
-ConditionType = Literal["extension", "name_contains", "size_gt_mb", "size_lt_mb"]
-ActionType = Literal["move_to_folder", "tag", "delete", "copy_to_bucket"]
+ConditionType = Literal[
+    "extension",
+    "name_contains",
+    "size_gt_mb",
+    "size_lt_mb",
+    "archive_contains",
+    "archive_entries_gt",
+]
+ActionType = Literal[
+    "move_to_folder",
+    "tag",
+    "delete",
+    "copy_to_bucket",
+    "storage_class",
+    "hold",
+    "compress",
+]
 
 
 class RuleCondition(BaseModel):
@@ -68,6 +149,7 @@ class RuleAction(BaseModel):
 
 class Rule(BaseModel):
     id: str
+    tenant_id: str = DEFAULT_TENANT
     name: str
     description: Optional[str] = None
     priority: int
@@ -76,6 +158,16 @@ class Rule(BaseModel):
     actions: List[RuleAction]
 
 
+class SimulationRule(BaseModel):
+    id: Optional[str] = None
+    name: str
+    description: Optional[str] = None
+    priority: int = 0
+    enabled: bool = True
+    conditions: List[RuleCondition]
+    actions: List[RuleAction]
+
+
 class ActivityEvent(BaseModel):
     id: str
     timestamp: datetime
@@ -123,93 +215,598 @@ def health():
 # -----------------------------------------------------------------------------
 
 
+def current_tenant(x_tenant_id: Optional[str] = Header(None)) -> str:
+    """
+    Tenant of the request, from the X-Tenant-Id header (DEFAULT_TENANT when
+    absent).
+    """
+    try:
+        return normalize_tenant(x_tenant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _load_rules_from_firestore(tenant_id: str = DEFAULT_TENANT) -> List[dict]:
+    """
+    Read a tenant's rules from Firestore and validate them once.
+    """
+    docs = load_tenant_rules(db.collection(RULES_COLLECTION), tenant_id)
+    docs.sort(key=lambda r: r.get("priority", 0))
+    return [Rule(**data).dict() for data in docs]
+
+
+class RulesCache:
+    """
+    In-process copy of the ruleset served by GET /rules.
+
+    Rules are validated once per load and kept as plain dicts together with
+    the encoded response body and its ETag (a hash of that body), so the ETag
+    doubles as the ruleset version. Mutations made through this instance are
+    written through; changes made by other instances show up after the TTL.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], List[dict]],
+        ttl_seconds: float = RULES_CACHE_TTL_SECONDS,
+    ):
+        self._loader = loader
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._rules: Optional[Dict[str, dict]] = None
+        self._body = b"[]"
+        self._etag = ""
+        self._loaded_at = 0.0
+
+    def _fresh(self) -> bool:
+        return (
+            self._rules is not None
+            and time.monotonic() - self._loaded_at < self._ttl_seconds
+        )
+
+    def _rebuild(self) -> None:
+        ordered = sorted(self._rules.values(), key=lambda r: r.get("priority", 0))
+        self._body = fastjson.dumps(ordered)
+        self._etag = '"%s"' % hashlib.sha1(self._body).hexdigest()
+
+    def snapshot(self) -> tuple:
+        """
+        Return (etag, body), reloading from Firestore if the TTL has expired.
+        """
+        with self._lock:
+            if not self._fresh():
+                rules = self._loader()
+                self._rules = {r["id"]: r for r in rules}
+                self._loaded_at = time.monotonic()
+                self._rebuild()
+            return self._etag, self._body
+
+    def rules(self) -> List[dict]:
+        """
+        Return the cached rules in priority order.
+        """
+        self.snapshot()
+        with self._lock:
+            return sorted(self._rules.values(), key=lambda r: r.get("priority", 0))
+
+    def get(self, rule_id: str) -> Optional[dict]:
+        with self._lock:
+            if not self._fresh():
+                return None
+            rule = self._rules.get(rule_id)
+            return dict(rule) if rule is not None else None
+
+    def put(self, rule: dict) -> None:
+        with self._lock:
+            if self._rules is None:
+                return
+            self._rules[rule["id"]] = rule
+            self._rebuild()
+
+    def remove(self, rule_id: str) -> None:
+        with self._lock:
+            if self._rules is None:
+                return
+            self._rules.pop(rule_id, None)
+            self._rebuild()
+
+    def set_priorities(self, order: List[str]) -> None:
+        with self._lock:
+            if self._rules is None:
+                return
+            for idx, rid in enumerate(order):
+                if rid in self._rules:
+                    self._rules[rid] = {**self._rules[rid], "priority": idx}
+            self._rebuild()
+
+
+rules_cache = RulesCache(_load_rules_from_firestore)
+_tenant_rules_caches: Dict[str, RulesCache] = {}
+
+
+def rules_cache_for(tenant_id: str) -> RulesCache:
+    """
+    Each tenant has its own cache, so its ETag only changes with its rules.
+    """
+    if tenant_id == DEFAULT_TENANT:
+        return rules_cache
+    cache = _tenant_rules_caches.get(tenant_id)
+    if cache is None:
+        cache = _tenant_rules_caches.setdefault(
+            tenant_id,
+            RulesCache(functools.partial(_load_rules_from_firestore, tenant_id)),
+        )
+    return cache
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
 @app.get("/rules", response_model=List[Rule])
-def list_rules() -> List[Rule]:
+def list_rules(
+    if_none_match: Optional[str] = Header(None),
+    stats: bool = False,
+    tenant_id: str = Depends(current_tenant),
+):
     """
     List rules sorted by priority ascending.
     Backed by Firestore: collection RULES_COLLECTION (default 'rules').
+
+    Served from the in-process rules cache. Clients that send the last ETag
+    in If-None-Match get a 304 while the ruleset is unchanged.
+
+    With ?stats=true each rule also carries a "stats" object (evaluations,
+    hits, hit_rate, avg_eval_us, total_eval_ms, last_hit_at) from the act
+    workers' counters; the ETag then covers the counters too.
     """
-    docs = db.collection(RULES_COLLECTION).order_by("priority").stream()
-    rules: List[Rule] = []
-    for d in docs:
-        data = d.to_dict() or {}
-        data["id"] = d.id
-        rules.append(Rule(**data))
-    return rules
+    if stats:
+        rules = rules_cache_for(tenant_id).rules()
+        totals = load_rule_stats([r["id"] for r in rules])
+        body = fastjson.dumps(
+            [dict(r, stats=summarize(totals.get(r["id"]))) for r in rules]
+        )
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+    else:
+        etag, body = rules_cache_for(tenant_id).snapshot()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.post("/rules", response_model=Rule)
-def create_rule(rule: RuleCreate) -> Rule:
+def create_rule(rule: RuleCreate, tenant_id: str = Depends(current_tenant)) -> Rule:
     """
     Create a new rule in Firestore.
     """
     doc_ref = db.collection(RULES_COLLECTION).document()
-    doc_data = rule.dict()
-    doc_ref.set(doc_data)
+    doc_data = {**rule.dict(), "tenant_id": tenant_id}
+    with tracing.span("firestore set", dependency="firestore", doc=doc_ref.path):
+        doc_ref.set(doc_data)
 
-    stored = doc_ref.get().to_dict() or {}
-    stored["id"] = doc_ref.id
+    stored = {**doc_data, "id": doc_ref.id}
+    rules_cache_for(tenant_id).put(stored)
     return Rule(**stored)
 
 
 @app.put("/rules/{rule_id}", response_model=Rule)
-def update_rule(rule_id: str, patch: RuleUpdate) -> Rule:
+def update_rule(
+    rule_id: str, patch: RuleUpdate, tenant_id: str = Depends(current_tenant)
+) -> Rule:
     """
     Update an existing rule (partial update).
+
+    When the rule is in the cache, this is a single update() whose NotFound
+    doubles as the existence check; otherwise the current state is read once.
     """
     ref = db.collection(RULES_COLLECTION).document(rule_id)
-    snap = ref.get()
-    if not snap.exists:
-        raise HTTPException(status_code=404, detail="Rule not found")
-
     updates = patch.dict(exclude_unset=True)
-    ref.set(updates, merge=True)
-
-    data = ref.get().to_dict() or {}
-    data["id"] = ref.id
+    cache = rules_cache_for(tenant_id)
+
+    current = cache.get(rule_id)
+    if current is None:
+        with tracing.span("firestore get", dependency="firestore", doc=ref.path):
+            snap = ref.get()
+        if not snap.exists:
+            raise HTTPException(status_code=404, detail="Rule not found")
+        current = snap.to_dict() or {}
+        if tenant_of(current) != tenant_id:
+            raise HTTPException(status_code=404, detail="Rule not found")
+
+    if updates:
+        try:
+            with tracing.span("firestore update", dependency="firestore", doc=ref.path):
+                ref.update(updates)
+        except NotFound:
+            cache.remove(rule_id)
+            raise HTTPException(status_code=404, detail="Rule not found")
+
+    data = {**current, **updates, "id": rule_id}
+    cache.put(data)
     return Rule(**data)
 
 
 @app.delete("/rules/{rule_id}")
-def delete_rule(rule_id: str):
+def delete_rule(rule_id: str, tenant_id: str = Depends(current_tenant)):
     """
     Delete a rule by id.
     """
+    cache = rules_cache_for(tenant_id)
     ref = db.collection(RULES_COLLECTION).document(rule_id)
-    snap = ref.get()
-    if not snap.exists:
+    with tracing.span("firestore get", dependency="firestore", doc=ref.path):
+        snap = ref.get()
+    if not snap.exists or tenant_of(snap.to_dict() or {}) != tenant_id:
+        cache.remove(rule_id)
         raise HTTPException(status_code=404, detail="Rule not found")
-    ref.delete()
+    with tracing.span("firestore delete", dependency="firestore", doc=ref.path):
+        ref.delete()
+    cache.remove(rule_id)
     return {"ok": True}
 
 
+def _chunks(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield start, items[start : start + size]
+
+
 @app.post("/rules/reorder")
-def reorder_rules(order: List[str] = Body(...)):
+def reorder_rules(
+    order: List[str] = Body(...), tenant_id: str = Depends(current_tenant)
+):
     """
     Reorder rules by IDs.
     Body: ["rule-id-1", "rule-id-2", ...]
     Sets `priority` to index in list.
+
+    Only the tenant's own rules can be reordered; any other id is a 404 and
+    nothing is written. Writes are committed in batches of
+    FIRESTORE_BATCH_LIMIT, so very large reorders are applied as several
+    commits rather than one.
     """
-    batch = db.batch()
-    for idx, rid in enumerate(order):
-        ref = db.collection(RULES_COLLECTION).document(rid)
-        batch.set(ref, {"priority": idx}, merge=True)
-    batch.commit()
+    own = {r["id"] for r in rules_cache_for(tenant_id).rules()}
+    unknown = [rid for rid in order if rid not in own]
+    if unknown:
+        raise HTTPException(
+            status_code=404, detail=f"Rules not found: {', '.join(unknown)}"
+        )
+    for start, chunk in _chunks(order, FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for offset, rid in enumerate(chunk):
+            ref = db.collection(RULES_COLLECTION).document(rid)
+            batch.update(ref, {"priority": start + offset})
+        with tracing.span(
+            "firestore commit", dependency="firestore", writes=len(chunk)
+        ):
+            batch.commit()
+    rules_cache_for(tenant_id).set_priorities(order)
     return {"ok": True}
 
 
+def load_rule_stats(rule_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Stored per-rule totals, keyed by rule id; rules never evaluated are
+    missing.
+    """
+    refs = [db.collection(RULE_STATS_COLLECTION).document(i) for i in rule_ids]
+    if not refs:
+        return {}
+    return {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists}
+
+
+@app.post("/rules/explain")
+async def explain_rules(request: Request, tenant_id: str = Depends(current_tenant)):
+    """
+    Why each rule does or does not match one file.
+
+    Body: {"file": {"name", "ext", "size"}, "rules": [...]} with "rules"
+    optional, as for /rules/simulate. Returns every rule in priority order
+    with `matched`, `selected` (the rule the act worker would apply) and,
+    for rules that do not match, `rejected_by`: the first condition that
+    failed and why.
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid JSON body")
+    if not isinstance(body, dict) or not isinstance(body.get("file"), dict):
+        raise HTTPException(status_code=422, detail='Expected {"file": {...}}')
+    if "rules" in body:
+        rules = _candidate_rules(body["rules"])
+    else:
+        rules = rules_cache_for(tenant_id).rules()
+    return {"file": body["file"], "rules": compile_rules(rules).explain(body["file"])}
+
+
+@app.get("/rules/dependencies")
+def rule_dependencies(tenant_id: str = Depends(current_tenant)):
+    """
+    Which file attributes the enabled rules read. Rules whose conditions and
+    actions need only name, extension and size let matching files skip the
+    content read and the classify stage.
+    """
+    ruleset = compile_rules(
+        r for r in rules_cache_for(tenant_id).rules() if r.get("enabled", True)
+    )
+    return {
+        "needs": sorted(ruleset.needs),
+        "rules": [
+            {
+                "id": c.rule.get("id"),
+                "name": c.rule.get("name"),
+                "needs": sorted(c.needs | c.action_needs),
+                "skips_inspection": c.needs <= METADATA_ATTRIBUTES
+                and c.action_needs <= METADATA_ATTRIBUTES,
+            }
+            for c in ruleset.rules
+        ],
+    }
+
+
 # -----------------------------------------------------------------------------
-# Upload endpoint (GCS upload; GCS → Pub/Sub → workers)
+# Rule simulation (dry run)
 # -----------------------------------------------------------------------------
 
 
+class RuleSimulation:
+    """
+    Accumulates dry-run results for one ruleset over a stream of file records.
+
+    `hits` counts files a rule would actually act on (first match wins, as in
+    the act worker); `matches` counts every file the rule matches, so rules
+    shadowed by a higher-priority rule show up with matches but no hits.
+    """
+
+    def __init__(self, rules: List[dict], samples: int):
+        self.ruleset = compile_rules(rules)
+        self.samples = samples
+        self.processed = 0
+        self.unmatched = 0
+        self.invalid = 0
+        count = len(self.ruleset)
+        self.hits = [0] * count
+        self.matches = [0] * count
+        self.sample_matches: List[List[dict]] = [[] for _ in range(count)]
+
+    def feed(self, record: Any) -> bool:
+        """
+        Evaluate one record; returns False if it was not a JSON object.
+        """
+        if not isinstance(record, dict):
+            self.invalid += 1
+            return False
+
+        self.processed += 1
+        matched = self.ruleset.all_matches(record)
+        if not matched:
+            self.unmatched += 1
+            return True
+
+        for compiled in matched:
+            self.matches[compiled.position] += 1
+
+        first = matched[0]
+        self.hits[first.position] += 1
+        samples = self.sample_matches[first.position]
+        if len(samples) < self.samples:
+            samples.append({"file": record, "plan": apply_actions(first.rule, record)})
+        return True
+
+    def progress(self) -> dict:
+        return {"type": "progress", "processed": self.processed}
+
+    def summary(self) -> dict:
+        return {
+            "type": "summary",
+            "processed": self.processed,
+            "unmatched": self.unmatched,
+            "invalid": self.invalid,
+            "rules": [
+                {
+                    "id": compiled.rule.get("id"),
+                    "name": compiled.rule.get("name"),
+                    "priority": compiled.rule.get("priority"),
+                    "hits": self.hits[compiled.position],
+                    "matches": self.matches[compiled.position],
+                    "samples": self.sample_matches[compiled.position],
+                }
+                for compiled in self.ruleset.rules
+            ],
+        }
+
+
+def _candidate_rules(raw: Any) -> List[dict]:
+    if not isinstance(raw, list):
+        raise HTTPException(status_code=422, detail="`rules` must be a list")
+    rules = []
+    for idx, item in enumerate(raw):
+        try:
+            rule = SimulationRule(**item).dict()
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Invalid rule #{idx}: {e}")
+        rule["id"] = rule["id"] or f"candidate-{idx}"
+        rules.append(rule)
+    return rules
+
+
+async def _ndjson_lines(chunks):
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+def _ndjson(obj: dict) -> bytes:
+    return fastjson.dumps(obj) + b"\n"
+
+
+def _too_large_for_json() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=(
+            f"JSON bodies are limited to {SIMULATE_MAX_JSON_BYTES} bytes; "
+            "send large simulations as application/x-ndjson"
+        ),
+    )
+
+
+async def _capped_body(request: Request, limit: int) -> bytes:
+    """
+    The request body, refusing with 413 as soon as it exceeds `limit` bytes
+    (up front when Content-Length already says so).
+    """
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise _too_large_for_json()
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise _too_large_for_json()
+    return bytes(body)
+
+
+@app.post("/rules/simulate")
+async def simulate_rules(
+    request: Request, samples: int = 5, tenant_id: str = Depends(current_tenant)
+):
+    """
+    Dry-run a candidate ruleset against file metadata records.
+
+    Records look like {"name", "ext", "size", "mime"}; ext is derived from
+    the name when missing. Two input formats are accepted:
+
+      - application/json: {"rules": [...], "files": [...]}, buffered whole
+        and so capped at SIMULATE_MAX_JSON_BYTES (413 above it)
+      - application/x-ndjson: an optional first line {"rules": [...]},
+        then one record per line. The body is consumed incrementally, so
+        this is the format to use for very large inputs.
+
+    Without "rules" the tenant's current ruleset is simulated. The response is NDJSON:
+    periodic {"type": "progress"} lines, then one {"type": "summary"} line
+    with per-rule hit counts and sample matches.
+    """
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type or "jsonl" in content_type:
+        lines = _ndjson_lines(request.stream())
+        first_record = None
+        rules = None
+        async for line in lines:
+            try:
+                head = fastjson.loads(line)
+            except ValueError:
+                raise HTTPException(status_code=422, detail="Invalid first line")
+            if isinstance(head, dict) and "rules" in head:
+                rules = _candidate_rules(head["rules"])
+            else:
+                first_record = head
+            break
+        records = lines
+    else:
+        raw = await _capped_body(request, SIMULATE_MAX_JSON_BYTES)
+        try:
+            body = fastjson.loads(raw)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid JSON body")
+        if not isinstance(body, dict):
+            raise HTTPException(status_code=422, detail="Expected a JSON object")
+        rules = _candidate_rules(body["rules"]) if "rules" in body else None
+        first_record = None
+        records = body.get("files") or []
+
+    if rules is None:
+        rules = rules_cache_for(tenant_id).rules()
+    simulation = RuleSimulation(rules, max(0, samples))
+
+    async def run():
+        if first_record is not None:
+            simulation.feed(first_record)
+        if isinstance(records, list):
+            for record in records:
+                fed = simulation.feed(record)
+                if fed and simulation.processed % SIMULATION_PROGRESS_EVERY == 0:
+                    yield _ndjson(simulation.progress())
+        else:
+            async for line in records:
+                try:
+                    record = fastjson.loads(line)
+                except ValueError:
+                    simulation.invalid += 1
+                    continue
+                fed = simulation.feed(record)
+                if fed and simulation.processed % SIMULATION_PROGRESS_EVERY == 0:
+                    yield _ndjson(simulation.progress())
+        yield _ndjson(simulation.summary())
+
+    return StreamingResponse(run(), media_type="application/x-ndjson")
+
+
+# -----------------------------------------------------------------------------
+# Upload endpoint (GCS upload → ingest event → workers)
+# -----------------------------------------------------------------------------
+
+
+def publish_ingest(event: Dict[str, Any]) -> None:
+    """
+    Publish the ingest event for an uploaded file and wait until Pub/Sub
+    has accepted it.
+    """
+    with tracing.span("pubsub publish", topic=INGEST_TOPIC):
+        # Encoded inside the span, so the inspect worker continues from it
+        data, attributes = messages.encode(event)
+        publisher.publish(
+            publisher.topic_path(GCP_PROJECT_ID, INGEST_TOPIC), data=data, **attributes
+        ).result()
+
+
+def upload_job_id(blob_name: str) -> str:
+    # Same id the inspect worker derives from the object
+    return f"{SOURCE_BUCKET}/{blob_name}".replace("/", "__")
+
+
+def _fail_upload_job(job_ref, error: Exception) -> None:
+    """
+    Mark a job whose upload failed, best effort; the reconciler fails it
+    later if this write does not happen either.
+    """
+    now = datetime.utcnow().isoformat() + "Z"
+    try:
+        with tracing.span("firestore set", dependency="firestore", doc=job_ref.path):
+            job_ref.set(
+                {
+                    "status": "ERROR",
+                    "error_message": f"Upload failed: {error}",
+                    "updated_at": now,
+                },
+                merge=True,
+            )
+    except Exception as e:
+        logger.warning("could not record the failed upload %s: %s", job_ref.id, e)
+
+
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(
+    file: UploadFile = File(...), tenant_id: str = Depends(current_tenant)
+):
     """
     Upload a file to the configured GCS bucket.
 
     Object name will include the original filename so
     name-based rules (e.g. "Name contains INFO 4602") can match.
+
+    The file is fingerprinted (size, SHA-256, CRC32C, header MIME sniff)
+    before it is sent, and those values go straight into an ingest event,
+    so the inspect worker never has to read the object back.
+
+    The job is recorded as NEW before the upload starts, so if this
+    instance dies before publishing, the reconciler still finds the file.
     """
     if not SOURCE_BUCKET:
         raise HTTPException(
@@ -217,6 +814,7 @@ async def upload_file(file: UploadFile = File(...)):
             detail="SOURCE_BUCKET is not configured on the server.",
         )
 
+    job_ref = None
     try:
         # Original filename from the client
         original_name = file.filename or "upload"
@@ -228,27 +826,104 @@ async def upload_file(file: UploadFile = File(...)):
         # Prefix with a uuid to avoid collisions, but keep the human name
         blob_name = f"uploads/{uuid.uuid4().hex}__{safe_name}"
 
-        bucket = storage_client.bucket(SOURCE_BUCKET)
-        blob = bucket.blob(blob_name)
+        # The upload is already spooled locally, so this pass costs no
+        # network round trips
+        fp = await run_in_threadpool(fingerprint, file.file)
+        file.file.seek(0)
+        mime_type = (
+            sniff_mime(fp["header"]) or file.content_type or "application/octet-stream"
+        )
 
-        # Optional: store original filename in metadata too
-        blob.metadata = {"original_filename": original_name}
+        job_ref = db.collection(JOBS_COLLECTION).document(upload_job_id(blob_name))
+        now = datetime.utcnow().isoformat() + "Z"
+        with tracing.span("firestore set", dependency="firestore", doc=job_ref.path):
+            await run_in_threadpool(
+                job_ref.set,
+                {
+                    "source": {"bucket": SOURCE_BUCKET, "blob": blob_name},
+                    "upload": {
+                        "mime_type": mime_type,
+                        "file_size": fp["size"],
+                        "sha256": fp["sha256"],
+                        "crc32c": fp["crc32c"],
+                    },
+                    "tenant_id": tenant_id,
+                    "status": "NEW",
+                    "created_at": now,
+                    "updated_at": now,
+                },
+            )
 
-        # Upload file content
-        blob.upload_from_file(file.file, content_type=file.content_type)
+        bucket = storage_client.bucket(SOURCE_BUCKET)
+        blob = bucket.blob(blob_name)
 
-        return {
-            "message": "uploaded",
-            "bucket": SOURCE_BUCKET,
-            "object": blob_name,
+        # Optional: store original filename in metadata too. The tenant
+        # travels with the object into the GCS notification; origin=api
+        # tells the inspect worker to ignore that notification.
+        blob.metadata = {
             "original_filename": original_name,
-            "content_type": file.content_type,
-            "public_url": blob.public_url,
+            "tenant_id": tenant_id,
+            "origin": "api",
+            "sha256": fp["sha256"],
         }
+        if fp["crc32c"]:
+            # GCS rejects the upload if the bytes it received do not match
+            blob.crc32c = fp["crc32c"]
+
+        # Upload file content
+        with tracing.span("gcs upload", bucket=SOURCE_BUCKET, size=fp["size"]):
+            await run_in_threadpool(
+                blob.upload_from_file, file.file, content_type=file.content_type
+            )
+    except Exception as e:
+        if job_ref is not None:
+            await run_in_threadpool(_fail_upload_job, job_ref, e)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {e}")
 
+    event = {
+        "job_id": upload_job_id(blob_name),
+        "tenant_id": tenant_id,
+        "bucket": SOURCE_BUCKET,
+        "blob": blob_name,
+        "mime_type": mime_type,
+        "file_size": fp["size"],
+        "sha256": fp["sha256"],
+        "crc32c": fp["crc32c"],
+        "origin": "api",
+    }
+    try:
+        await run_in_threadpool(publish_ingest, event)
     except Exception as e:
+        # Nothing else will pick the object up (its notification is
+        # ignored), so do not leave it behind
+        try:
+            await run_in_threadpool(blob.delete)
+        except NotFound:
+            pass
+        except Exception as cleanup_error:
+            logger.warning(
+                "could not remove gs://%s/%s: %s",
+                SOURCE_BUCKET,
+                blob_name,
+                cleanup_error,
+            )
+        await run_in_threadpool(_fail_upload_job, job_ref, e)
         raise HTTPException(status_code=500, detail=f"Upload failed: {e}")
 
+    return {
+        "message": "uploaded",
+        "bucket": SOURCE_BUCKET,
+        "object": blob_name,
+        "original_filename": original_name,
+        "tenant_id": tenant_id,
+        "content_type": file.content_type,
+        "mime_type": mime_type,
+        "file_size": fp["size"],
+        "sha256": fp["sha256"],
+        "crc32c": fp["crc32c"],
+        "public_url": blob.public_url,
+    }
+
 
 # -----------------------------------------------------------------------------
 # Activity helpers
@@ -285,71 +960,224 @@ def _map_status_to_ui(
 def root():
     return {
         "service": "cloud-file-orchestrator-api",
-        "endpoints": ["/health", "/rules", "/upload", "/activity"],
+        "endpoints": [
+            "/health",
+            "/rules",
+            "/rules/simulate",
+            "/upload",
+            "/activity",
+            "/activity/stream",
+            "/search",
+        ],
+    }
+
+
+def _activity_event(job_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map one Firestore job doc to the ActivityEvent shape expected by the UI.
+
+    Returns a plain dict: every field is derived here with the right type,
+    and building (or even model_construct()-ing) a model per row costs
+    more than serializing the whole row.
+    """
+    # Pick a timestamp (updated_at > created_at > now)
+    ts_str = data.get("updated_at") or data.get("created_at")
+    if ts_str:
+        # strip trailing Z if present
+        ts = datetime.fromisoformat(ts_str.replace("Z", ""))
+    else:
+        ts = datetime.utcnow()
+
+    source = data.get("source", {}) or {}
+    action = data.get("action", {}) or {}
+    classification = data.get("classification", {}) or {}
+
+    bucket = action.get("dest_bucket") or source.get("bucket") or SOURCE_BUCKET or ""
+    obj = action.get("dest_blob") or source.get("blob") or ""
+
+    raw_status = data.get("status", "COMPLETED")
+    ui_status = _map_status_to_ui(raw_status)
+
+    rule_name = classification.get("matched_rule") or data.get("rule_name")
+
+    actions_list: List[str] = []
+    if classification.get("label"):
+        actions_list.append(f"classified:{classification['label']}")
+    if action.get("dest_folder"):
+        actions_list.append(f"moved_to:{action['dest_folder']}")
+
+    return {
+        "id": job_id,
+        "timestamp": ts,
+        "bucket": bucket,
+        "object": obj,
+        "status": ui_status,
+        "rule_name": rule_name,
+        "actions": actions_list,
+        "error_message": data.get("error_message"),
     }
 
 
+def _recent_jobs_query(tenant_id: str, limit: int):
+    # One tenant's jobs, newest first
+    return (
+        db.collection(JOBS_COLLECTION)
+        .where("tenant_id", "==", tenant_id)
+        .order_by("updated_at", direction=firestore.Query.DESCENDING)
+        .limit(limit)
+    )
+
+
 @app.get("/activity", response_model=List[ActivityEvent])
-def list_activity(limit: int = 20) -> List[ActivityEvent]:
+def list_activity(
+    limit: int = 20, tenant_id: str = Depends(current_tenant)
+) -> Response:
     """
-    Return recent file processing events based on Firestore jobs.
+    Return the tenant's recent file processing events based on Firestore
+    jobs.
 
     We read from the same JOBS_COLLECTION that workers update
     (status, classification, action, etc.) and map each doc to the
     ActivityEvent shape expected by the UI.
     """
-    events: List[ActivityEvent] = []
+    events = [
+        _activity_event(doc.id, doc.to_dict() or {})
+        for doc in _recent_jobs_query(tenant_id, limit).stream()
+    ]
+    # Serialized directly; response_model only documents the shape
+    return Response(content=fastjson.dumps(events), media_type="application/json")
+
+
+# One listener per tenant and instance, shared by that tenant's
+# /activity/stream clients
+_activity_feeds: Dict[str, Fanout] = {}
+
+
+def activity_feed_for(tenant_id: str) -> Fanout:
+    feed = _activity_feeds.get(tenant_id)
+    if feed is None:
+        feed = _activity_feeds.setdefault(
+            tenant_id,
+            Fanout(
+                lambda: _recent_jobs_query(tenant_id, ACTIVITY_STREAM_WINDOW),
+                lambda doc: _activity_event(doc.id, doc.to_dict() or {}),
+                max_pending=ACTIVITY_CLIENT_BUFFER,
+            ),
+        )
+    return feed
 
-    # newest first
-    query = (
-        db.collection(JOBS_COLLECTION)
-        .order_by("updated_at", direction=firestore.Query.DESCENDING)
-        .limit(limit)
+
+def stream_tenant(
+    tenant_id: Optional[str] = None, x_tenant_id: Optional[str] = Header(None)
+) -> str:
+    """
+    Like current_tenant(), but also read from ?tenant_id=, since a browser
+    EventSource cannot send headers.
+    """
+    return current_tenant(x_tenant_id or tenant_id)
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {fastjson.dumps(data).decode('utf-8')}\n\n"
+
+
+@app.get("/activity/stream")
+async def stream_activity(request: Request, tenant_id: str = Depends(stream_tenant)):
+    """
+    Server-sent events: `snapshot` with the tenant's recent jobs, then one
+    `activity` event per job change.
+
+    A client that falls more than ACTIVITY_CLIENT_BUFFER jobs behind loses
+    the oldest updates and receives a `dropped` event with their count; it
+    should then reload /activity.
+    """
+
+    activity_feed = activity_feed_for(tenant_id)
+
+    async def events():
+        subscriber, current = activity_feed.subscribe()
+        try:
+            current.sort(key=lambda e: e["timestamp"], reverse=True)
+            yield _sse("snapshot", current)
+            while not await request.is_disconnected():
+                items, dropped = await subscriber.next(ACTIVITY_KEEPALIVE_SECONDS)
+                if dropped:
+                    yield _sse("dropped", {"count": dropped})
+                for item in items:
+                    yield _sse("activity", item)
+                if not items and not dropped:
+                    # Keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+        finally:
+            activity_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    for doc in query.stream():
-        data = doc.to_dict() or {}
-        job_id = doc.id
 
-        # Pick a timestamp (updated_at > created_at > now)
-        ts_str = data.get("updated_at") or data.get("created_at")
-        if ts_str:
-            # strip trailing Z if present
-            ts = datetime.fromisoformat(ts_str.replace("Z", ""))
-        else:
-            ts = datetime.utcnow()
+# -----------------------------------------------------------------------------
+# Search
+# -----------------------------------------------------------------------------
 
-        source = data.get("source", {}) or {}
-        action = data.get("action", {}) or {}
-        classification = data.get("classification", {}) or {}
 
-        bucket = (
-            action.get("dest_bucket") or source.get("bucket") or SOURCE_BUCKET or ""
-        )
-        obj = action.get("dest_blob") or source.get("blob") or ""
-
-        raw_status = data.get("status", "COMPLETED")
-        ui_status = _map_status_to_ui(raw_status)
-
-        rule_name = classification.get("matched_rule") or data.get("rule_name")
-
-        actions_list: List[str] = []
-        if classification.get("label"):
-            actions_list.append(f"classified:{classification['label']}")
-        if action.get("dest_folder"):
-            actions_list.append(f"moved_to:{action['dest_folder']}")
-
-        events.append(
-            ActivityEvent(
-                id=job_id,
-                timestamp=ts,
-                bucket=bucket,
-                object=obj,
-                status=ui_status,
-                rule_name=rule_name,
-                actions=actions_list,
-                error_message=data.get("error_message"),
+_search_session: Optional[AuthorizedSession] = None
+_search_session_lock = threading.Lock()
+
+
+def search_session() -> AuthorizedSession:
+    """
+    HTTP session to the indexer, signed with an ID token for its URL that
+    google-auth refreshes before it expires.
+    """
+    global _search_session
+    with _search_session_lock:
+        if _search_session is None:
+            credentials = id_token.fetch_id_token_credentials(
+                SEARCH_SERVICE_URL, GoogleAuthRequest()
             )
+            _search_session = AuthorizedSession(credentials)
+        return _search_session
+
+
+@app.get("/search")
+def search_files(
+    q: str = "",
+    mode: Literal["substring", "prefix"] = "substring",
+    classification: Optional[str] = None,
+    rule_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 50,
+    tenant_id: str = Depends(current_tenant),
+):
+    """
+    Where did my file end up? Searches processed files by name (prefix or
+    substring, case-insensitive; substring also matches the destination path and tags),
+    optionally filtered by classification, rule and completion date.
+    """
+    if not SEARCH_SERVICE_URL:
+        raise HTTPException(status_code=503, detail="Search is not configured")
+    params = {
+        "q": q,
+        "mode": mode,
+        "classification": classification,
+        "rule_id": rule_id,
+        "since": since,
+        "until": until,
+        "limit": limit,
+        "tenant_id": tenant_id,
+    }
+    try:
+        resp = search_session().get(
+            f"{SEARCH_SERVICE_URL}/search",
+            params={k: v for k, v in params.items() if v is not None},
+            timeout=SEARCH_TIMEOUT_SECONDS,
         )
-
-    return events
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning("Search: indexer request failed: %s", e)
+        raise HTTPException(status_code=502, detail="Search is unavailable")
+    return Response(content=resp.content, media_type="application/json")
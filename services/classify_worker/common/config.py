@@ -10,3 +10,10 @@ CLASSIFY_TOPIC = os.environ.get("CLASSIFY_TOPIC", "drbfo-classify")
 ACT_TOPIC = os.environ.get("ACT_TOPIC", "drbfo-act")
 
 JOBS_COLLECTION = os.environ.get("JOBS_COLLECTION", "jobs")
+
+# Size-based lanes: files at or above the threshold use the *_LARGE_* topics
+LARGE_FILE_THRESHOLD_BYTES = int(
+    os.environ.get("LARGE_FILE_THRESHOLD_BYTES", str(256 * 1024 * 1024))
+)
+CLASSIFY_LARGE_TOPIC = os.environ.get("CLASSIFY_LARGE_TOPIC", "drbfo-classify-large")
+ACT_LARGE_TOPIC = os.environ.get("ACT_LARGE_TOPIC", "drbfo-act-large")
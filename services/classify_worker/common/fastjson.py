@@ -0,0 +1,43 @@
+# common/fastjson.py
+
+import datetime as dt
+import json
+from typing import Any
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _default(obj: Any) -> Any:
+    # Firestore returns datetime subclasses, which orjson does not take
+    if isinstance(obj, (dt.datetime, dt.date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+_std_dumps = json.JSONEncoder(
+    separators=(",", ":"), ensure_ascii=False, default=_default
+).encode
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Compact UTF-8 JSON. Uses orjson when installed, the standard library
+    otherwise; both produce the same bytes for the types the pipeline sends.
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(obj, default=_default)
+    return _std_dumps(obj).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """
+    Parse JSON from bytes or str.
+    """
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
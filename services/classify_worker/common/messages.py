@@ -0,0 +1,127 @@
+# common/messages.py
+
+import binascii
+from typing import Any, Dict, Optional, Tuple, Union
+
+from common import fastjson, tracing
+
+# Bump when the body layout changes; decoders keep reading older versions.
+SCHEMA_VERSION = 1
+
+# Body fields ↔ short keys on the wire. Routing fields (job_id, tenant_id,
+# lane, classification) travel as Pub/Sub attributes instead, so subscriptions can
+# filter on them and consumers can route without decoding the body.
+_SHORT_KEYS = {
+    "bucket": "b",
+    "blob": "o",
+    "mime_type": "m",
+    "file_size": "s",
+    "ext": "e",
+    "sha256": "h",
+    "crc32c": "c",
+    "origin": "g",
+    "ruleset_version": "r",
+    "full_inspection": "i",
+    "archive_entries": "a",
+    "archive_names": "n",
+    "archive_names_truncated": "t",
+}
+_LONG_KEYS = {short: long for long, short in _SHORT_KEYS.items()}
+ROUTING_ATTRIBUTES = ("job_id", "tenant_id", "lane", "classification")
+
+
+def encode(event: Dict[str, Any]) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Return (data, attributes) for publishing one inter-stage event.
+    """
+    body = {"v": SCHEMA_VERSION}
+    for field, short in _SHORT_KEYS.items():
+        value = event.get(field)
+        if value is not None and value != "":
+            body[short] = value
+    attributes = {"v": str(SCHEMA_VERSION)}
+    for field in ROUTING_ATTRIBUTES:
+        value = event.get(field)
+        if value:
+            attributes[field] = str(value)
+    # W3C trace context of the publishing span, continued by the consumer
+    traceparent = event.get("traceparent") or tracing.current_traceparent()
+    if traceparent:
+        attributes["traceparent"] = traceparent
+    return fastjson.dumps(body), attributes
+
+
+def _from_envelope(body: Dict[str, Any], attributes: Dict[str, str]) -> Dict[str, Any]:
+    event = {long: body[short] for short, long in _LONG_KEYS.items() if short in body}
+    for field in ROUTING_ATTRIBUTES:
+        if attributes.get(field):
+            event[field] = attributes[field]
+    return event
+
+
+def _from_gcs_notification(body: Dict[str, Any]) -> Dict[str, Any]:
+    # Cloud Storage's JSON_API_V1 object resource; size is a string there
+    metadata = body.get("metadata") or {}
+    return {
+        "bucket": body.get("bucket"),
+        "blob": body.get("name"),
+        "mime_type": body.get("contentType"),
+        "file_size": int(body.get("size") or 0),
+        "tenant_id": metadata.get("tenant_id"),
+        # "api" when the API already published this file's ingest event
+        "origin": metadata.get("origin"),
+        "gcs_event": True,
+    }
+
+
+def decode(data: bytes, attributes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Decode a message body into the pipeline's canonical field names.
+
+    Understands the versioned envelope, the legacy full-JSON events older
+    publishers still send, and raw Cloud Storage notifications (flagged
+    with gcs_event=True).
+    """
+    attributes = attributes or {}
+    body = fastjson.loads(data)
+
+    if "v" in body or "v" in attributes:
+        event = _from_envelope(body, attributes)
+    elif "eventType" in attributes or ("contentType" in body and "size" in body):
+        event = _from_gcs_notification(body)
+    else:
+        event = dict(body)
+        if not event.get("blob") and event.get("name"):
+            event["blob"] = event["name"]
+
+    event.setdefault("name", event.get("blob"))
+    if attributes.get("traceparent"):
+        event["traceparent"] = attributes["traceparent"]
+    return event
+
+
+def decode_push(
+    envelope: Union[bytes, Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+    """
+    Decode a Pub/Sub push request body, raw or already parsed; None when
+    the message has no data.
+    """
+    if isinstance(envelope, (bytes, str)):
+        envelope = fastjson.loads(envelope)
+    message = envelope.get("message") or {}
+    data_b64 = message.get("data")
+    if not data_b64:
+        return None
+    # Same lenient decoding as base64.b64decode, without its argument checks
+    return decode(binascii.a2b_base64(data_b64), message.get("attributes"))
+
+
+def describe(event: Dict[str, Any]) -> str:
+    """
+    One short log line for an event, instead of dumping the whole payload.
+    """
+    return (
+        f"job={event.get('job_id')} gs://{event.get('bucket')}/{event.get('blob')} "
+        f"tenant={event.get('tenant_id')} lane={event.get('lane')}"
+    )
@@ -0,0 +1,288 @@
+# common/resilience.py
+
+import inspect
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures import wait
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from fastapi.responses import Response
+
+from common import tracing
+from common.limits import OVERLOAD_ERRORS, AdaptiveLimiter, Saturated
+
+# Errors worth retrying / counting against a circuit breaker. Anything else
+# (NotFound, PermissionDenied, bad arguments) is about the request, and means
+# the dependency itself answered fine.
+TRANSIENT_ERRORS = OVERLOAD_ERRORS + (ConnectionError,)
+
+_hedge_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("HEDGE_POOL_SIZE", "16")), thread_name_prefix="hedge"
+)
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a dependency whose breaker is open.
+    """
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} circuit open")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Classic closed → open → half-open breaker.
+
+    `failure_threshold` consecutive transient failures open the circuit for
+    `reset_timeout` seconds; then a single trial call is let through and its
+    outcome either closes the circuit or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, name: str, failure_threshold: int = 5, reset_timeout: float = 30
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def rejecting(self) -> bool:
+        """
+        True while the circuit is open and the reset timeout has not passed.
+        """
+        return (
+            self.state == self.OPEN
+            and time.monotonic() - self._opened_at < self.reset_timeout
+        )
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if self.state == self.OPEN and elapsed >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpen(self.name, max(0.0, self.reset_timeout - elapsed))
+
+    def cancel_trial(self) -> None:
+        """
+        The admitted call never reached the dependency; let another through.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+def _setting(name: str, field: str, default: str) -> str:
+    return os.getenv(f"{name.upper()}_{field}", os.getenv(field, default))
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    "Full jitter" exponential backoff: uniform in [0, min(cap, base * 2^n)].
+    """
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+def hedged(delay: float, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Call `fn`; if it has not returned after `delay` seconds, start a second
+    identical call and return whichever succeeds first. Raises only when
+    both fail. Only for idempotent reads.
+    """
+    first = _hedge_pool.submit(fn, *args, **kwargs)
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+
+    second = _hedge_pool.submit(fn, *args, **kwargs)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+    return first.result()
+
+
+_timeout_params: Dict[Any, bool] = {}
+
+
+def accepts_timeout(fn: Callable[..., Any]) -> bool:
+    """
+    Whether `fn` takes a `timeout` keyword, as the Google client methods
+    and this repo's ranged-read and publish helpers do.
+    """
+    key = getattr(fn, "__func__", fn)
+    found = _timeout_params.get(key)
+    if found is None:
+        try:
+            found = "timeout" in inspect.signature(fn).parameters
+        except (TypeError, ValueError):
+            found = False
+        _timeout_params[key] = found
+    return found
+
+
+class Dependency:
+    """
+    Everything between a worker and one downstream service: a circuit
+    breaker, an adaptive concurrency limit, deadline-aware retries with
+    jittered backoff and, for idempotent reads, optional request hedging.
+
+    Calls to functions that take a `timeout` keyword get the time left
+    before the deadline, so a slow last attempt cannot overrun it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.limiter = AdaptiveLimiter.from_env(name)
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=int(_setting(name, "BREAKER_FAILURES", "5")),
+            reset_timeout=float(_setting(name, "BREAKER_RESET_SECONDS", "30")),
+        )
+        self.attempts = int(_setting(name, "RETRY_ATTEMPTS", "3"))
+        self.backoff_base = float(_setting(name, "RETRY_BACKOFF_MS", "100")) / 1000.0
+        self.backoff_cap = (
+            float(_setting(name, "RETRY_BACKOFF_CAP_MS", "2000")) / 1000.0
+        )
+        self.deadline = float(_setting(name, "CALL_DEADLINE_SECONDS", "30"))
+        self.hedge_delay = float(_setting(name, "HEDGE_DELAY_MS", "0")) / 1000.0
+
+    def _hedge_after(self) -> float:
+        if self.hedge_delay > 0:
+            return self.hedge_delay
+        # Default: well past the typical latency this dependency shows
+        return max(0.05, 3 * (self.limiter.baseline or 0.05))
+
+    def call(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        idempotent: bool = False,
+        hedge: bool = False,
+        cost: float = 1.0,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Call `fn` through the breaker and limiter, retrying transient errors
+        of idempotent calls, inside one span covering every attempt. `cost`
+        scales the latency the limiter expects (see AdaptiveLimiter).
+        """
+        operation = getattr(fn, "__qualname__", None) or getattr(fn, "__name__", "call")
+        with tracing.span(f"{self.name} {operation}", dependency=self.name):
+            return self._call(fn, args, kwargs, idempotent, hedge, cost)
+
+    def _call(
+        self,
+        fn: Callable[..., Any],
+        args: tuple,
+        kwargs: Dict[str, Any],
+        idempotent: bool,
+        hedge: bool,
+        cost: float = 1.0,
+    ) -> Any:
+        deadline = time.monotonic() + self.deadline
+        pass_timeout = "timeout" not in kwargs and accepts_timeout(fn)
+        attempt = 0
+        while True:
+            if pass_timeout:
+                kwargs["timeout"] = max(0.001, deadline - time.monotonic())
+            self.breaker.before_call()
+            try:
+                if hedge and idempotent:
+                    result = self.limiter.call_with_cost(
+                        cost, hedged, self._hedge_after(), fn, *args, **kwargs
+                    )
+                else:
+                    result = self.limiter.call_with_cost(cost, fn, *args, **kwargs)
+            except Saturated:
+                self.breaker.cancel_trial()
+                raise
+            except TRANSIENT_ERRORS:
+                self.breaker.record_failure()
+                attempt += 1
+                if not idempotent or attempt >= self.attempts:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+                continue
+            except Exception:
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"breaker": self.breaker.state, **self.limiter.stats()}
+
+
+class Dependencies:
+    """
+    The set of Dependency wrappers one worker talks to.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.deps = {name: Dependency(name) for name in names}
+
+    def call(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return self.deps[name].call(fn, *args, **kwargs)
+
+    def saturated(self, names: Optional[Iterable[str]] = None) -> Optional[str]:
+        """
+        Name of a dependency that cannot take more work right now (queue full
+        or circuit open), if any; only among `names` when given.
+        """
+        for name in self.deps if names is None else names:
+            dep = self.deps[name]
+            if dep.limiter.saturated or dep.breaker.rejecting:
+                return name
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dep.stats() for name, dep in self.deps.items()}
+
+
+def circuit_open_response(request, exc: CircuitOpen) -> Response:
+    """
+    Exception handler: answer 503 so Pub/Sub push backs off and redelivers.
+    """
+    return Response(
+        status_code=503, headers={"Retry-After": str(max(1, int(exc.retry_after)))}
+    )
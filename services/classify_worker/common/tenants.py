@@ -0,0 +1,70 @@
+# common/tenants.py
+
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+DEFAULT_TENANT = os.environ.get("DEFAULT_TENANT", "default")
+
+# Tenant ids end up in object metadata, Pub/Sub attributes and file paths
+_TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+def normalize_tenant(value: Optional[str]) -> str:
+    """
+    Lower-cased tenant id, DEFAULT_TENANT when empty. Raises ValueError for
+    ids that are not safe to use as-is.
+    """
+    tenant = (value or "").strip().lower() or DEFAULT_TENANT
+    if not _TENANT_ID.match(tenant):
+        raise ValueError(f"invalid tenant id: {value!r}")
+    return tenant
+
+
+def tenant_of(record: Dict[str, Any]) -> str:
+    """
+    Tenant of a rule, job or event; records written before tenants existed
+    belong to DEFAULT_TENANT.
+    """
+    return record.get("tenant_id") or DEFAULT_TENANT
+
+
+def load_tenant_rules(
+    collection: Any, tenant_id: str, enabled_only: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    One tenant's rule documents (with "id") from a Firestore rules
+    collection, queried by tenant_id. Rules written before tenants existed
+    have no tenant_id, which no query can select, so the default tenant also
+    scans for those until they are stamped.
+    """
+    query = collection.where("tenant_id", "==", tenant_id)
+    if enabled_only:
+        query = query.where("enabled", "==", True)
+    streams = [query.stream()]
+    if tenant_id == DEFAULT_TENANT:
+        legacy = collection.where("enabled", "==", True) if enabled_only else collection
+        streams.append(legacy.stream())
+
+    rules: Dict[str, Dict[str, Any]] = {}
+    for stream in streams:
+        for d in stream:
+            data = d.to_dict() or {}
+            if d.id in rules or tenant_of(data) != tenant_id:
+                continue
+            data["id"] = d.id
+            rules[d.id] = data
+    return list(rules.values())
+
+
+def tenant_weights(spec: Optional[str] = None) -> Dict[str, float]:
+    """
+    Parse TENANT_WEIGHTS ("acme=3,globex=1"); unlisted tenants weigh 1.
+    """
+    spec = os.environ.get("TENANT_WEIGHTS", "") if spec is None else spec
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() and weight.strip():
+            weights[name.strip().lower()] = float(weight)
+    return weights
@@ -1,81 +1,113 @@
 # services/classify_worker/main.py
 
-import base64
-import json
 import logging
 import os
 import datetime as dt
+from typing import Any, Dict, Optional
 
 from fastapi import FastAPI, Request
 from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
 
 from google.cloud import pubsub_v1, firestore
 
-from common.config import GCP_PROJECT_ID, ACT_TOPIC, JOBS_COLLECTION
-
-logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
+from common import messages, tracing
+from common.classification import simple_classification
+from common.config import GCP_PROJECT_ID, JOBS_COLLECTION
+from common.fairness import FairScheduler
+from common.lanes import lane_of, lane_topic
+from common.limits import Saturated, saturated_response
+from common.log import install_request_logging, job_context, setup_logging
+from common.resilience import CircuitOpen, Dependencies, circuit_open_response
+from common.tenants import tenant_of
+
+setup_logging("classify-worker")
+tracing.configure("classify-worker")
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
+install_request_logging(app, logger)
 publisher = pubsub_v1.PublisherClient()
 db = firestore.Client(project=GCP_PROJECT_ID)
 
+# Breaker + adaptive limit + retries around every downstream call
+deps = Dependencies(("firestore", "pubsub"))
+app.add_exception_handler(Saturated, saturated_response)
+app.add_exception_handler(CircuitOpen, circuit_open_response)
+
+# Pushes handled at once, shared fairly between tenants
+CLASSIFY_CONCURRENCY = int(os.getenv("CLASSIFY_CONCURRENCY", "64"))
+scheduler = FairScheduler.from_env("classify", CLASSIFY_CONCURRENCY)
+
 
 def topic_path(topic_name: str) -> str:
     return publisher.topic_path(GCP_PROJECT_ID, topic_name)
 
 
-def simple_classification(mime_type: str, ext: str) -> str:
+def publish_event(
+    topic_name: str, event: Dict[str, Any], timeout: Optional[float] = None
+) -> None:
     """
-    Very basic classifier based on extension/MIME.
-    You can replace this with your more advanced logic.
+    Publish and wait for Pub/Sub to accept the message, so the incoming push
+    is only acknowledged once the next stage's message is durable.
     """
-    ext = (ext or "").lower()
-    mime = (mime_type or "").lower()
-
-    if ext in [".jpg", ".jpeg", ".png", ".gif"] or mime.startswith("image/"):
-        return "images"
-    if ext in [".csv", ".xlsx"] or "spreadsheet" in mime or "csv" in mime:
-        return "spreadsheets"
-    if ext in [".pdf"]:
-        return "pdfs"
-    if ext in [".txt"]:
-        return "text"
-    return "uncategorized"
+    data, attributes = messages.encode(event)
+    publisher.publish(topic_path(topic_name), data=data, **attributes).result(
+        timeout=timeout
+    )
 
 
 @app.post("/pubsub-push")
 async def pubsub_push(request: Request):
-    envelope = await request.json()
-    message = envelope.get("message", {})
-    data_b64 = message.get("data")
-    if not data_b64:
+    payload = messages.decode_push(await request.body())
+    if payload is None:
         logger.warning("Classify worker: received Pub/Sub push with no data")
         return Response(status_code=204)
-
-    payload_json = base64.b64decode(data_b64).decode("utf-8")
-    payload = json.loads(payload_json)
-    logger.info(f"Classify worker: received payload: {payload}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Classify worker: received %s", messages.describe(payload))
 
     job_id = payload.get("job_id")
     bucket_name = payload.get("bucket")
-    blob_name = payload.get("blob") or payload.get("name")
-    mime_type = payload.get("mime_type")
-    file_size = payload.get("file_size") or 0
+    blob_name = payload.get("blob")
 
     if not job_id or not bucket_name or not blob_name:
         logger.warning(
-            f"Classify worker: missing fields "
-            f"(job_id={job_id}, bucket={bucket_name}, blob={blob_name})"
+            "Classify worker: missing fields (job_id=%s, bucket=%s, blob=%s)",
+            job_id,
+            bucket_name,
+            blob_name,
         )
         return Response(status_code=204)
 
+    busy = deps.saturated()
+    if busy:
+        logger.warning("Classify worker: %s saturated, rejecting %s", busy, job_id)
+        return Response(status_code=429)
+
+    # Tenants share this instance by weighted fair queueing
+    with job_context(job_id), tracing.span(
+        "classify", parent=payload.get("traceparent"), job_id=job_id
+    ):
+        async with scheduler.slot(tenant_of(payload)):
+            return await classify_file(payload, job_id, bucket_name, blob_name)
+
+
+async def classify_file(
+    payload: Dict[str, Any], job_id: str, bucket_name: str, blob_name: str
+) -> Response:
+    mime_type = payload.get("mime_type")
+    file_size = payload.get("file_size") or 0
     _, ext = os.path.splitext(blob_name)
-    classification = simple_classification(mime_type, ext)
+    # Set by the inspect worker for files it listed as ZIP archives
+    archive_names = payload.get("archive_names")
+    classification = simple_classification(mime_type, ext, archive_names)
 
     # Update Firestore job (optional but nice)
     doc_ref = db.collection(JOBS_COLLECTION).document(job_id)
-    doc_ref.set(
+    await run_in_threadpool(
+        deps.call,
+        "firestore",
+        doc_ref.set,
         {
             "classification": {
                 "classification": classification,
@@ -88,23 +120,32 @@ async def pubsub_push(request: Request):
             "updated_at": dt.datetime.utcnow().isoformat() + "Z",
         },
         merge=True,
+        idempotent=True,
     )
 
-    # Send to act worker with full metadata
+    # Send to act worker with full metadata, keeping the inspect stage's lane
+    lane = lane_of(payload)
     event = {
         "job_id": job_id,
         "bucket": bucket_name,
         "blob": blob_name,
-        "name": blob_name,
         "mime_type": mime_type,
         "file_size": file_size,
         "ext": ext,
         "classification": classification,
+        "lane": lane,
+        "tenant_id": tenant_of(payload),
+        "archive_entries": payload.get("archive_entries"),
+        "archive_names": archive_names,
+        "archive_names_truncated": payload.get("archive_names_truncated"),
     }
 
-    publisher.publish(
-        topic_path(ACT_TOPIC),
-        data=json.dumps(event).encode("utf-8"),
+    await run_in_threadpool(
+        deps.call,
+        "pubsub",
+        publish_event,
+        lane_topic("act", lane),
+        event,
     )
 
     return Response(status_code=204)
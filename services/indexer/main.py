@@ -0,0 +1,106 @@
+# services/indexer/main.py
+
+import contextlib
+import logging
+import os
+from typing import Literal, Optional
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from google.cloud import storage
+
+from common import messages, tracing
+from common.log import install_request_logging, setup_logging
+from common.push_auth import PushVerifier
+from common.search_index import SearchIndex
+from common.tenants import DEFAULT_TENANT
+
+setup_logging("indexer")
+tracing.configure("indexer")
+logger = logging.getLogger(__name__)
+
+# The one copy of the search index: fed by SEARCH_TOPIC, snapshotted to GCS
+# and queried by the API. Deploy with --max-instances=1 so every completed
+# job lands in the same index and only one instance writes the snapshot.
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "/tmp/drbfo-search.sqlite")
+SEARCH_INDEX_SNAPSHOT = os.getenv("SEARCH_INDEX_SNAPSHOT", "")  # gs://bucket/path
+SEARCH_SNAPSHOT_SECONDS = float(os.getenv("SEARCH_SNAPSHOT_SECONDS", "300"))
+SEARCH_MAX_RESULTS = 500
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Keep what was indexed since the last periodic snapshot
+    await run_in_threadpool(snapshot_on_shutdown)
+
+
+app = FastAPI(lifespan=lifespan)
+install_request_logging(app, logger)
+storage_client = storage.Client()
+verify_push = PushVerifier.from_env()
+
+if SEARCH_INDEX_SNAPSHOT:
+    search_index = SearchIndex.restore(
+        storage_client, SEARCH_INDEX_SNAPSHOT, SEARCH_INDEX_PATH
+    )
+    search_index.start_snapshots(
+        storage_client, SEARCH_INDEX_SNAPSHOT, SEARCH_SNAPSHOT_SECONDS
+    )
+else:
+    search_index = SearchIndex(SEARCH_INDEX_PATH)
+
+
+def snapshot_on_shutdown() -> None:
+    if not SEARCH_INDEX_SNAPSHOT:
+        return
+    try:
+        search_index.snapshot(storage_client, SEARCH_INDEX_SNAPSHOT)
+    except Exception as e:
+        logger.error("Search index: final snapshot failed: %s", e)
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.post("/pubsub-push", dependencies=[Depends(verify_push)])
+async def index_completed_job(request: Request):
+    """
+    Push endpoint for SEARCH_TOPIC: one completed job per message.
+    """
+    record = messages.decode_push(await request.body())
+    if record:
+        await run_in_threadpool(search_index.upsert, [record])
+    return Response(status_code=204)
+
+
+@app.get("/search")
+def search_files(
+    q: str = "",
+    mode: Literal["substring", "prefix"] = "substring",
+    classification: Optional[str] = None,
+    rule_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 50,
+    tenant_id: str = DEFAULT_TENANT,
+):
+    """
+    Query the index for one tenant; called by the API's GET /search, which
+    resolves the tenant from the caller's request.
+    """
+    results = search_index.search(
+        tenant_id,
+        q,
+        mode=mode,
+        classification=classification,
+        rule_id=rule_id,
+        since=since,
+        until=until,
+        limit=max(1, min(limit, SEARCH_MAX_RESULTS)),
+    )
+    return {"count": len(results), "results": results}
@@ -0,0 +1,141 @@
+# common/cpu_pool.py
+
+import asyncio
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional
+
+from common.limits import Saturated
+
+
+class TaskTimeout(Exception):
+    """
+    Raised when a pool task does not finish within the pool's timeout.
+    """
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"{name} task exceeded {timeout}s")
+        self.name = name
+        self.timeout = timeout
+
+
+class _Worker:
+    """
+    One worker process, as a single-process executor of its own, so an
+    overdue task can be killed without touching the other workers.
+    """
+
+    def __init__(self):
+        self.executor = ProcessPoolExecutor(max_workers=1)
+        self.pid: Optional[int] = None
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.pid = await loop.run_in_executor(self.executor, os.getpid)
+
+    def kill(self) -> None:
+        # A running task cannot be cancelled; kill its process instead
+        if self.pid is not None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CpuPool:
+    """
+    Process pool for CPU-bound work called from async handlers.
+
+    Tasks run in separate processes, so they neither block the event loop
+    nor contend for the GIL, and throughput scales with the instance's
+    vCPUs. At most `workers + max_queued` tasks may be in flight; beyond
+    that Saturated is raised (the workers answer 429). Tasks wait for a
+    free worker first; one that then runs longer than `timeout` seconds
+    raises TaskTimeout. Its process cannot be interrupted any other way, so
+    that worker alone is killed and replaced by a fresh one.
+
+    `fn` and its arguments must be picklable: module-level functions and
+    plain data.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        timeout: float = 5.0,
+    ):
+        self.name = name
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queued = self.workers * 2 if max_queued is None else max_queued
+        self.timeout = timeout
+        self.inflight = 0
+        self._idle: List[_Worker] = []
+        self._free: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_env(cls, name: str) -> "CpuPool":
+        prefix = name.upper().replace("-", "_")
+        workers = os.getenv(f"{prefix}_WORKERS")
+        max_queued = os.getenv(f"{prefix}_MAX_QUEUED")
+        return cls(
+            name,
+            workers=int(workers) if workers else None,
+            max_queued=int(max_queued) if max_queued else None,
+            timeout=float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", "5")),
+        )
+
+    @property
+    def saturated(self) -> bool:
+        return self.inflight >= self.workers + self.max_queued
+
+    def _free_workers(self) -> asyncio.Semaphore:
+        # asyncio primitives belong to one event loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._free = asyncio.Semaphore(self.workers)
+            self._loop = loop
+        return self._free
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.saturated:
+            raise Saturated(self.name)
+        self.inflight += 1
+        try:
+            async with self._free_workers():
+                worker = self._idle.pop() if self._idle else _Worker()
+                if worker.pid is None:
+                    await worker.start()
+                return await self._run_on(worker, fn, args)
+        finally:
+            self.inflight -= 1
+
+    async def _run_on(self, worker: _Worker, fn: Callable[..., Any], args) -> Any:
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(worker.executor, fn, *args)
+            result = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            worker.kill()
+            raise TaskTimeout(self.name, self.timeout)
+        except BrokenProcessPool:
+            worker.kill()
+            raise
+        except BaseException:
+            # The task raised; its process is still fine
+            self._idle.append(worker)
+            raise
+        self._idle.append(worker)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "inflight": self.inflight,
+            "idle": len(self._idle),
+        }
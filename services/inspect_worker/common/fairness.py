@@ -0,0 +1,146 @@
+# common/fairness.py
+
+import asyncio
+import contextlib
+import os
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from common.limits import Saturated
+from common.tenants import tenant_weights
+
+
+class _Tenant:
+    __slots__ = ("weight", "running", "waiting", "finish")
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.running = 0
+        self.waiting: Deque[asyncio.Future] = deque()
+        # Virtual finish time of this tenant's last admitted task
+        self.finish = 0.0
+
+
+class FairScheduler:
+    """
+    Weighted fair queueing of a worker's concurrency across tenants.
+
+    At most `concurrency` tasks run at once. When a slot frees up it goes to
+    the waiting tenant with the smallest virtual finish time, where each
+    admitted task advances its tenant's clock by 1/weight; a tenant with
+    weight 2 therefore gets twice the slots of a weight-1 tenant while both
+    are backlogged, and an idle tenant does not bank credit (its clock is
+    brought up to the current virtual time when it comes back).
+
+    A tenant never holds more than `quota` slots, so a burst from one
+    tenant leaves room for the others, and at most `max_queued` of its
+    tasks may wait; beyond that Saturated is raised (the workers answer
+    429).
+
+    Meant to be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        quota: Optional[int] = None,
+        max_queued: int = 32,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.quota = quota or concurrency
+        self.max_queued = max_queued
+        self.weights = weights or {}
+        self.running = 0
+        self.vtime = 0.0
+        self._tenants: Dict[str, _Tenant] = {}
+
+    @classmethod
+    def from_env(cls, name: str, concurrency: int) -> "FairScheduler":
+        share = float(os.getenv("TENANT_MAX_SHARE", "0.5"))
+        return cls(
+            name,
+            concurrency,
+            quota=max(1, int(concurrency * share)),
+            max_queued=int(os.getenv("TENANT_MAX_QUEUED", "32")),
+            weights=tenant_weights(),
+        )
+
+    def _tenant(self, tenant_id: str) -> _Tenant:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            weight = self.weights.get(tenant_id, 1.0)
+            tenant = self._tenants[tenant_id] = _Tenant(weight)
+        return tenant
+
+    def _admit(self, tenant: _Tenant) -> None:
+        self.running += 1
+        tenant.running += 1
+        start = max(tenant.finish, self.vtime)
+        tenant.finish = start + 1.0 / tenant.weight
+        self.vtime = start
+
+    def _dispatch(self) -> None:
+        while self.running < self.concurrency:
+            eligible = [
+                t
+                for t in self._tenants.values()
+                if t.waiting and t.running < self.quota
+            ]
+            if not eligible:
+                return
+            tenant = min(
+                eligible, key=lambda t: max(t.finish, self.vtime) + 1.0 / t.weight
+            )
+            waiter = tenant.waiting.popleft()
+            if waiter.done():  # cancelled while waiting
+                continue
+            self._admit(tenant)
+            waiter.set_result(None)
+
+    def saturated(self, tenant_id: str) -> bool:
+        tenant = self._tenants.get(tenant_id)
+        return tenant is not None and len(tenant.waiting) >= self.max_queued
+
+    @contextlib.asynccontextmanager
+    async def slot(self, tenant_id: str):
+        tenant = self._tenant(tenant_id)
+        if (
+            self.running < self.concurrency
+            and tenant.running < self.quota
+            and not any(t.waiting for t in self._tenants.values())
+        ):
+            self._admit(tenant)
+        else:
+            if len(tenant.waiting) >= self.max_queued:
+                raise Saturated(f"{self.name}:{tenant_id}")
+            waiter = asyncio.get_running_loop().create_future()
+            tenant.waiting.append(waiter)
+            self._dispatch()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in tenant.waiting:
+                    tenant.waiting.remove(waiter)
+                elif not waiter.cancelled():
+                    # Admitted just as we were cancelled: hand the slot back
+                    self._release(tenant)
+                raise
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    def _release(self, tenant: _Tenant) -> None:
+        self.running -= 1
+        tenant.running -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            tenant_id: {"running": t.running, "waiting": len(t.waiting)}
+            for tenant_id, t in self._tenants.items()
+            if t.running or t.waiting
+        }
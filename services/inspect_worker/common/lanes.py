@@ -0,0 +1,46 @@
+# common/lanes.py
+
+from typing import Any, Dict
+
+from common.config import (
+    LARGE_FILE_THRESHOLD_BYTES,
+    CLASSIFY_TOPIC,
+    CLASSIFY_LARGE_TOPIC,
+    ACT_TOPIC,
+    ACT_LARGE_TOPIC,
+)
+
+SMALL_LANE = "small"
+LARGE_LANE = "large"
+LANES = (SMALL_LANE, LARGE_LANE)
+
+_TOPICS = {
+    "classify": {SMALL_LANE: CLASSIFY_TOPIC, LARGE_LANE: CLASSIFY_LARGE_TOPIC},
+    "act": {SMALL_LANE: ACT_TOPIC, LARGE_LANE: ACT_LARGE_TOPIC},
+}
+
+
+def lane_for_size(file_size: Any) -> str:
+    try:
+        size = int(file_size or 0)
+    except (TypeError, ValueError):
+        size = 0
+    return LARGE_LANE if size >= LARGE_FILE_THRESHOLD_BYTES else SMALL_LANE
+
+
+def lane_of(payload: Dict[str, Any]) -> str:
+    """
+    Lane of an inter-stage message: the explicit `lane` field if the
+    previous stage set one, otherwise derived from `file_size`.
+    """
+    lane = payload.get("lane")
+    if lane in LANES:
+        return lane
+    return lane_for_size(payload.get("file_size"))
+
+
+def lane_topic(stage: str, lane: str) -> str:
+    """
+    Topic feeding `stage` ("classify" or "act") for the given lane.
+    """
+    return _TOPICS[stage][lane]
@@ -189,28 +189,39 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
-
-
 import base64
 import json
 import datetime as dt
 import logging
+from typing import Any, Dict, List, Optional
+
 from fastapi import FastAPI, Request
 from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
 
 from google.cloud import storage, pubsub_v1, firestore
-from common.config import GCP_PROJECT_ID, CLASSIFY_TOPIC, JOBS_COLLECTION
-
-# ------------------- puremagic (fixed for all versions) -------------------
-try:
-    import puremagic
-
-    HAS_PUREMAGIC = True
-    logging.info("puremagic imported successfully")
-except ImportError:
-    HAS_PUREMAGIC = False
-    logging.warning("puremagic not available")
+from common import messages, tracing
+from common.classification import simple_classification
+from common.config import GCP_PROJECT_ID, JOBS_COLLECTION
+from common.cpu_pool import CpuPool
+from common.fairness import FairScheduler
+from common.inspectors import (
+    EOCD_MAX_TAIL,
+    HAS_PUREMAGIC,
+    is_zip,
+    list_zip_entries,
+    sniff_mime,
+    zip_directory_range,
+)
+from common.lanes import lane_for_size, lane_topic
+from common.limits import Saturated, saturated_response
+from common.log import install_request_logging, job_context, setup_logging
+from common.resilience import CircuitOpen, Dependencies, circuit_open_response
+from common.rules import STAGE_ACT, RuleSet, RuleSetCache
+from common.tenants import DEFAULT_TENANT, load_tenant_rules, tenant_of
+
+setup_logging("inspect-worker")
+tracing.configure("inspect-worker")
 
 # Reliable extension map
 EXTENSION_MAP = {
@@ -260,67 +271,139 @@ EXTENSION_MAP = {
 #     return "application/octet-stream"
 
 
-def detect_mime_type(blob) -> str:
+def read_header(blob, timeout: float = 60) -> bytes:
+    """
+    Ranged read of the first bytes of the object (enough for magic bytes).
+    """
+    return blob.download_as_bytes(start=0, end=2048, timeout=timeout)
+
+
+def read_range(blob, start: int, end: int, timeout: float = 60) -> bytes:
+    """
+    Ranged read of bytes start..end of the object, both inclusive.
+    """
+    return blob.download_as_bytes(start=start, end=end, timeout=timeout)
+
+
+def detect_mime_type(blob, sniffed: Optional[str] = None) -> str:
     """
     Detects MIME type and ALWAYS logs exactly how it was determined.
+
+    `sniffed` is sniff_mime() of the object's header, if the caller got one.
     """
     file_ref = f"gs://{blob.bucket.name}/{blob.name}"
+    # Per-file decision log; sampled by LOG_SAMPLE_RATES=mime_decision=...
+    sampled = {"event": "mime_decision"}
 
     # 1. puremagic – magic bytes detection
-    if HAS_PUREMAGIC and blob.size and blob.size > 0:
-        try:
-            header = blob.download_as_bytes(start=0, end=2048)
-            if len(header) >= 4:
-                result = puremagic.from_string(header)
-
-                # Handles both old (str) and new (MagicMatch) return types
-                if isinstance(result, str) and result:
-                    logging.info(f"MIME DETECTED │ puremagic │ {result} │ {file_ref}")
-                    return result
-
-                if hasattr(result, "mime") and result.mime:
-                    logging.info(
-                        f"MIME DETECTED │ puremagic │ {result.mime} │ {file_ref}"
-                    )
-                    return result.mime
-
-                # If puremagic ran but found nothing
-                logging.info(
-                    f"MIME UNKNOWN   │ puremagic │ no signature found │ {file_ref}"
-                )
-
-        except Exception as e:
-            logging.info(f"MIME UNKNOWN   │ puremagic │ error: {e} │ {file_ref}")
-
-    else:
-        logging.info(
-            f"MIME SKIPPED   │ puremagic │ file empty or lib missing │ {file_ref}"
+    if sniffed:
+        logger.info(
+            "MIME DETECTED │ puremagic │ %s │ %s", sniffed, file_ref, extra=sampled
         )
+        return sniffed
+    logger.info(
+        "MIME UNKNOWN   │ puremagic │ no signature found │ %s", file_ref, extra=sampled
+    )
 
     # 2. GCS uploaded content_type
     if blob.content_type and blob.content_type != "application/octet-stream":
-        logging.info(f"MIME DETECTED │ GCS metadata │ {blob.content_type} │ {file_ref}")
+        logger.info(
+            "MIME DETECTED │ GCS metadata │ %s │ %s",
+            blob.content_type,
+            file_ref,
+            extra=sampled,
+        )
         return blob.content_type
 
     # 3. Extension fallback
     _, ext = os.path.splitext(blob.name.lower())
     if ext in EXTENSION_MAP:
-        logging.info(
-            f"MIME DETECTED │ extension │ {ext} → {EXTENSION_MAP[ext]} │ {file_ref}"
+        logger.info(
+            "MIME DETECTED │ extension │ %s → %s │ %s",
+            ext,
+            EXTENSION_MAP[ext],
+            file_ref,
+            extra=sampled,
         )
         return EXTENSION_MAP[ext]
 
     # 4. Final fallback
-    logging.info(f"MIME DEFAULT   │ fallback │ application/octet-stream │ {file_ref}")
+    logger.info(
+        "MIME DEFAULT   │ fallback │ application/octet-stream │ %s",
+        file_ref,
+        extra=sampled,
+    )
     return "application/octet-stream"
 
 
 # ------------------- FastAPI -------------------
 app = FastAPI()
+install_request_logging(app, logger)
 storage_client = storage.Client()
 publisher = pubsub_v1.PublisherClient()
 db = firestore.Client(project=GCP_PROJECT_ID)
 
+# Breaker + adaptive limit + retries around every downstream call
+deps = Dependencies(("gcs", "firestore", "pubsub"))
+app.add_exception_handler(Saturated, saturated_response)
+app.add_exception_handler(CircuitOpen, circuit_open_response)
+
+# CPU-bound inspectors run here, off the event loop and outside the GIL.
+# INSPECT_CPU_WORKERS (default: vCPUs), INSPECT_CPU_MAX_QUEUED,
+# INSPECT_CPU_TIMEOUT_SECONDS.
+cpu_pool = CpuPool.from_env("inspect-cpu")
+
+# Pushes handled at once, shared fairly between tenants
+INSPECT_CONCURRENCY = int(os.getenv("INSPECT_CONCURRENCY", "64"))
+scheduler = FairScheduler.from_env("inspect", INSPECT_CONCURRENCY)
+
+# Files whose rules can be decided from notification metadata alone go
+# straight to the act stage, without content reads or classification
+STAGE_SKIPPING = os.getenv("STAGE_SKIPPING", "true").lower() == "true"
+RULES_COLLECTION = os.getenv("RULES_COLLECTION", "rules")
+RULES_CACHE_TTL_SECONDS = float(os.getenv("RULES_CACHE_TTL_SECONDS", "5"))
+
+# ZIP archives (.zip, .docx, .xlsx, ...) are listed from their central
+# directory. The first tail read covers the end-of-central-directory record
+# unless the archive has a long comment; directories larger than
+# ARCHIVE_MAX_DIRECTORY_BYTES are listed only as far as that.
+ARCHIVE_INSPECTION = os.getenv("ARCHIVE_INSPECTION", "true").lower() == "true"
+ARCHIVE_TAIL_BYTES = int(os.getenv("ARCHIVE_TAIL_BYTES", "4096"))
+ARCHIVE_MAX_DIRECTORY_BYTES = int(
+    os.getenv("ARCHIVE_MAX_DIRECTORY_BYTES", str(1024 * 1024))
+)
+# Entry names kept on the job and passed on to the rules
+ARCHIVE_MAX_NAMES = int(os.getenv("ARCHIVE_MAX_NAMES", "1000"))
+
+
+def load_rules(tenant_id: str) -> List[Dict[str, Any]]:
+    """
+    Load a tenant's enabled rules from Firestore (same as the act worker).
+    """
+    rules = load_tenant_rules(
+        db.collection(RULES_COLLECTION), tenant_id, enabled_only=True
+    )
+    return rules
+
+
+rulesets = RuleSetCache(
+    lambda tenant_id: deps.call("firestore", load_rules, tenant_id, idempotent=True),
+    RULES_CACHE_TTL_SECONDS,
+)
+
+
+def publish_event(
+    topic_name: str, event: Dict[str, Any], timeout: Optional[float] = None
+) -> None:
+    """
+    Publish and wait for Pub/Sub to accept the message, so the incoming push
+    is only acknowledged once the next stage's message is durable.
+    """
+    data, attributes = messages.encode(event)
+    publisher.publish(
+        publisher.topic_path(GCP_PROJECT_ID, topic_name), data=data, **attributes
+    ).result(timeout=timeout)
+
 
 # @app.post("/pubsub-push")
 # async def pubsub_push(request: Request):
@@ -400,43 +483,128 @@ db = firestore.Client(project=GCP_PROJECT_ID)
 
 @app.post("/pubsub-push")
 async def pubsub_push(request: Request):
-    envelope = await request.json()
-    message = envelope.get("message", {})
-    data_b64 = message.get("data")
-    if not data_b64:
+    payload = messages.decode_push(await request.body())
+    if payload is None:
         return Response(status_code=204)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Inspect worker: received %s", messages.describe(payload))
 
-    payload_json = base64.b64decode(data_b64).decode("utf-8")
-    payload = json.loads(payload_json)
-    logger.info(f"Received Pub/Sub payload: {payload}")
+    if payload.get("gcs_event") and payload.get("origin") == "api":
+        # The API already published this file's ingest event
+        return Response(status_code=204)
 
-    # Normalize fields
     bucket_name = payload.get("bucket")
-    blob_name = payload.get("blob") or payload.get("name")
+    blob_name = payload.get("blob")
     job_id_raw = payload.get("job_id") or f"{bucket_name}/{blob_name}"
 
     # FIX: prevent Firestore nested paths
     job_id = job_id_raw.replace("/", "__")
 
-    logger.info(f"Inspecting gs://{bucket_name}/{blob_name} (job_id={job_id})")
+    busy = deps.saturated() or (cpu_pool.name if cpu_pool.saturated else None)
+    if busy:
+        logger.warning("Inspect worker: %s saturated, rejecting %s", busy, job_id)
+        return Response(status_code=429)
+
+    # Tenants share this instance by weighted fair queueing
+    with job_context(job_id), tracing.span(
+        "inspect", parent=payload.get("traceparent"), job_id=job_id
+    ):
+        async with scheduler.slot(tenant_of(payload)):
+            return await inspect_file(payload, job_id, bucket_name, blob_name)
+
+
+async def inspect_file(
+    payload: Dict[str, Any], job_id: str, bucket_name: str, blob_name: str
+) -> Response:
+    if (
+        STAGE_SKIPPING
+        and not payload.get("full_inspection")
+        and payload.get("file_size") is not None
+    ):
+        ruleset = await run_in_threadpool(rulesets.get, tenant_of(payload))
+        if ruleset.route(payload) == STAGE_ACT:
+            return await skip_to_act(payload, job_id, bucket_name, blob_name, ruleset)
+
+    logger.info(
+        "Inspecting gs://%s/%s (job_id=%s)",
+        bucket_name,
+        blob_name,
+        job_id,
+        extra={"event": "message"},
+    )
 
     blob = storage_client.bucket(bucket_name).blob(blob_name)
 
+    # Uploaded through the API, which already sent size, MIME and checksums
+    fingerprinted = payload.get("origin") == "api" and bool(payload.get("mime_type"))
+
     # CRITICAL FIX: Only reload() if this is NOT a raw GCS event
-    # Raw GCS events have "size" and "contentType" in payload
-    if "size" in payload or "contentType" in payload:
+    if payload.get("gcs_event") or fingerprinted:
         # We already have fresh metadata from the event — trust it
         pass
     else:
         # Internal orchestrator event — safe to reload
         try:
-            blob.reload()
+            await run_in_threadpool(
+                deps.call, "gcs", blob.reload, idempotent=True, hedge=True
+            )
+        except (Saturated, CircuitOpen):
+            raise
         except Exception as e:
-            logger.error(f"Failed to reload blob metadata: {e}")
+            logger.error("Failed to reload blob metadata: %s", e)
             return Response(status_code=500)
 
-    mime_type = detect_mime_type(blob)
-    file_size = blob.size or 0
+    # The header read is an idempotent ranged GET, so it may be hedged when
+    # GCS is slow; the signature scan then runs in the process pool.
+    file_size = blob.size or payload.get("file_size") or 0
+    header = None
+    if HAS_PUREMAGIC and file_size and not fingerprinted:
+        try:
+            header = await run_in_threadpool(
+                deps.call, "gcs", read_header, blob, idempotent=True, hedge=True
+            )
+        except (Saturated, CircuitOpen):
+            raise
+        except Exception as e:
+            logger.info(
+                "Header read failed for gs://%s/%s: %s", bucket_name, blob_name, e
+            )
+            header = b""
+
+    sniffed = None
+    if header:
+        try:
+            sniffed = await cpu_pool.run(sniff_mime, header)
+        except Saturated:
+            raise
+        except Exception as e:
+            # Timeouts included: fall back to metadata / extension
+            logger.warning(
+                "Signature scan failed for gs://%s/%s: %r", bucket_name, blob_name, e
+            )
+    if fingerprinted:
+        mime_type = payload["mime_type"]
+    else:
+        mime_type = detect_mime_type(blob, sniffed)
+    # What a ZIP archive contains, from its central directory alone
+    archive = None
+    _, ext = os.path.splitext(blob_name)
+    if ARCHIVE_INSPECTION and file_size and is_zip(mime_type, ext, header or b""):
+        try:
+            archive = await inspect_archive(blob, file_size)
+        except (Saturated, CircuitOpen):
+            raise
+        except Exception as e:
+            logger.warning(
+                "Archive listing failed for gs://%s/%s: %r", bucket_name, blob_name, e
+            )
+
+    # Set by /upload on the object; internal events may not carry it
+    tenant_id = (
+        payload.get("tenant_id")
+        or (blob.metadata or {}).get("tenant_id")
+        or DEFAULT_TENANT
+    )
 
     # # Update Firestore
     # doc_ref = db.collection(JOBS_COLLECTION).document(job_id)
@@ -456,7 +624,10 @@ async def pubsub_push(request: Request):
     doc_ref = db.collection(JOBS_COLLECTION).document(job_id)
     now = dt.datetime.utcnow().isoformat() + "Z"
 
-    doc_ref.set(
+    await run_in_threadpool(
+        deps.call,
+        "firestore",
+        doc_ref.set,
         {
             "source": {
                 "bucket": bucket_name,
@@ -466,24 +637,167 @@ async def pubsub_push(request: Request):
                 "mime_type": mime_type,
                 "file_size": file_size,
                 "inspected_at": now,
+                **{k: payload[k] for k in ("sha256", "crc32c") if payload.get(k)},
+                **({"archive": archive} if archive else {}),
             },
+            "tenant_id": tenant_id,
+            # Inspected in full: no stage-skipping decision applies any more
+            "routing": firestore.DELETE_FIELD,
             "status": "INSPECTED",
             "updated_at": now,
         },
         merge=True,  # keep everything else unchanged
+        idempotent=True,
     )
 
-    # Forward
+    # Forward (large files go through their own topics so they cannot
+    # take up the concurrency small files need downstream)
+    lane = lane_for_size(file_size)
     event = {
         "job_id": job_id,
         "bucket": bucket_name,
         "blob": blob_name,
         "mime_type": mime_type,
         "file_size": file_size,
+        "lane": lane,
+        "tenant_id": tenant_id,
     }
-    publisher.publish(
-        publisher.topic_path(GCP_PROJECT_ID, CLASSIFY_TOPIC),
-        data=json.dumps(event).encode(),
+    if archive:
+        event["archive_entries"] = archive["entries"]
+        event["archive_names"] = archive["names"]
+        if archive["names_truncated"]:
+            event["archive_names_truncated"] = True
+    await run_in_threadpool(
+        deps.call,
+        "pubsub",
+        publish_event,
+        lane_topic("classify", lane),
+        event,
     )
 
     return Response(status_code=204)
+
+
+async def inspect_archive(blob, file_size: int) -> Optional[Dict[str, Any]]:
+    """
+    List a ZIP archive without downloading it: one ranged read of its tail
+    to find the end-of-central-directory record, then one of the central
+    directory (none for small archives, whose directory is in the tail).
+    None if the file is not a readable ZIP.
+    """
+
+    async def read(start: int, end: int) -> bytes:
+        return await run_in_threadpool(
+            deps.call, "gcs", read_range, blob, start, end, idempotent=True, hedge=True
+        )
+
+    tail = await read(max(0, file_size - ARCHIVE_TAIL_BYTES), file_size - 1)
+    location = zip_directory_range(tail, file_size)
+    if location is None and file_size > len(tail):
+        # The record may be followed by a comment of up to 64 KB
+        tail = await read(max(0, file_size - EOCD_MAX_TAIL), file_size - 1)
+        location = zip_directory_range(tail, file_size)
+    if location is None:
+        return None
+
+    offset, length, entry_count = location
+    length = min(length, ARCHIVE_MAX_DIRECTORY_BYTES)
+    tail_start = file_size - len(tail)
+    if not length:
+        directory = b""
+    elif offset >= tail_start:
+        directory = tail[offset - tail_start : offset - tail_start + length]
+    else:
+        directory = await read(offset, offset + length - 1)
+    return await cpu_pool.run(
+        list_zip_entries, directory, entry_count, ARCHIVE_MAX_NAMES
+    )
+
+
+async def skip_to_act(
+    payload: Dict[str, Any],
+    job_id: str,
+    bucket_name: str,
+    blob_name: str,
+    ruleset: RuleSet,
+) -> Response:
+    """
+    The tenant's rules decide this file from name, extension and size alone:
+    record the job and hand it straight to the act stage, without reading
+    the object or going through the classify stage.
+
+    The event carries the ruleset version; if the rules change before the
+    act worker gets to it, the act worker re-checks the route and sends the
+    file back for full inspection when it no longer holds.
+    """
+    logger.info(
+        "Routing gs://%s/%s (job_id=%s) straight to act",
+        bucket_name,
+        blob_name,
+        job_id,
+        extra={"event": "message"},
+    )
+    _, ext = os.path.splitext(blob_name)
+    mime_type = payload.get("mime_type") or "application/octet-stream"
+    file_size = payload.get("file_size") or 0
+    tenant_id = tenant_of(payload)
+    # From the declared content type; recorded, but no decision depends on it
+    classification = simple_classification(mime_type, ext)
+    now = dt.datetime.utcnow().isoformat() + "Z"
+
+    doc_ref = db.collection(JOBS_COLLECTION).document(job_id)
+    await run_in_threadpool(
+        deps.call,
+        "firestore",
+        doc_ref.set,
+        {
+            "source": {
+                "bucket": bucket_name,
+                "blob": blob_name,
+            },
+            "inspection": {
+                "mime_type": mime_type,
+                "file_size": file_size,
+                "inspected_at": now,
+                **{k: payload[k] for k in ("sha256", "crc32c") if payload.get(k)},
+            },
+            "classification": {
+                "classification": classification,
+                "mime_type": mime_type,
+                "file_size": file_size,
+                "ext": ext,
+                "classified_at": now,
+            },
+            "routing": {
+                "skipped": ["content_read", "classify"],
+                "ruleset_version": ruleset.version,
+            },
+            "tenant_id": tenant_id,
+            "status": "CLASSIFIED",
+            "updated_at": now,
+        },
+        merge=True,
+        idempotent=True,
+    )
+
+    lane = lane_for_size(file_size)
+    event = {
+        "job_id": job_id,
+        "bucket": bucket_name,
+        "blob": blob_name,
+        "mime_type": mime_type,
+        "file_size": file_size,
+        "ext": ext,
+        "classification": classification,
+        "lane": lane,
+        "tenant_id": tenant_id,
+        "ruleset_version": ruleset.version,
+    }
+    await run_in_threadpool(
+        deps.call,
+        "pubsub",
+        publish_event,
+        lane_topic("act", lane),
+        event,
+    )
+    return Response(status_code=204)
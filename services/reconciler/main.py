@@ -0,0 +1,272 @@
+# services/reconciler/main.py
+
+import datetime as dt
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import FastAPI
+
+from google.cloud import storage, pubsub_v1, firestore
+
+from common import messages, tracing
+from common.config import GCP_PROJECT_ID, INGEST_TOPIC, JOBS_COLLECTION
+from common.lanes import lane_for_size, lane_topic
+from common.log import install_request_logging, setup_logging
+
+setup_logging("reconciler")
+tracing.configure("reconciler")
+logger = logging.getLogger(__name__)
+
+# Jobs whose updated_at is older than this are considered stranded
+STRANDED_AFTER_SECONDS = int(os.getenv("STRANDED_AFTER_SECONDS", "900"))
+# Page size for the stranded-job queries (and the Firestore write batches)
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", "200"))
+# Upper bound on jobs handled by a single /reconcile call
+RECONCILE_MAX_JOBS = int(os.getenv("RECONCILE_MAX_JOBS", "5000"))
+# After this many re-publishes a job is marked ERROR instead
+RECONCILE_MAX_ATTEMPTS = int(os.getenv("RECONCILE_MAX_ATTEMPTS", "3"))
+# Concurrent source-object lookups per page of jobs
+RECONCILE_LOOKUP_WORKERS = int(os.getenv("RECONCILE_LOOKUP_WORKERS", "16"))
+
+# status → stage that should pick the job up next. The API records NEW jobs
+# before uploading, so an upload whose ingest event was never published is
+# still found here.
+NEXT_STAGE = {
+    "NEW": "inspect",
+    "INSPECTED": "classify",
+    "CLASSIFIED": "act",
+}
+
+app = FastAPI()
+install_request_logging(app, logger)
+storage_client = storage.Client()
+publisher = pubsub_v1.PublisherClient(
+    batch_settings=pubsub_v1.types.BatchSettings(max_messages=100, max_latency=0.05)
+)
+db = firestore.Client(project=GCP_PROJECT_ID)
+
+
+def topic_path(topic_name: str) -> str:
+    return publisher.topic_path(GCP_PROJECT_ID, topic_name)
+
+
+def stage_event(job_id: str, status: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuild the message the next stage expects from the job document.
+    """
+    source = data.get("source") or {}
+    inspection = data.get("inspection") or {}
+    classification = data.get("classification") or {}
+    blob_name = source.get("blob")
+
+    if status == "NEW":
+        # The API's fingerprint of the upload, as its ingest event carried it
+        upload = data.get("upload") or {}
+        return {
+            "job_id": job_id,
+            "tenant_id": data.get("tenant_id"),
+            "bucket": source.get("bucket"),
+            "blob": blob_name,
+            "origin": "api",
+            **{
+                k: upload[k]
+                for k in ("mime_type", "file_size", "sha256", "crc32c")
+                if upload.get(k) is not None
+            },
+        }
+
+    event: Dict[str, Any] = {
+        "job_id": job_id,
+        "tenant_id": data.get("tenant_id"),
+        "bucket": source.get("bucket"),
+        "blob": blob_name,
+        "mime_type": classification.get("mime_type") or inspection.get("mime_type"),
+        "file_size": classification.get("file_size")
+        or inspection.get("file_size")
+        or 0,
+    }
+    event["lane"] = lane_for_size(event["file_size"])
+    archive = inspection.get("archive")
+    if archive:
+        event["archive_entries"] = archive.get("entries")
+        event["archive_names"] = archive.get("names")
+        if archive.get("names_truncated"):
+            event["archive_names_truncated"] = True
+    if status == "CLASSIFIED":
+        # Jobs that skipped inspect/classify keep the ruleset they were
+        # routed by, so the act worker re-checks that decision
+        routing = data.get("routing") or {}
+        if routing.get("ruleset_version"):
+            event["ruleset_version"] = routing["ruleset_version"]
+        event.update(
+            {
+                "ext": classification.get("ext")
+                or os.path.splitext(blob_name or "")[1],
+                "classification": classification.get("classification")
+                or "uncategorized",
+            }
+        )
+    return event
+
+
+def decide(status: str, data: Dict[str, Any], source_exists: bool) -> Dict[str, Any]:
+    """
+    Decide what to do with one stranded job.
+
+    Returns {"op": "republish" | "complete" | "fail", ...}.
+    """
+    attempts = int(data.get("reconcile_attempts") or 0)
+
+    if not source_exists:
+        if status == "NEW":
+            return {"op": "fail", "reason": "upload did not complete"}
+        if (data.get("action") or {}).get("acted_at"):
+            # The act stage finished but the status write was lost.
+            return {"op": "complete"}
+        return {"op": "fail", "reason": "source object no longer exists"}
+
+    if attempts >= RECONCILE_MAX_ATTEMPTS:
+        return {"op": "fail", "reason": f"still {status} after {attempts} re-publishes"}
+
+    stage = NEXT_STAGE[status]
+    if stage == "inspect":
+        return {"op": "republish", "topic": INGEST_TOPIC}
+    file_size = (data.get("inspection") or {}).get("file_size")
+    return {"op": "republish", "topic": lane_topic(stage, lane_for_size(file_size))}
+
+
+class SourceIndex:
+    """
+    Whether the source objects of stranded jobs still exist, one metadata
+    lookup per object. A page's lookups run concurrently, so the cost
+    follows the number of stranded jobs, not the size of the bucket.
+    """
+
+    def __init__(self, client, workers: int = RECONCILE_LOOKUP_WORKERS):
+        self._client = client
+        self._workers = workers
+        self._found: Dict[Tuple[str, str], bool] = {}
+
+    def _lookup(self, key: Tuple[str, str]) -> bool:
+        bucket, blob = key
+        return self._client.bucket(bucket).get_blob(blob) is not None
+
+    def prefetch(self, objects: Iterable[Tuple[Optional[str], Optional[str]]]) -> None:
+        keys = list(
+            {(b, o) for b, o in objects if b and o and (b, o) not in self._found}
+        )
+        if not keys:
+            return
+        with ThreadPoolExecutor(min(self._workers, len(keys))) as pool:
+            for key, found in zip(keys, pool.map(self._lookup, keys)):
+                self._found[key] = found
+
+    def exists(self, bucket: Optional[str], blob: Optional[str]) -> bool:
+        if not bucket or not blob:
+            return False
+        if (bucket, blob) not in self._found:
+            self._found[(bucket, blob)] = self._lookup((bucket, blob))
+        return self._found[(bucket, blob)]
+
+
+def stranded_pages(status: str, cutoff: str):
+    """
+    Yield pages of job snapshots stuck in `status` since before `cutoff`.
+
+    Needs the composite index (status ASC, updated_at ASC); see
+    firestore.indexes.json.
+    """
+    query = (
+        db.collection(JOBS_COLLECTION)
+        .where("status", "==", status)
+        .where("updated_at", "<", cutoff)
+        .order_by("updated_at")
+        .limit(RECONCILE_PAGE_SIZE)
+    )
+    last = None
+    while True:
+        page_query = query.start_after(last) if last is not None else query
+        page = list(page_query.stream())
+        if not page:
+            return
+        yield page
+        if len(page) < RECONCILE_PAGE_SIZE:
+            return
+        last = page[-1]
+
+
+def reconcile_page(
+    status: str, page: List[Any], sources: SourceIndex, summary: Dict[str, int]
+):
+    now = dt.datetime.utcnow().isoformat() + "Z"
+    batch = db.batch()
+    futures = []
+    snapshots = [(snap, snap.to_dict() or {}) for snap in page]
+    sources.prefetch(
+        ((d.get("source") or {}).get("bucket"), (d.get("source") or {}).get("blob"))
+        for _, d in snapshots
+    )
+
+    for snap, data in snapshots:
+        source = data.get("source") or {}
+        decision = decide(
+            status, data, sources.exists(source.get("bucket"), source.get("blob"))
+        )
+        op = decision["op"]
+        summary[op] = summary.get(op, 0) + 1
+
+        if op == "republish":
+            event = stage_event(snap.id, status, data)
+            body, attributes = messages.encode(event)
+            futures.append(
+                publisher.publish(
+                    topic_path(decision["topic"]), data=body, **attributes
+                )
+            )
+            update = {
+                "reconcile_attempts": firestore.Increment(1),
+                "reconciled_at": now,
+                "updated_at": now,
+            }
+        elif op == "complete":
+            update = {"status": "COMPLETED", "reconciled_at": now, "updated_at": now}
+        else:
+            update = {
+                "status": "ERROR",
+                "error_message": f"Reconciler: {decision['reason']}",
+                "reconciled_at": now,
+                "updated_at": now,
+            }
+        batch.set(snap.reference, update, merge=True)
+
+    # Only record the re-publish once Pub/Sub has accepted every message.
+    for future in futures:
+        future.result()
+    batch.commit()
+
+
+@app.post("/reconcile")
+def reconcile(stranded_after_seconds: int = STRANDED_AFTER_SECONDS):
+    """
+    Re-publish jobs stuck in NEW/INSPECTED/CLASSIFIED to the stage that
+    should handle them next. Meant to be called periodically by Cloud Scheduler.
+    """
+    cutoff = (
+        dt.datetime.utcnow() - dt.timedelta(seconds=stranded_after_seconds)
+    ).isoformat() + "Z"
+    sources = SourceIndex(storage_client)
+    summary: Dict[str, int] = {}
+    handled = 0
+
+    for status in NEXT_STAGE:
+        for page in stranded_pages(status, cutoff):
+            page = page[: max(0, RECONCILE_MAX_JOBS - handled)]
+            if not page:
+                break
+            reconcile_page(status, page, sources, summary)
+            handled += len(page)
+
+    logger.info("Reconciler: handled %s stranded jobs: %s", handled, summary)
+    return {"cutoff": cutoff, "handled": handled, **summary}
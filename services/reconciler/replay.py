@@ -0,0 +1,350 @@
+# services/reconciler/replay.py
+#
+# Drain a dead-letter subscription back into the pipeline.
+#
+#   python replay.py --subscription drbfo-dead-letter-sub --stage act \
+#       --error "timed out" --rate 20 --concurrency 8 --checkpoint replay.json
+#
+# Run it from services/reconciler (same image as the reconciler), or as
+# `python -m services.reconciler.replay` from the repo root.
+
+import argparse
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from google.cloud import firestore, pubsub_v1
+
+from common import messages
+from common.config import GCP_PROJECT_ID, INGEST_TOPIC, JOBS_COLLECTION
+from common.lanes import lane_of, lane_topic
+from common.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("inspect", "classify", "act")
+
+# Pub/Sub adds these to every dead-lettered message; they describe the
+# failed delivery, not the event, so they are not replayed
+DEAD_LETTER_PREFIX = "CloudPubSubDeadLetter"
+SOURCE_SUBSCRIPTION = "CloudPubSubDeadLetterSourceSubscription"
+
+# Skipped messages are leased for this long, so one run does not see them
+# again; they stay in the dead-letter subscription for a later run
+SKIP_LEASE_SECONDS = 600
+
+
+def stage_of(attributes: Dict[str, str]) -> Optional[str]:
+    """
+    The stage whose subscription dead-lettered a message, from the source
+    subscription's name (e.g. "drbfo-classify-large-push" → "classify").
+    The inspect stage consumes the ingest topic.
+    """
+    source = (attributes.get(SOURCE_SUBSCRIPTION) or "").lower()
+    for stage in ("classify", "act", "inspect"):
+        if stage in source:
+            return stage
+    if "ingest" in source:
+        return "inspect"
+    return None
+
+
+def target_topic(stage: Optional[str], event: Dict[str, Any]) -> Optional[str]:
+    if stage == "inspect":
+        return INGEST_TOPIC
+    if stage in ("classify", "act"):
+        return lane_topic(stage, lane_of(event))
+    return None
+
+
+class ReplayCheckpoint:
+    """
+    Ids of the dead-lettered messages already republished, stored as a
+    small JSON file.
+
+    Ids are saved before the messages are acked, so a run interrupted in
+    between acks them on resume instead of publishing them twice.
+    """
+
+    def __init__(self, path: Optional[str], run: Dict[str, Any]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._run = run
+        self._published: Set[str] = set()
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("run") != run:
+                raise SystemExit(
+                    f"Checkpoint {path} belongs to a different run: {saved.get('run')}"
+                )
+            self._published = set(saved.get("published") or [])
+
+    def __contains__(self, message_id: str) -> bool:
+        with self._lock:
+            return message_id in self._published
+
+    def add(self, message_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._published.update(message_ids)
+            if not self.path:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"run": self._run, "published": sorted(self._published)}, f)
+            os.replace(tmp, self.path)
+
+
+class Replay:
+    """
+    Pulls a dead-letter subscription in batches and republishes each
+    message, unchanged, to the topic of the stage that gave up on it.
+
+    Messages can be limited to some stages and to jobs whose error_message
+    contains a given text. Publishes are spread over `concurrency` threads
+    and limited to `rate` per second; a message is acked only once its
+    publish has succeeded and been checkpointed.
+    """
+
+    def __init__(
+        self,
+        subscriber,
+        publisher,
+        subscription: str,
+        *,
+        db=None,
+        project: str = GCP_PROJECT_ID,
+        stages: Optional[Iterable[str]] = None,
+        error: Optional[str] = None,
+        topic: Optional[str] = None,
+        rate: float = 20.0,
+        concurrency: int = 8,
+        batch_size: int = 100,
+        max_messages: int = 0,
+        checkpoint_path: Optional[str] = None,
+        dry_run: bool = False,
+    ):
+        self.subscriber = subscriber
+        self.publisher = publisher
+        self.subscription_path = subscriber.subscription_path(project, subscription)
+        self.db = db
+        self.project = project
+        self.stages = set(stages or ())
+        self.error = error.lower() if error else None
+        self.topic = topic
+        self.limiter = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_messages = max_messages
+        self.dry_run = dry_run
+        self.checkpoint = ReplayCheckpoint(
+            None if dry_run else checkpoint_path, {"subscription": subscription}
+        )
+        self.stats: Counter = Counter()
+
+    # ------------------------------ selection -------------------------------
+
+    def _job_errors(self, job_ids: List[str]) -> Dict[str, str]:
+        refs = [self.db.collection(JOBS_COLLECTION).document(j) for j in job_ids]
+        return {
+            snap.id: (snap.to_dict() or {}).get("error_message") or ""
+            for snap in self.db.get_all(refs)
+            if snap.exists
+        }
+
+    def select(self, received: List[Any]) -> Tuple[List[Any], List[Any], List[Any]]:
+        """
+        Split a pulled batch into (already replayed, to replay as
+        (received, topic) pairs, skipped).
+        """
+        done, candidates, skipped = [], [], []
+        for item in received:
+            message = item.message
+            if message.message_id in self.checkpoint:
+                done.append(item)
+                continue
+            attributes = dict(message.attributes)
+            stage = stage_of(attributes)
+            if self.stages and stage not in self.stages:
+                self.stats["skipped_stage"] += 1
+                skipped.append(item)
+                continue
+            try:
+                event = messages.decode(message.data, attributes)
+            except ValueError:
+                self.stats["skipped_undecodable"] += 1
+                skipped.append(item)
+                continue
+            topic = self.topic or target_topic(stage, event)
+            if not topic:
+                self.stats["skipped_unknown_stage"] += 1
+                skipped.append(item)
+                continue
+            candidates.append((item, topic, event.get("job_id")))
+
+        if self.error is not None and candidates:
+            job_ids = sorted({job_id for _, _, job_id in candidates if job_id})
+            errors = self._job_errors(job_ids) if job_ids else {}
+            kept = []
+            for item, topic, job_id in candidates:
+                if self.error in errors.get(job_id, "").lower():
+                    kept.append((item, topic, job_id))
+                else:
+                    self.stats["skipped_error"] += 1
+                    skipped.append(item)
+            candidates = kept
+
+        return done, [(item, topic) for item, topic, _ in candidates], skipped
+
+    # ------------------------------ execution -------------------------------
+
+    def _publish(self, item: Any, topic: str) -> bool:
+        message = item.message
+        attributes = {
+            k: v
+            for k, v in message.attributes.items()
+            if not k.startswith(DEAD_LETTER_PREFIX)
+        }
+        self.limiter.acquire()
+        try:
+            self.publisher.publish(
+                self.publisher.topic_path(self.project, topic),
+                data=message.data,
+                **attributes,
+            ).result()
+            return True
+        except Exception as e:
+            logger.error("Replay: publish of %s failed: %s", message.message_id, e)
+            return False
+
+    def _ack(self, items: List[Any]) -> None:
+        if items:
+            self.subscriber.acknowledge(
+                request={
+                    "subscription": self.subscription_path,
+                    "ack_ids": [i.ack_id for i in items],
+                }
+            )
+
+    def _lease(self, items: List[Any], seconds: int) -> None:
+        if items:
+            self.subscriber.modify_ack_deadline(
+                request={
+                    "subscription": self.subscription_path,
+                    "ack_ids": [i.ack_id for i in items],
+                    "ack_deadline_seconds": seconds,
+                }
+            )
+
+    def process_batch(self, pool: ThreadPoolExecutor, received: List[Any]) -> None:
+        done, to_replay, skipped = self.select(received)
+        self.stats["pulled"] += len(received)
+
+        if self.dry_run:
+            for item, topic in to_replay:
+                logger.info("Replay (dry run): %s → %s", item.message.message_id, topic)
+                self.stats["replayed"] += 1
+            self._lease(done + skipped + [i for i, _ in to_replay], SKIP_LEASE_SECONDS)
+            return
+
+        # Replayed by an interrupted run, which stopped before acking
+        self._ack(done)
+        self.stats["already_replayed"] += len(done)
+
+        results = list(pool.map(lambda pair: self._publish(*pair), to_replay))
+        published = [item for (item, _), ok in zip(to_replay, results) if ok]
+        failed = [item for (item, _), ok in zip(to_replay, results) if not ok]
+
+        self.checkpoint.add(item.message.message_id for item in published)
+        self._ack(published)
+        self.stats["replayed"] += len(published)
+        self.stats["failed"] += len(failed)
+        # Failures stay dead-lettered; do not retry them in this run
+        self._lease(skipped + failed, SKIP_LEASE_SECONDS)
+
+    def run(self) -> Counter:
+        empty_pulls = 0
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            while empty_pulls < 3:
+                want = self.batch_size
+                if self.max_messages:
+                    remaining = self.max_messages - self.stats["pulled"]
+                    if remaining <= 0:
+                        break
+                    want = min(want, remaining)
+                response = self.subscriber.pull(
+                    request={
+                        "subscription": self.subscription_path,
+                        "max_messages": want,
+                    },
+                    timeout=30,
+                )
+                if not response.received_messages:
+                    # A pull may come back empty while messages remain
+                    empty_pulls += 1
+                    continue
+                empty_pulls = 0
+                self.process_batch(pool, list(response.received_messages))
+                logger.info("Replay: %s", dict(self.stats))
+        return self.stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Republish dead-lettered messages to their stage topics."
+    )
+    parser.add_argument(
+        "--subscription", required=True, help="dead-letter subscription"
+    )
+    parser.add_argument(
+        "--stage",
+        action="append",
+        choices=STAGES,
+        help="only replay messages dead-lettered by this stage (repeatable)",
+    )
+    parser.add_argument(
+        "--error", help="only replay jobs whose error_message contains this text"
+    )
+    parser.add_argument(
+        "--topic", help="publish everything to this topic instead of the stage's"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=20.0, help="messages/sec (0 = unlimited)"
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel publishes")
+    parser.add_argument("--batch-size", type=int, default=100, help="messages per pull")
+    parser.add_argument(
+        "--max-messages", type=int, default=0, help="stop after pulling this many"
+    )
+    parser.add_argument("--checkpoint", help="JSON file used to resume the run")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
+
+    replay = Replay(
+        pubsub_v1.SubscriberClient(),
+        pubsub_v1.PublisherClient(),
+        args.subscription,
+        db=firestore.Client(project=GCP_PROJECT_ID) if args.error else None,
+        stages=args.stage,
+        error=args.error,
+        topic=args.topic,
+        rate=args.rate,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        max_messages=args.max_messages,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run,
+    )
+    stats = replay.run()
+    logger.info("Replay finished: %s", dict(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from fastapi.testclient import TestClient
 from services.inspect_worker.main import app as inspect_app
 from services.classify_worker.main import app as classify_app
 from services.act_worker.main import app as act_app
+from services.api.main import app as api_app
 
 
 @pytest.fixture
@@ -26,6 +27,12 @@ def act_client():
     return TestClient(act_app)
 
 
+@pytest.fixture
+def api_client():
+    """FastAPI test client for the API service."""
+    return TestClient(api_app)
+
+
 @pytest.fixture
 def sample_job_payload():
     """
@@ -1,5 +1,12 @@
 # tests/test_act_worker.py
 
+import base64
+import json
+import threading
+
+import services.act_worker.main as act_main
+from common.rule_stats import RuleStats
+
 
 def test_act_worker_accepts_pubsub_payload(act_client, sample_job_payload):
     """
@@ -10,3 +17,59 @@ def test_act_worker_accepts_pubsub_payload(act_client, sample_job_payload):
         json={"message": {"attributes": sample_job_payload}},
     )
     assert resp.status_code in (200, 204)
+
+
+def test_act_worker_rejects_when_lane_is_saturated(act_client, monkeypatch):
+    """
+    A saturated lane should answer 429 so Pub/Sub backs off that subscription.
+    """
+    monkeypatch.setitem(act_main.lane_inflight, "large", 10_000)
+    payload = {
+        "job_id": "job-1",
+        "bucket": "drbfo-uploads",
+        "blob": "uploads/huge.bin",
+        "file_size": 5 * 1024**3,
+        "lane": "large",
+    }
+    data = base64.b64encode(json.dumps(payload).encode()).decode()
+    resp = act_client.post("/pubsub-push", json={"message": {"data": data}})
+    assert resp.status_code == 429
+
+
+def test_replicate_copies_concurrently_and_reports_each_destination(monkeypatch):
+    # Both copies must be in flight at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_store_copy(file_meta, applied, rule, bucket, blob):
+        barrier.wait()
+        if bucket == "analytics":
+            raise RuntimeError("permission denied")
+        return None
+
+    monkeypatch.setattr(act_main, "store_copy", fake_store_copy)
+    targets = [("archive", "pdfs", "pdfs/a.pdf"), ("analytics", "raw", "raw/a.pdf")]
+    results, error = act_main.replicate({}, {}, None, targets)
+
+    assert [r["status"] for r in results] == ["ok", "failed"]
+    assert results[1]["error"] == "permission denied"
+    assert isinstance(error, RuntimeError)
+
+
+def test_buffered_state_is_written_on_shutdown(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    flushed = []
+    monkeypatch.setattr(
+        act_main,
+        "bundler",
+        type("FakeBundler", (), {"flush_all": lambda self: flushed.append(1) or 1})(),
+    )
+    counted = []
+    stats = RuleStats(counted.append)
+    stats.record([("r1", True, 10)])
+    monkeypatch.setattr(act_main, "rule_stats", stats)
+
+    with TestClient(act_main.app):
+        assert flushed == [] and counted == []
+    assert flushed == [1]
+    assert counted == [{"r1": {"evaluations": 1, "hits": 1, "eval_ns": 10}}]
@@ -0,0 +1,205 @@
+# tests/test_actions.py
+
+import contextlib
+import gzip
+import io
+from types import SimpleNamespace
+
+from google.api_core.exceptions import NotFound
+
+from common.actions import (
+    compress_object,
+    copy_object,
+    delete_objects,
+    resolve_destinations,
+)
+from common.rules import apply_actions
+
+
+class _FakeBlob:
+    def __init__(self, name):
+        self.name = name
+        self.rewrites = []
+
+    def rewrite(self, source, token=None):
+        self.rewrites.append(
+            {
+                "source": source.name,
+                "token": token,
+                "content_type": getattr(self, "content_type", None),
+                "metadata": getattr(self, "metadata", None),
+                "storage_class": getattr(self, "storage_class", None),
+                "event_based_hold": getattr(self, "event_based_hold", None),
+            }
+        )
+        # First call is "in progress", second one completes
+        return (None if token else "tok"), 0, 0
+
+
+class _StreamBlob:
+    """Blob whose open() reads from / writes to an in-memory store."""
+
+    def __init__(self, store, name):
+        self.store, self.name = store, name
+        self.content_encoding = None
+
+    def open(self, mode, chunk_size=None):
+        if mode == "rb":
+            return io.BytesIO(self.store[self.name])
+        store, name = self.store, self.name
+
+        class _Writer(io.BytesIO):
+            def close(self):
+                store[name] = self.getvalue()
+                super().close()
+
+        return _Writer()
+
+
+class _FakeBucket:
+    def __init__(self, name, client):
+        self.name = name
+        self.client = client
+
+    def blob(self, name):
+        blob = self.client.blobs.setdefault((self.name, name), _FakeBlob(name))
+        return blob
+
+    def copy_blob(self, blob, dest_bucket, new_name):
+        self.client.copies.append((blob.name, dest_bucket.name, new_name))
+        return dest_bucket.blob(new_name)
+
+
+class _FakeStorage:
+    def __init__(self):
+        self.blobs = {}
+        self.copies = []
+
+    def bucket(self, name):
+        return _FakeBucket(name, self)
+
+
+def test_apply_actions_reads_storage_class_and_hold():
+    rule = {
+        "actions": [
+            {"type": "storage_class", "value": "coldline"},
+            {"type": "hold", "value": "Event"},
+            {"type": "tag", "value": "finance"},
+            {"type": "compress", "value": "GZIP"},
+        ]
+    }
+    applied = apply_actions(rule, {})
+    assert applied["storage_class"] == "COLDLINE"
+    assert applied["hold"] == "event"
+    assert applied["tags"] == ["finance"]
+    assert applied["compress"] == "gzip"
+
+    bogus = {"actions": [{"type": "storage_class", "value": "glacier"}]}
+    assert apply_actions(bogus, {})["storage_class"] is None
+
+
+def test_copy_object_applies_properties_in_the_rewrite():
+    client = _FakeStorage()
+    dest = copy_object(
+        client,
+        "src",
+        "in/a.csv",
+        "dst",
+        "tables/a.csv",
+        content_type="text/csv",
+        metadata={"tags": "finance"},
+        storage_class="COLDLINE",
+        hold="event",
+    )
+    assert client.copies == []
+    assert [r["token"] for r in dest.rewrites] == [None, "tok"]
+    first = dest.rewrites[0]
+    assert first["content_type"] == "text/csv"
+    assert first["metadata"] == {"tags": "finance"}
+    assert first["storage_class"] == "COLDLINE"
+    assert first["event_based_hold"] is True
+
+
+def test_copy_object_without_properties_is_a_plain_copy():
+    client = _FakeStorage()
+    copy_object(client, "src", "in/a.csv", "dst", "tables/a.csv")
+    assert client.copies == [("in/a.csv", "dst", "tables/a.csv")]
+
+
+def test_compress_object_streams_gzip_with_content_encoding():
+    store = {"in/log.txt": b"GET /index.html 200\n" * 5000}
+    blobs = {}
+
+    class _Client:
+        def bucket(self, name):
+            class _Bucket:
+                def blob(self, blob_name):
+                    return blobs.setdefault(blob_name, _StreamBlob(store, blob_name))
+
+            return _Bucket()
+
+    result = compress_object(
+        _Client(), "src", "in/log.txt", "dst", "logs/log.txt", "gzip"
+    )
+    assert blobs["logs/log.txt"].content_encoding == "gzip"
+    assert gzip.decompress(store["logs/log.txt"]) == store["in/log.txt"]
+    assert result["original_bytes"] == len(store["in/log.txt"])
+    assert result["stored_bytes"] == len(store["logs/log.txt"])
+    assert result["ratio"] > 10
+
+
+def test_repeated_copy_to_bucket_adds_destinations():
+    rule = {
+        "actions": [
+            {"type": "move_to_folder", "value": "reports"},
+            {"type": "copy_to_bucket", "value": "archive-bucket"},
+            {"type": "copy_to_bucket", "value": "analytics-bucket/raw"},
+            {"type": "copy_to_bucket", "value": "archive-bucket"},
+        ]
+    }
+    applied = apply_actions(rule, {})
+    assert applied["dest_bucket"] == "archive-bucket"
+    assert resolve_destinations(applied, "pdfs", "uploads/q1.pdf") == [
+        ("archive-bucket", "reports", "reports/q1.pdf"),
+        ("analytics-bucket", "raw", "raw/q1.pdf"),
+    ]
+
+
+class _BatchingClient:
+    """Deletes deferred inside batch(), which raises for the first miss."""
+
+    def __init__(self, names):
+        self.objects = set(names)
+        self.batches = 0
+        self._deferred = None
+
+    def bucket(self, name):
+        return self
+
+    def blob(self, name):
+        return SimpleNamespace(delete=lambda **kwargs: self._delete(name))
+
+    def _delete(self, name):
+        if self._deferred is not None:
+            self._deferred.append(name)
+        elif name in self.objects:
+            self.objects.remove(name)
+        else:
+            raise NotFound(name)
+
+    @contextlib.contextmanager
+    def batch(self):
+        self.batches += 1
+        self._deferred = []
+        yield
+        deferred, self._deferred = self._deferred, None
+        missing = [n for n in deferred if n not in self.objects]
+        self.objects -= set(deferred)
+        if missing:
+            raise NotFound(missing[0])
+
+
+def test_delete_objects_treats_already_deleted_objects_as_deleted():
+    client = _BatchingClient(["a", "c"])
+    delete_objects(client, "bucket", ["a", "b", "c"])
+    assert client.objects == set() and client.batches == 1
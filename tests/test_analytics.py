@@ -0,0 +1,68 @@
+# tests/test_analytics.py
+
+import datetime as dt
+
+import pytest
+
+from common.analytics import AnalyticsSink, job_record
+
+
+def _row(job_id, day):
+    row = job_record(
+        {"job_id": job_id, "bucket": "uploads", "blob": f"in/{job_id}.csv"},
+        "move",
+        {"dest_bucket": "processed", "dest_blob": f"tables/{job_id}.csv"},
+    )
+    row["completed_at"] = dt.datetime.combine(day, dt.time(12), dt.timezone.utc)
+    return row
+
+
+def test_sink_micro_batches_into_date_partitions():
+    written = []
+    sink = AnalyticsSink(
+        "/data/jobs",
+        max_rows=3,
+        writer=lambda client, path, rows: written.append((path, rows)),
+    )
+    d1, d2 = dt.date(2025, 1, 1), dt.date(2025, 1, 2)
+    sink.record(_row("a", d1))
+    sink.record(_row("b", d2))
+    assert written == []
+
+    sink.record(_row("c", d1))
+    paths = sorted(path for path, _ in written)
+    assert paths[0].startswith("/data/jobs/date=2025-01-01/part-")
+    assert paths[1].startswith("/data/jobs/date=2025-01-02/part-")
+    assert sorted(len(rows) for _, rows in written) == [1, 2]
+
+    assert sink.flush(force=False) == 0
+
+
+def test_parquet_files_round_trip(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    sink = AnalyticsSink(str(tmp_path), max_rows=10)
+    sink.record(_row("a", dt.date(2025, 1, 1)))
+    assert sink.flush() == 1
+
+    files = list(tmp_path.glob("date=2025-01-01/*.parquet"))
+    table = pq.read_table(files[0])
+    assert table.column("job_id").to_pylist() == ["a"]
+    assert table.column("dest_blob").to_pylist() == ["tables/a.csv"]
+
+
+def test_started_sink_writes_full_batches_off_the_recording_thread():
+    import threading
+
+    writers = []
+    done = threading.Event()
+
+    def writer(client, path, rows):
+        writers.append(threading.current_thread().name)
+        done.set()
+
+    sink = AnalyticsSink("/data/jobs", max_rows=2, writer=writer)
+    sink.start(interval=60)
+    sink.record(_row("a", dt.date(2025, 1, 1)))
+    sink.record(_row("b", dt.date(2025, 1, 1)))
+    assert done.wait(2)
+    assert writers == ["analytics-flush"]
@@ -0,0 +1,317 @@
+# tests/test_api.py
+
+import json
+from types import SimpleNamespace
+
+import services.api.main as api_main
+
+
+def test_list_rules_honours_if_none_match(api_client, monkeypatch):
+    """
+    GET /rules should return an ETag and answer 304 when it is sent back.
+    """
+    rules = [
+        {
+            "id": "r1",
+            "name": "CSV reports",
+            "description": None,
+            "priority": 0,
+            "enabled": True,
+            "conditions": [{"type": "extension", "value": ".csv"}],
+            "actions": [{"type": "move_to_folder", "value": "reports"}],
+        }
+    ]
+    monkeypatch.setattr(api_main, "rules_cache", api_main.RulesCache(lambda: rules))
+
+    first = api_client.get("/rules")
+    assert first.status_code == 200
+    assert first.json()[0]["id"] == "r1"
+    etag = first.headers["etag"]
+
+    second = api_client.get("/rules", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+
+
+def _cached_rules(ids, tenant_id="default"):
+    return [
+        {
+            "id": rid,
+            "name": rid,
+            "priority": i,
+            "tenant_id": tenant_id,
+            "conditions": [{"type": "extension", "value": ".csv"}],
+            "actions": [{"type": "move_to_folder", "value": "reports"}],
+        }
+        for i, rid in enumerate(ids)
+    ]
+
+
+def test_reorder_rules_commits_in_chunks(api_client, monkeypatch):
+    """
+    Large reorders should be split into several commits under the write limit.
+    """
+    commits = []
+
+    class FakeBatch:
+        def __init__(self):
+            self.writes = 0
+
+        def update(self, ref, data):
+            self.writes += 1
+
+        def commit(self):
+            commits.append(self.writes)
+
+    monkeypatch.setattr(api_main.db, "batch", FakeBatch)
+    spans = []
+    monkeypatch.setattr(api_main.tracing, "_exporter", spans.append)
+
+    order = [f"rule-{i}" for i in range(api_main.FIRESTORE_BATCH_LIMIT + 10)]
+    monkeypatch.setattr(
+        api_main, "rules_cache", api_main.RulesCache(lambda: _cached_rules(order))
+    )
+    resp = api_client.post("/rules/reorder", json=order)
+    assert resp.status_code == 200
+    assert commits == [api_main.FIRESTORE_BATCH_LIMIT, 10]
+    # Each commit is traced like the workers' Firestore calls
+    assert [
+        s["attributes"]["writes"] for s in spans if s["name"] == "firestore commit"
+    ] == commits
+
+
+def test_reorder_rules_rejects_other_tenants_rules(api_client, monkeypatch):
+    """
+    Ids outside the caller's ruleset are a 404 and nothing is written.
+    """
+
+    def no_batch():
+        raise AssertionError("nothing should be written")
+
+    monkeypatch.setattr(api_main.db, "batch", no_batch)
+    monkeypatch.setattr(
+        api_main, "rules_cache", api_main.RulesCache(lambda: _cached_rules(["r1"]))
+    )
+    resp = api_client.post("/rules/reorder", json=["r1", "someone-elses"])
+    assert resp.status_code == 404
+    assert "someone-elses" in resp.json()["detail"]
+
+
+def test_simulate_rules_streams_ndjson_summary(api_client):
+    """
+    /rules/simulate should count first-match hits per candidate rule.
+    """
+    lines = [
+        {
+            "rules": [
+                {
+                    "name": "CSV",
+                    "priority": 0,
+                    "conditions": [{"type": "extension", "value": "csv"}],
+                    "actions": [{"type": "move_to_folder", "value": "tables"}],
+                },
+                {
+                    "name": "Reports",
+                    "priority": 1,
+                    "conditions": [{"type": "name_contains", "value": "report"}],
+                    "actions": [{"type": "tag", "value": "report"}],
+                },
+            ]
+        },
+        {"name": "q1-report.csv", "size": 10},
+        {"name": "q2-report.pdf", "size": 10},
+        {"name": "photo.png", "size": 10},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines)
+
+    resp = api_client.post(
+        "/rules/simulate",
+        content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    summary = json.loads(resp.text.strip().splitlines()[-1])
+    assert summary["processed"] == 3
+    assert summary["unmatched"] == 1
+    csv_rule, report_rule = summary["rules"]
+    assert (csv_rule["hits"], csv_rule["matches"]) == (1, 1)
+    assert (report_rule["hits"], report_rule["matches"]) == (1, 2)
+    assert csv_rule["samples"][0]["plan"]["dest_folder"] == "tables"
+
+
+def test_simulate_rules_caps_json_bodies(api_client, monkeypatch):
+    """
+    JSON bodies are buffered whole, so past the cap they are refused with
+    413 in favour of NDJSON.
+    """
+    monkeypatch.setattr(
+        api_main, "rules_cache", api_main.RulesCache(lambda: _cached_rules(["r1"]))
+    )
+    body = {"files": [{"name": "a.csv", "size": 1}]}
+    monkeypatch.setattr(api_main, "SIMULATE_MAX_JSON_BYTES", 1024)
+    ok = api_client.post("/rules/simulate", json=body)
+    assert ok.status_code == 200
+    assert json.loads(ok.text.strip().splitlines()[-1])["processed"] == 1
+
+    monkeypatch.setattr(api_main, "SIMULATE_MAX_JSON_BYTES", 10)
+    refused = api_client.post("/rules/simulate", json=body)
+    assert refused.status_code == 413
+    assert "ndjson" in refused.json()["detail"]
+
+
+def test_rules_are_scoped_by_tenant_header(api_client, monkeypatch):
+    """
+    X-Tenant-Id selects the tenant's own ruleset; bad ids are rejected.
+    """
+    stored = [
+        {
+            "id": "r1",
+            "name": "Default rule",
+            "priority": 0,
+            "conditions": [],
+            "actions": [],
+        },
+        {
+            "id": "r2",
+            "tenant_id": "acme",
+            "name": "Acme rule",
+            "priority": 0,
+            "conditions": [],
+            "actions": [],
+        },
+    ]
+
+    def load(tenant_id=api_main.DEFAULT_TENANT):
+        return [
+            api_main.Rule(**r).dict()
+            for r in stored
+            if api_main.tenant_of(r) == tenant_id
+        ]
+
+    monkeypatch.setattr(api_main, "_load_rules_from_firestore", load)
+    monkeypatch.setattr(api_main, "rules_cache", api_main.RulesCache(load))
+    monkeypatch.setattr(api_main, "_tenant_rules_caches", {})
+
+    default = api_client.get("/rules").json()
+    acme = api_client.get("/rules", headers={"X-Tenant-Id": "ACME"}).json()
+    assert [r["id"] for r in default] == ["r1"]
+    assert [r["id"] for r in acme] == ["r2"]
+
+    bad = api_client.get("/rules", headers={"X-Tenant-Id": "../etc"})
+    assert bad.status_code == 400
+
+
+def test_list_activity_matches_validated_serialization(api_client, monkeypatch):
+    """
+    The unvalidated rows must serialize to what the response model would.
+    """
+    from types import SimpleNamespace
+
+    from fastapi.encoders import jsonable_encoder
+
+    docs = [
+        SimpleNamespace(
+            id="b__uploads__a.csv",
+            to_dict=lambda: {
+                "status": "COMPLETED",
+                "updated_at": "2026-03-01T10:00:00.123456Z",
+                "source": {"bucket": "b", "blob": "uploads/a.csv"},
+                "action": {"dest_bucket": "p", "dest_blob": "csv/a.csv"},
+                "classification": {"label": "csv"},
+            },
+        ),
+        SimpleNamespace(id="b__x", to_dict=lambda: {"status": "ERROR"}),
+    ]
+    query = SimpleNamespace(stream=lambda: iter(docs))
+    queried = []
+    monkeypatch.setattr(
+        api_main,
+        "_recent_jobs_query",
+        lambda tenant_id, limit: queried.append(tenant_id) or query,
+    )
+
+    resp = api_client.get("/activity?limit=2", headers={"X-Tenant-Id": "acme"})
+    assert resp.status_code == 200
+    assert queried == ["acme"]
+    expected = [
+        jsonable_encoder(
+            api_main.ActivityEvent.model_validate(
+                api_main._activity_event(d.id, d.to_dict())
+            )
+        )
+        for d in docs[:1]
+    ]
+    assert resp.json()[:1] == expected
+    assert resp.json()[1]["status"] == "error"
+
+
+def test_list_rules_with_stats_and_explain(api_client, monkeypatch):
+    rules = [
+        {
+            "id": "r1",
+            "name": "PDFs",
+            "description": None,
+            "priority": 0,
+            "enabled": True,
+            "conditions": [{"type": "extension", "value": ".pdf"}],
+            "actions": [{"type": "move_to_folder", "value": "docs"}],
+        }
+    ]
+    monkeypatch.setattr(api_main, "rules_cache", api_main.RulesCache(lambda: rules))
+    monkeypatch.setattr(
+        api_main,
+        "load_rule_stats",
+        lambda ids: {"r1": {"evaluations": 10, "hits": 4, "eval_ns": 5000}},
+    )
+
+    plain = api_client.get("/rules").json()
+    assert "stats" not in plain[0]
+    stats = api_client.get("/rules?stats=true").json()[0]["stats"]
+    assert stats["hit_rate"] == 0.4
+    assert stats["avg_eval_us"] == 0.5
+
+    resp = api_client.post("/rules/explain", json={"file": {"name": "a.csv"}})
+    assert resp.status_code == 200
+    (explained,) = resp.json()["rules"]
+    assert explained["matched"] is False
+    assert explained["rejected_by"]["type"] == "extension"
+
+
+def test_search_is_answered_by_the_indexer_for_the_callers_tenant(
+    api_client, monkeypatch
+):
+    """
+    GET /search forwards to the indexer with the tenant from the header.
+    """
+    calls = []
+
+    class FakeSession:
+        def get(self, url, params, timeout):
+            calls.append((url, params))
+            return SimpleNamespace(
+                content=b'{"count": 0, "results": []}', raise_for_status=lambda: None
+            )
+
+    monkeypatch.setattr(api_main, "SEARCH_SERVICE_URL", "https://indexer")
+    monkeypatch.setattr(api_main, "search_session", FakeSession)
+
+    resp = api_client.get("/search?q=inv", headers={"X-Tenant-Id": "acme"})
+    assert resp.status_code == 200
+    assert resp.json() == {"count": 0, "results": []}
+    url, params = calls[0]
+    assert url == "https://indexer/search"
+    assert params["tenant_id"] == "acme" and params["q"] == "inv"
+    assert "rule_id" not in params
+
+
+def test_activity_stream_is_scoped_to_the_tenant():
+    """
+    Each tenant gets its own feed; EventSource clients pass ?tenant_id=.
+    """
+    assert api_main.stream_tenant(tenant_id="Acme", x_tenant_id=None) == "acme"
+    assert api_main.stream_tenant(tenant_id=None, x_tenant_id=None) == (
+        api_main.DEFAULT_TENANT
+    )
+    acme = api_main.activity_feed_for("acme")
+    assert api_main.activity_feed_for("acme") is acme
+    assert api_main.activity_feed_for("globex") is not acme
@@ -0,0 +1,193 @@
+# tests/test_backfill.py
+
+import contextlib
+from types import SimpleNamespace
+
+from google.api_core.exceptions import NotFound
+
+from services.act_worker.backfill import Backfill, shard_ranges
+
+
+class _FakeRulesDB:
+    """Just enough of the Firestore client for Backfill to load rules."""
+
+    def __init__(self, rules):
+        self._docs = [
+            SimpleNamespace(id=r["id"], to_dict=lambda r=r: dict(r)) for r in rules
+        ]
+
+    def collection(self, name):
+        return self
+
+    def where(self, *args):
+        return self
+
+    def stream(self):
+        return iter(self._docs)
+
+
+def test_shard_ranges_cover_the_prefix_without_overlap():
+    ranges = shard_ranges("reports/", 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and end.startswith("reports/")
+
+
+def test_backfill_plans_moves_and_skips_objects_already_in_place():
+    rules = [
+        {
+            "id": "csv",
+            "name": "CSV",
+            "priority": 0,
+            "conditions": [{"type": "extension", "value": "csv"}],
+            "actions": [{"type": "move_to_folder", "value": "tables"}],
+        }
+    ]
+    backfill = Backfill(None, _FakeRulesDB(rules), "drbfo-organized", dry_run=True)
+
+    def blob(name):
+        return SimpleNamespace(name=name, size=10, content_type="text/csv")
+
+    plan = backfill.plan(blob("spreadsheets/q1.csv"))
+    assert plan["op"] == "move"
+    assert plan["dest_blob"] == "tables/q1.csv"
+
+    assert backfill.plan(blob("tables/q1.csv")) is None
+    assert backfill.plan(blob("images/cat.png")) is None
+
+
+class _FakeBatchDB(_FakeRulesDB):
+    def __init__(self, rules):
+        super().__init__(rules)
+        self.commits = []
+
+    def document(self, job_id):
+        return job_id
+
+    def batch(self):
+        writes = []
+        db = self
+
+        class _Batch:
+            def set(self, ref, data, merge=False):
+                writes.append(ref)
+
+            def commit(self):
+                db.commits.append(len(writes))
+
+        return _Batch()
+
+
+def test_backfill_holds_the_checkpoint_at_the_first_failed_copy(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from services.act_worker import backfill as backfill_module
+
+    rules = [
+        {
+            "id": "csv",
+            "priority": 0,
+            "conditions": [{"type": "extension", "value": "csv"}],
+            "actions": [{"type": "move_to_folder", "value": "tables"}],
+        }
+    ]
+    names = [f"in/{i:04d}.csv" for i in range(1200)]
+    pages = [names[:600], names[600:]]
+    storage_client = SimpleNamespace(
+        list_blobs=lambda *a, **k: SimpleNamespace(
+            pages=[
+                [
+                    SimpleNamespace(
+                        name=n, size=10, content_type="text/csv", metadata=None
+                    )
+                    for n in p
+                ]
+                for p in pages
+            ]
+        )
+    )
+    db = _FakeBatchDB(rules)
+    checkpoint = tmp_path / "backfill.json"
+    backfill = Backfill(
+        storage_client,
+        db,
+        backfill_module.UPLOAD_BUCKET,
+        shards=1,
+        rate=0,
+        checkpoint_path=str(checkpoint),
+    )
+    monkeypatch.setattr(backfill, "_copy", lambda name, plan: name != "in/0700.csv")
+    monkeypatch.setattr(backfill, "_delete", lambda names: names)
+    with ThreadPoolExecutor(4) as pool:
+        backfill._pool = pool
+        backfill.run_shard(0)
+
+    # Job updates never exceed Firestore's 500 writes per commit
+    assert max(db.commits) <= 500 and sum(db.commits) == 1199
+    state = backfill.checkpoint.shard(0)
+    assert state["last"] == "in/0699.csv" and not state.get("done")
+
+
+def test_objects_deleted_by_live_traffic_do_not_fail_the_chunk():
+    existing = {"uploads/a.csv", "uploads/c.csv"}
+    deferred = []
+
+    class Client:
+        def bucket(self, name):
+            return self
+
+        def blob(self, name):
+            def delete(**kwargs):
+                if deferred:
+                    deferred[-1].append(name)
+                elif name in existing:
+                    existing.remove(name)
+                else:
+                    raise NotFound(name)
+
+            return SimpleNamespace(delete=delete)
+
+        @contextlib.contextmanager
+        def batch(self):
+            # A real batch sends its calls on exit and raises for a 404
+            deferred.append([])
+            yield
+            names = deferred.pop()
+            missing = [n for n in names if n not in existing]
+            existing.difference_update(names)
+            if missing:
+                raise NotFound(missing[0])
+
+    backfill = Backfill(Client(), _FakeRulesDB([]), "drbfo-uploads", rate=1000)
+    names = ["uploads/a.csv", "uploads/b.csv", "uploads/c.csv"]
+    assert backfill._delete(names) == names
+    assert backfill.stats["failed"] == 0 and not existing
+
+
+def test_backfill_only_touches_the_selected_tenants_objects():
+    rules = [
+        {
+            "id": "csv",
+            "name": "CSV",
+            "priority": 0,
+            "tenant_id": "acme",
+            "conditions": [{"type": "extension", "value": "csv"}],
+            "actions": [{"type": "move_to_folder", "value": "tables"}],
+        }
+    ]
+    backfill = Backfill(
+        None, _FakeRulesDB(rules), "drbfo-organized", dry_run=True, tenant="acme"
+    )
+
+    def blob(name, tenant=None):
+        metadata = {"tenant_id": tenant} if tenant else None
+        return SimpleNamespace(
+            name=name, size=10, content_type="text/csv", metadata=metadata
+        )
+
+    backfill.process_page(
+        [blob("in/a.csv", "acme"), blob("in/b.csv", "globex"), blob("in/c.csv")]
+    )
+    assert backfill.stats["move"] == 1
+    assert backfill.stats["other_tenant"] == 2
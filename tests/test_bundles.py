@@ -0,0 +1,138 @@
+# tests/test_bundles.py
+
+import io
+import json
+import tarfile
+import threading
+
+from google.api_core.exceptions import NotFound
+
+from common.bundles import INDEX_SUFFIX, Bundler, read_member
+
+
+class _Writer(io.BytesIO):
+    def __init__(self, store, key):
+        super().__init__()
+        self._store, self._key = store, key
+
+    def close(self):
+        self._store[self._key] = self.getvalue()
+        super().close()
+
+
+class _FakeBlob:
+    def __init__(self, store, bucket, name):
+        self._store, self._key = store, (bucket, name)
+        self.storage_class = None
+
+    def open(self, mode, content_type=None):
+        return _Writer(self._store, self._key)
+
+    def upload_from_string(self, data, content_type=None):
+        self._store[self._key] = data.encode("utf-8")
+
+    def download_as_bytes(self, start=None, end=None):
+        if self._key not in self._store:
+            raise NotFound("no such object")
+        data = self._store[self._key]
+        if start is None:
+            return data
+        return data[start : end + 1]
+
+
+class _FakeStorage:
+    def __init__(self):
+        self.objects = {}
+
+    def bucket(self, name):
+        storage = self
+
+        class _Bucket:
+            def blob(self, blob_name):
+                return _FakeBlob(storage.objects, name, blob_name)
+
+        return _Bucket()
+
+
+def _member(i, data):
+    return {
+        "job_id": f"job-{i}",
+        "bucket": "uploads",
+        "blob": f"in/{i}.txt",
+        "name": f"{i}.txt",
+        "file_size": len(data),
+    }
+
+
+def test_bundle_index_offsets_allow_single_ranged_reads():
+    client = _FakeStorage()
+    contents = {i: (f"file number {i}\n" * (i * 40 + 1)).encode() for i in range(3)}
+    for i, data in contents.items():
+        client.objects[("uploads", f"in/{i}.txt")] = data
+
+    flushed = []
+    bundler = Bundler(client, lambda b, e: flushed.append((b, e)), max_files=3)
+    key = ("processed", "documents", None, "default")
+    for i, data in contents.items():
+        bundler.add(key, _member(i, data))
+    # Redelivery while waiting is ignored
+    bundler.add(key, _member(0, contents[0]))
+
+    assert len(flushed) == 1
+    bundle, entries = flushed[0]
+    assert bundle["blob"].startswith("documents/_bundles/")
+    assert [e["job_id"] for e in entries] == ["job-0", "job-1", "job-2"]
+
+    tar_bytes = client.objects[("processed", bundle["blob"])]
+    with tarfile.open(fileobj=io.BytesIO(tar_bytes)) as tar:
+        assert tar.getnames() == ["0.txt", "1.txt", "2.txt"]
+
+    index = json.loads(client.objects[("processed", bundle["blob"] + INDEX_SUFFIX)])
+    for entry in index["members"]:
+        i = int(entry["job_id"].split("-")[1])
+        data = read_member(
+            client, "processed", bundle["blob"], entry["offset"], entry["size"]
+        )
+        assert data == contents[i]
+
+
+def test_bundles_flush_by_age_and_skip_vanished_sources():
+    client = _FakeStorage()
+    client.objects[("uploads", "in/0.txt")] = b"hello"
+
+    flushed = []
+    bundler = Bundler(client, lambda b, e: flushed.append(e), max_age=0)
+    bundler.add(("processed", "misc", None, "default"), _member(0, b"hello"))
+    bundler.add(("processed", "misc", None, "default"), _member(1, b"gone"))
+    assert flushed == []
+
+    assert bundler.flush_due() == 1
+    assert [e["job_id"] for e in flushed[0]] == ["job-0"]
+    assert bundler.stats()["pending_files"] == 0
+
+
+def test_full_bundles_are_written_off_the_caller_and_flush_errors_are_contained():
+    client = _FakeStorage()
+    for i in range(2):
+        client.objects[("uploads", f"in/{i}.txt")] = b"data"
+
+    written = threading.Event()
+    callers = []
+
+    def on_flush(bundle, entries):
+        callers.append(threading.current_thread().name)
+        written.set()
+        raise RuntimeError("firestore unavailable")
+
+    bundler = Bundler(client, on_flush, max_files=2)
+    bundler.start(interval=60)
+    key = ("processed", "misc", None, "default")
+    for i in range(2):
+        bundler.add(key, _member(i, b"data"))
+
+    assert written.wait(5)
+    assert callers == ["bundle-flush"]
+    # The failure stayed on the flush thread, which keeps serving
+    assert bundler.stats()["pending_bundles"] == 0
+    bundler.add(key, _member(0, b"data"))
+    assert bundler.flush_all() == 1
@@ -0,0 +1,57 @@
+# tests/test_cpu_pool.py
+
+import asyncio
+import time
+
+import pytest
+
+from common.cpu_pool import CpuPool, TaskTimeout
+from common.limits import Saturated
+
+
+def test_pool_runs_tasks_and_recovers_after_a_timeout():
+    pool = CpuPool("test-cpu", workers=1, max_queued=1, timeout=0.5)
+
+    async def scenario():
+        assert await pool.run(sum, [1, 2, 3]) == 6
+        with pytest.raises(TaskTimeout):
+            await pool.run(time.sleep, 30)
+        # The wedged process was replaced
+        assert await pool.run(max, [4, 9, 2]) == 9
+
+    asyncio.run(scenario())
+    assert pool.inflight == 0
+
+
+def test_pool_rejects_work_beyond_its_queue():
+    pool = CpuPool("test-cpu", workers=1, max_queued=0, timeout=5)
+    pool.inflight = 1
+    with pytest.raises(Saturated):
+        asyncio.run(pool.run(sum, [1]))
+
+
+def test_time_spent_waiting_for_a_worker_does_not_count():
+    pool = CpuPool("test-cpu", workers=1, max_queued=2, timeout=0.5)
+
+    async def scenario():
+        # Each runs 0.3 s; the second waits 0.3 s for the worker first
+        return await asyncio.gather(
+            pool.run(time.sleep, 0.3), pool.run(time.sleep, 0.3)
+        )
+
+    assert asyncio.run(scenario()) == [None, None]
+
+
+def test_a_timeout_kills_only_the_overdue_worker():
+    pool = CpuPool("test-cpu", workers=2, max_queued=0, timeout=0.5)
+
+    async def scenario():
+        return await asyncio.gather(
+            pool.run(time.sleep, 30),
+            pool.run(sum, [1, 2]),
+            return_exceptions=True,
+        )
+
+    stuck, healthy = asyncio.run(scenario())
+    assert isinstance(stuck, TaskTimeout)
+    assert healthy == 3
@@ -0,0 +1,113 @@
+# tests/test_fanout.py
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from common.fanout import Fanout
+
+
+class _FakeQuery:
+    def __init__(self):
+        self.listeners = 0
+        self.callback = None
+        self.stopped = 0
+
+    def on_snapshot(self, callback):
+        self.listeners += 1
+        self.callback = callback
+        return SimpleNamespace(unsubscribe=self._stop)
+
+    def _stop(self):
+        self.stopped += 1
+
+    def emit(self, *changes):
+        docs = [
+            SimpleNamespace(
+                type=SimpleNamespace(name=kind),
+                document=SimpleNamespace(id=doc_id, to_dict=lambda s=status: s),
+            )
+            for kind, doc_id, status in changes
+        ]
+        self.callback([], docs, None)
+
+
+def test_one_listener_feeds_every_client_with_bounded_coalesced_buffers():
+    query = _FakeQuery()
+    feed = Fanout(
+        lambda: query,
+        lambda doc: {"id": doc.id, "status": doc.to_dict()},
+        max_pending=2,
+    )
+
+    async def scenario():
+        a, _ = feed.subscribe()
+        b, _ = feed.subscribe()
+        assert query.listeners == 1
+
+        query.emit(("ADDED", "j1", "pending"), ("ADDED", "j2", "pending"))
+        query.emit(("MODIFIED", "j1", "processed"))
+        items, dropped = await a.next(timeout=1)
+        # j1 is sent once, in its latest state
+        assert items == [
+            {"id": "j2", "status": "pending"},
+            {"id": "j1", "status": "processed"},
+        ]
+        assert dropped == 0
+
+        # b never read: its buffer keeps the newest two and counts the rest
+        query.emit(("ADDED", "j3", "pending"))
+        items, dropped = await b.next(timeout=1)
+        assert [i["id"] for i in items] == ["j1", "j3"]
+        assert dropped == 1
+
+        # A late client starts from the listener's current view
+        c, current = feed.subscribe()
+        assert {i["id"] for i in current} == {"j1", "j2", "j3"}
+        assert query.listeners == 1
+
+        for sub in (a, b, c):
+            feed.unsubscribe(sub)
+        assert query.stopped == 1
+        assert feed.stats()["listening"] is False
+
+    asyncio.run(scenario())
+
+
+class _EagerQuery(_FakeQuery):
+    """Delivers the first snapshot from its own thread during on_snapshot()."""
+
+    def on_snapshot(self, callback):
+        watch = super().on_snapshot(callback)
+        self.first = threading.Thread(
+            target=self.emit, args=(("ADDED", "j1", "pending"),)
+        )
+        self.first.start()
+        return watch
+
+
+def test_first_snapshot_is_kept_and_late_callbacks_are_ignored():
+    query = _EagerQuery()
+    feed = Fanout(lambda: query, lambda doc: {"id": doc.id, "status": doc.to_dict()})
+
+    async def scenario():
+        a, _ = feed.subscribe()
+        query.first.join()
+        items, _ = await a.next(timeout=1)
+        assert items == [{"id": "j1", "status": "pending"}]
+
+        stale = query.callback
+        feed.unsubscribe(a)
+        b, _ = feed.subscribe()
+        query.first.join()
+
+        # The stopped listener's callback no longer changes anything
+        stale(
+            [],
+            [SimpleNamespace(type="REMOVED", document=SimpleNamespace(id="j1"))],
+            None,
+        )
+        _, current = feed.subscribe()
+        assert [i["id"] for i in current] == ["j1"]
+
+    asyncio.run(scenario())
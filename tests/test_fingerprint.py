@@ -0,0 +1,25 @@
+# tests/test_fingerprint.py
+
+import base64
+import hashlib
+import io
+
+import pytest
+
+from common.fingerprint import HAS_CRC32C, HEADER_BYTES, fingerprint
+
+
+def test_fingerprint_reads_the_file_once_in_chunks():
+    data = b"%PDF-1.7\n" + bytes(range(256)) * 40
+    fp = fingerprint(io.BytesIO(data), chunk_size=1000)
+
+    assert fp["size"] == len(data)
+    assert fp["sha256"] == hashlib.sha256(data).hexdigest()
+    assert fp["header"] == data[:HEADER_BYTES]
+
+
+@pytest.mark.skipif(not HAS_CRC32C, reason="google-crc32c not installed")
+def test_fingerprint_crc32c_uses_the_gcs_encoding():
+    # Known CRC32C of "123456789" is 0xE3069283
+    fp = fingerprint(io.BytesIO(b"123456789"))
+    assert base64.b64decode(fp["crc32c"]) == bytes.fromhex("e3069283")
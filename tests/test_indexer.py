@@ -0,0 +1,58 @@
+# tests/test_indexer.py
+
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import services.indexer.main as indexer_main
+from common.search_index import SearchIndex
+
+
+@pytest.fixture
+def indexer_client(monkeypatch):
+    monkeypatch.setattr(indexer_main, "search_index", SearchIndex())
+    monkeypatch.setattr(indexer_main.verify_push, "audience", "https://indexer/push")
+    return TestClient(indexer_main.app)
+
+
+def _push(client, record, **headers):
+    data = base64.b64encode(json.dumps(record).encode()).decode()
+    return client.post(
+        "/pubsub-push", json={"message": {"data": data}}, headers=headers
+    )
+
+
+RECORD = {
+    "job_id": "j1",
+    "tenant_id": "acme",
+    "source_blob": "inbox/invoice-42.pdf",
+    "dest_blob": "pdfs/invoice-42.pdf",
+    "classification": "pdfs",
+}
+
+
+def test_push_requires_a_valid_oidc_token(indexer_client, monkeypatch):
+    assert _push(indexer_client, RECORD).status_code == 401
+
+    def reject(token):
+        raise ValueError("wrong audience")
+
+    monkeypatch.setattr(indexer_main.verify_push, "verify", reject)
+    resp = _push(indexer_client, RECORD, Authorization="Bearer forged")
+    assert resp.status_code == 403
+
+    resp = indexer_client.get("/search", params={"tenant_id": "acme", "q": "inv"})
+    assert resp.json()["count"] == 0
+
+
+def test_verified_push_is_searchable_by_its_tenant(indexer_client, monkeypatch):
+    monkeypatch.setattr(indexer_main.verify_push, "verify", lambda token: {})
+    resp = _push(indexer_client, RECORD, Authorization="Bearer ok")
+    assert resp.status_code == 204
+
+    found = indexer_client.get("/search", params={"tenant_id": "acme", "q": "inv"})
+    assert [r["job_id"] for r in found.json()["results"]] == ["j1"]
+    other = indexer_client.get("/search", params={"tenant_id": "globex", "q": "inv"})
+    assert other.json()["count"] == 0
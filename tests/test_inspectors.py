@@ -0,0 +1,115 @@
+# tests/test_inspectors.py
+
+import asyncio
+import io
+import os
+import struct
+import zipfile
+
+from common.classification import simple_classification
+from common.inspectors import is_zip, list_zip_entries, zip_directory_range
+from common.rules import explain_rule
+from services.inspect_worker import main as inspect_worker
+
+
+def make_zip(entries, comment=b""):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data, method in entries:
+            zf.writestr(name, data, compress_type=method)
+        zf.comment = comment
+    return buf.getvalue()
+
+
+DOCX = [
+    ("[Content_Types].xml", b"<Types/>", zipfile.ZIP_DEFLATED),
+    ("word/", b"", zipfile.ZIP_STORED),
+    ("word/document.xml", b"<w:document/>" * 100, zipfile.ZIP_DEFLATED),
+]
+
+
+def listing(data, tail_bytes=4096):
+    offset, length, count = zip_directory_range(data[-tail_bytes:], len(data))
+    return list_zip_entries(data[offset : offset + length], count)
+
+
+def test_lists_entries_from_the_central_directory():
+    # The comment contains a decoy EOCD signature
+    archive = listing(make_zip(DOCX, comment=b"PK\x05\x06 not the end"))
+
+    assert archive["entries"] == 3 and archive["files"] == 2
+    assert archive["names"] == ["[Content_Types].xml", "word/", "word/document.xml"]
+    assert archive["methods"] == {"deflate": 2}
+    assert archive["uncompressed_size"] == 8 + 1300
+    assert archive["complete"] and not archive["encrypted"]
+    assert not archive["names_truncated"]
+    assert simple_classification("application/zip", ".zip", archive["names"]) == (
+        "documents"
+    )
+    assert simple_classification("application/zip", ".zip", []) == "archives"
+
+
+def test_names_beyond_the_cap_are_flagged():
+    data = make_zip(DOCX)
+    offset, length, count = zip_directory_range(data[-4096:], len(data))
+    archive = list_zip_entries(data[offset : offset + length], count, max_names=2)
+
+    assert archive["names"] == ["[Content_Types].xml", "word/"]
+    assert archive["names_truncated"] and archive["complete"]
+    # The rules see the cap and say so when a name may have been missed
+    rule = {"conditions": [{"type": "archive_contains", "value": "document.xml"}]}
+    meta = {
+        "name": "a.docx",
+        "archive_entries": archive["entries"],
+        "archive_names": archive["names"],
+        "archive_names_truncated": archive["names_truncated"],
+    }
+    assert "names were capped" in explain_rule(rule, meta)["reason"]
+
+
+def test_zip64_records_are_followed(monkeypatch):
+    # Force the ZIP64 end records and size fields on a small archive
+    monkeypatch.setattr(zipfile, "ZIP_FILECOUNT_LIMIT", 1)
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 10)
+    data = bytearray(make_zip(DOCX))
+    assert data.rfind(b"PK\x06\x06") >= 0
+    # Leave only the ZIP64 sentinels in the classic record, as writers of
+    # huge archives do, so the counts must come from the ZIP64 record
+    eocd = data.rfind(b"PK\x05\x06")
+    struct.pack_into("<2H2L", data, eocd + 8, 0xFFFF, 0xFFFF, 2**32 - 1, 2**32 - 1)
+    data = bytes(data)
+
+    archive = listing(data)
+    assert archive["entries"] == 3
+    assert archive["uncompressed_size"] == 8 + 1300
+
+
+def test_not_a_zip():
+    assert zip_directory_range(b"%PDF-1.7 " * 100, 900) is None
+    assert not is_zip("application/pdf", ".pdf", b"%PDF")
+    assert is_zip("application/octet-stream", ".bin", b"PK\x03\x04")
+    assert is_zip(inspect_worker.EXTENSION_MAP[".xlsx"], "")
+
+
+class RangedBlob:
+    def __init__(self, data):
+        self.data = data
+        self.reads = []
+
+    def download_as_bytes(self, start, end, timeout=None):
+        self.reads.append((start, end))
+        return self.data[start : end + 1]
+
+
+def test_large_archive_costs_a_few_kb_of_reads():
+    entries = [(f"sheet{i}.csv", b"x", zipfile.ZIP_STORED) for i in range(200)]
+    entries.append(("video.bin", os.urandom(4 * 1024 * 1024), zipfile.ZIP_STORED))
+    blob = RangedBlob(make_zip(entries))
+
+    archive = asyncio.run(inspect_worker.inspect_archive(blob, len(blob.data)))
+
+    assert archive["entries"] == 201 and archive["complete"]
+    assert archive["names"][-1] == "video.bin"
+    # The tail, then the directory it points to
+    assert len(blob.reads) == 2
+    assert sum(end - start + 1 for start, end in blob.reads) < 16 * 1024
@@ -0,0 +1,56 @@
+# tests/test_limits.py
+
+import pytest
+
+from common.limits import AdaptiveLimiter, Saturated
+
+
+def test_limit_grows_when_healthy_and_backs_off_when_slow():
+    limiter = AdaptiveLimiter("gcs", initial=2, max_wait=0)
+
+    for _ in range(10):
+        limiter.acquire()
+        limiter.acquire()
+        limiter.release(0.010)
+        limiter.release(0.010)
+    grown = limiter.limit
+    assert grown > 2
+
+    limiter.acquire()
+    limiter.release(0.500)  # far above the 10 ms baseline
+    assert limiter.limit < grown
+
+
+def test_saturated_when_limit_and_queue_are_full():
+    limiter = AdaptiveLimiter("firestore", initial=1, max_wait=0.01, max_queue=0)
+    limiter.acquire()
+    assert limiter.saturated
+    with pytest.raises(Saturated):
+        limiter.acquire()
+    limiter.release(0.01)
+    limiter.acquire()
+
+
+def test_latency_is_compared_per_unit_of_cost():
+    limiter = AdaptiveLimiter("gcs_large", initial=4, max_wait=0)
+    limiter.acquire()
+    limiter.release(0.010)  # 10 ms for 1 MB
+
+    limiter.acquire()
+    limiter.release(5.0, cost=1000)  # 5 s for 1 GB is just as fast per MB
+    assert limiter.limit >= 4
+
+
+def test_lanes_have_separate_transfer_limiters():
+    from services.act_worker import main as act_worker
+
+    small = act_worker.lane_dependencies("small")
+    large = act_worker.lane_dependencies("large")
+    assert act_worker.transfer_dependency("large") not in small
+    dep = act_worker.deps.deps[act_worker.transfer_dependency("large")]
+    dep.limiter.inflight, dep.limiter.waiting = 10_000, 10_000
+    try:
+        assert act_worker.deps.saturated(large) == "gcs_large"
+        assert act_worker.deps.saturated(small) is None
+    finally:
+        dep.limiter.inflight, dep.limiter.waiting = 0, 0
@@ -0,0 +1,59 @@
+# tests/test_log.py
+
+import json
+import logging
+
+from common.log import JsonFormatter, SamplingFilter, job_context, sample_rates
+
+
+def _record(msg="hello %s", args=("world",), level=logging.INFO, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_sample_rates_parses_spec():
+    assert sample_rates("mime_decision=0.01, request=0.5,") == {
+        "mime_decision": 0.01,
+        "request": 0.5,
+    }
+    assert sample_rates("") == {}
+
+
+def test_sampling_keeps_warnings_and_untagged_events():
+    f = SamplingFilter({"message": 0.0})
+    assert f.filter(_record(event="message")) is False
+    assert f.filter(_record(event="message", level=logging.WARNING)) is True
+    assert f.filter(_record(event="other")) is True
+    assert f.filter(_record()) is True
+
+
+def test_sampling_is_decided_per_job():
+    f = SamplingFilter({"message": 0.5})
+    decisions = {}
+    for i in range(200):
+        job_id = f"bucket__file-{i}"
+        with job_context(job_id):
+            first = f.filter(_record(event="message"))
+            # Every line of the same job gets the same decision
+            assert all(f.filter(_record(event="message")) is first for _ in range(3))
+        decisions[job_id] = first
+    kept = sum(decisions.values())
+    assert 50 < kept < 150
+
+
+def test_json_formatter_fields_and_job_id():
+    formatter = JsonFormatter("inspect-worker")
+    with job_context("b__a.txt"):
+        line = formatter.format(_record(event="message", status=204))
+    entry = json.loads(line)
+    assert entry["severity"] == "INFO"
+    assert entry["message"] == "hello world"
+    assert entry["service"] == "inspect-worker"
+    assert entry["job_id"] == "b__a.txt"
+    assert entry["event"] == "message"
+    assert entry["status"] == 204
+    assert entry["time"].endswith("Z")
+
+    entry = json.loads(formatter.format(_record()))
+    assert "job_id" not in entry
@@ -0,0 +1,90 @@
+# tests/test_messages.py
+
+import base64
+import json
+
+from common import messages
+
+EVENT = {
+    "job_id": "drbfo-uploads__uploads__report.csv",
+    "bucket": "drbfo-uploads",
+    "blob": "uploads/report.csv",
+    "mime_type": "text/csv",
+    "file_size": 4096,
+    "ext": ".csv",
+    "classification": "spreadsheets",
+    "lane": "small",
+    "tenant_id": "acme",
+}
+
+
+def test_envelope_round_trip_carries_routing_keys_as_attributes():
+    data, attributes = messages.encode(EVENT)
+    assert attributes == {
+        "v": "1",
+        "job_id": EVENT["job_id"],
+        "tenant_id": "acme",
+        "lane": "small",
+        "classification": "spreadsheets",
+    }
+    assert EVENT["job_id"].encode() not in data
+    assert len(data) < len(json.dumps(EVENT))
+
+    envelope = {
+        "message": {
+            "data": base64.b64encode(data).decode(),
+            "attributes": attributes,
+        }
+    }
+    decoded = messages.decode_push(envelope)
+    assert decoded == {**EVENT, "name": EVENT["blob"]}
+
+
+def test_decoder_reads_legacy_events_and_gcs_notifications():
+    legacy = json.dumps({"job_id": "j", "bucket": "b", "name": "a.txt"}).encode()
+    assert messages.decode(legacy)["blob"] == "a.txt"
+
+    notification = json.dumps(
+        {"bucket": "b", "name": "a.txt", "size": "12", "contentType": "text/plain"}
+    ).encode()
+    decoded = messages.decode(notification, {"eventType": "OBJECT_FINALIZE"})
+    assert decoded["gcs_event"] is True
+    assert decoded["file_size"] == 12
+    assert decoded["mime_type"] == "text/plain"
+
+    assert messages.decode_push({"message": {"attributes": {}}}) is None
+
+
+def test_api_ingest_event_keeps_fingerprints_and_origin():
+    event = {**EVENT, "sha256": "ab" * 32, "crc32c": "4waSgw==", "origin": "api"}
+    data, attributes = messages.encode(event)
+    assert messages.decode(data, attributes) == {**event, "name": event["blob"]}
+
+    notification = {
+        "bucket": "b",
+        "name": "uploads/x.pdf",
+        "contentType": "application/pdf",
+        "size": "10",
+        "metadata": {"tenant_id": "acme", "origin": "api"},
+    }
+    decoded = messages.decode(json.dumps(notification).encode(), {"eventType": "x"})
+    assert decoded["origin"] == "api" and decoded["gcs_event"] is True
+
+
+def test_fast_and_stdlib_encodings_match(monkeypatch):
+    from common import fastjson
+
+    body = {"v": 1, "b": "bücket", "s": 4096, "i": True, "x": None, "f": 0.5}
+    fast = fastjson.dumps(body)
+    monkeypatch.setattr(fastjson, "HAS_ORJSON", False)
+    assert fastjson.dumps(body) == fast
+    assert fastjson.loads(fast) == body
+
+
+def test_decode_push_accepts_raw_request_body():
+    data, attributes = messages.encode(EVENT)
+    push = {
+        "message": {"data": base64.b64encode(data).decode(), "attributes": attributes}
+    }
+    raw = json.dumps(push).encode("utf-8")
+    assert messages.decode_push(raw) == messages.decode_push(push)
@@ -0,0 +1,55 @@
+# tests/test_reconciler.py
+
+from services.reconciler.main import RECONCILE_MAX_ATTEMPTS, decide, stage_event
+from common.config import ACT_TOPIC
+
+CLASSIFIED_JOB = {
+    "status": "CLASSIFIED",
+    "source": {"bucket": "drbfo-uploads", "blob": "uploads/report.csv"},
+    "inspection": {"mime_type": "text/csv", "file_size": 42},
+    "classification": {
+        "classification": "spreadsheets",
+        "mime_type": "text/csv",
+        "file_size": 42,
+        "ext": ".csv",
+    },
+}
+
+
+def test_stranded_classified_job_is_republished_to_act():
+    decision = decide("CLASSIFIED", CLASSIFIED_JOB, source_exists=True)
+    assert decision == {"op": "republish", "topic": ACT_TOPIC}
+
+    event = stage_event("job-1", "CLASSIFIED", CLASSIFIED_JOB)
+    assert event["blob"] == "uploads/report.csv"
+    assert event["classification"] == "spreadsheets"
+    assert event["ext"] == ".csv"
+
+
+def test_stranded_job_outcomes_without_republish():
+    acted = {**CLASSIFIED_JOB, "action": {"acted_at": "2025-01-01T00:00:00Z"}}
+    assert decide("CLASSIFIED", acted, source_exists=False)["op"] == "complete"
+    assert decide("CLASSIFIED", CLASSIFIED_JOB, source_exists=False)["op"] == "fail"
+
+    retried = {**CLASSIFIED_JOB, "reconcile_attempts": RECONCILE_MAX_ATTEMPTS}
+    assert decide("CLASSIFIED", retried, source_exists=True)["op"] == "fail"
+
+
+def test_upload_orphaned_before_its_ingest_event_is_republished():
+    from common.config import INGEST_TOPIC
+
+    new_job = {
+        "status": "NEW",
+        "tenant_id": "acme",
+        "source": {"bucket": "drbfo-uploads", "blob": "uploads/x__a.csv"},
+        "upload": {"mime_type": "text/csv", "file_size": 42, "sha256": "ab"},
+    }
+    assert decide("NEW", new_job, source_exists=True) == {
+        "op": "republish",
+        "topic": INGEST_TOPIC,
+    }
+    assert decide("NEW", new_job, source_exists=False)["op"] == "fail"
+
+    event = stage_event("job-2", "NEW", new_job)
+    assert event["origin"] == "api" and event["mime_type"] == "text/csv"
+    assert event["tenant_id"] == "acme" and event["file_size"] == 42
@@ -0,0 +1,118 @@
+# tests/test_replay.py
+
+from types import SimpleNamespace
+
+from common import messages
+from services.reconciler.replay import Replay
+
+SOURCE = "CloudPubSubDeadLetterSourceSubscription"
+
+
+def _received(message_id, stage_subscription, event):
+    data, attributes = messages.encode(event)
+    attributes[SOURCE] = stage_subscription
+    attributes["CloudPubSubDeadLetterSourceDeliveryCount"] = "5"
+    return SimpleNamespace(
+        ack_id=f"ack-{message_id}",
+        message=SimpleNamespace(
+            message_id=message_id, data=data, attributes=attributes
+        ),
+    )
+
+
+class _FakeSubscriber:
+    def __init__(self, received):
+        self.queue = list(received)
+        self.acked = []
+        self.leased = []
+
+    def subscription_path(self, project, name):
+        return f"projects/{project}/subscriptions/{name}"
+
+    def pull(self, request, timeout):
+        batch = self.queue[: request["max_messages"]]
+        self.queue = self.queue[len(batch) :]
+        return SimpleNamespace(received_messages=batch)
+
+    def acknowledge(self, request):
+        self.acked += request["ack_ids"]
+
+    def modify_ack_deadline(self, request):
+        self.leased += request["ack_ids"]
+
+
+class _FakePublisher:
+    def __init__(self):
+        self.published = []
+
+    def topic_path(self, project, topic):
+        return topic
+
+    def publish(self, topic, data, **attributes):
+        self.published.append((topic, attributes))
+        return SimpleNamespace(result=lambda: "id")
+
+
+def _dead_letters():
+    return [
+        _received(
+            "m1",
+            "projects/p/subscriptions/drbfo-classify-push",
+            {"job_id": "j1", "bucket": "b", "blob": "a.csv", "file_size": 10},
+        ),
+        _received(
+            "m2",
+            "projects/p/subscriptions/drbfo-act-large-push",
+            {"job_id": "j2", "bucket": "b", "blob": "big.bin", "lane": "large"},
+        ),
+    ]
+
+
+def test_replay_routes_each_message_to_its_stage_and_acks(tmp_path):
+    subscriber, publisher = _FakeSubscriber(_dead_letters()), _FakePublisher()
+    replay = Replay(
+        subscriber,
+        publisher,
+        "dlq",
+        rate=0,
+        checkpoint_path=str(tmp_path / "replay.json"),
+    )
+    stats = replay.run()
+
+    assert stats["replayed"] == 2
+    topics = {attrs["job_id"]: topic for topic, attrs in publisher.published}
+    assert topics == {"j1": "drbfo-classify", "j2": "drbfo-act-large"}
+    assert not any(
+        k.startswith("CloudPubSubDeadLetter")
+        for _, attrs in publisher.published
+        for k in attrs
+    )
+    assert sorted(subscriber.acked) == ["ack-m1", "ack-m2"]
+
+
+def test_resumed_replay_acks_without_republishing(tmp_path):
+    path = str(tmp_path / "replay.json")
+    Replay(
+        _FakeSubscriber(_dead_letters()[:1]),
+        _FakePublisher(),
+        "dlq",
+        rate=0,
+        checkpoint_path=path,
+    ).run()
+
+    # m1 was published but (say) the ack was lost, so it is delivered again
+    subscriber, publisher = _FakeSubscriber(_dead_letters()), _FakePublisher()
+    stats = Replay(subscriber, publisher, "dlq", rate=0, checkpoint_path=path).run()
+
+    assert stats["already_replayed"] == 1
+    assert [attrs["job_id"] for _, attrs in publisher.published] == ["j2"]
+    assert sorted(subscriber.acked) == ["ack-m1", "ack-m2"]
+
+
+def test_stage_filter_leaves_other_messages_dead_lettered():
+    subscriber, publisher = _FakeSubscriber(_dead_letters()), _FakePublisher()
+    stats = Replay(subscriber, publisher, "dlq", stages=["act"], rate=0).run()
+
+    assert stats["replayed"] == 1 and stats["skipped_stage"] == 1
+    assert subscriber.acked == ["ack-m2"]
+    assert subscriber.leased == ["ack-m1"]
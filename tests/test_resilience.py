@@ -0,0 +1,83 @@
+# tests/test_resilience.py
+
+import time
+
+import pytest
+from google.api_core import exceptions as gexc
+
+from common.resilience import CircuitBreaker, CircuitOpen, Dependency, hedged
+
+
+def test_idempotent_calls_are_retried_on_transient_errors():
+    dep = Dependency("gcs")
+    dep.backoff_base = 0.001
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise gexc.ServiceUnavailable("try again")
+        return "ok"
+
+    assert dep.call(flaky, idempotent=True) == "ok"
+    assert len(calls) == 3
+
+    calls.clear()
+    with pytest.raises(gexc.ServiceUnavailable):
+        dep.call(flaky)
+    assert len(calls) == 1
+
+
+def test_breaker_opens_after_repeated_failures_and_half_opens():
+    breaker = CircuitBreaker("firestore", failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()  # the single trial call
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+
+
+def test_hedged_returns_the_faster_attempt():
+    attempts = []
+
+    def read():
+        attempts.append(1)
+        time.sleep(0.5 if len(attempts) == 1 else 0.0)
+        return len(attempts)
+
+    start = time.monotonic()
+    assert hedged(0.02, read) == 2
+    assert time.monotonic() - start < 0.4
+
+
+def test_hedged_keeps_a_success_when_the_other_attempt_failed():
+    attempts = []
+
+    def read():
+        attempts.append(1)
+        if len(attempts) == 1:
+            time.sleep(0.05)
+            return "slow but fine"
+        raise gexc.ServiceUnavailable("hedge failed")
+
+    assert hedged(0.01, read) == "slow but fine"
+
+
+def test_calls_get_the_time_left_before_the_deadline():
+    dep = Dependency("pubsub")
+    dep.deadline = 2.0
+    timeouts = []
+
+    def publish(topic, timeout=None):
+        timeouts.append(timeout)
+
+    dep.call(publish, "t")
+    assert 0 < timeouts[0] <= 2.0
+    dep.call(publish, "t", timeout=0.5)
+    assert timeouts[1] == 0.5
@@ -0,0 +1,108 @@
+# tests/test_rule_stats.py
+
+import pytest
+
+from common.rule_stats import NotApplied, RuleStats, summarize
+from common.rules import compile_rules
+
+RULES = [
+    {
+        "id": "pdfs",
+        "priority": 0,
+        "conditions": [{"type": "extension", "value": "pdf"}],
+        "actions": [],
+    },
+    {
+        "id": "reports",
+        "priority": 1,
+        "conditions": [{"type": "name_contains", "value": "report"}],
+        "actions": [],
+    },
+]
+
+
+def test_first_match_records_evaluations_and_hits():
+    stats = RuleStats(lambda deltas: None)
+    ruleset = compile_rules(RULES)
+
+    assert ruleset.first_match({"name": "q1-report.csv"}, stats=stats)["id"] == (
+        "reports"
+    )
+    assert ruleset.first_match({"name": "a.pdf"}, stats=stats)["id"] == "pdfs"
+    assert ruleset.first_match({"name": "photo.png"}, stats=stats) is None
+
+    pending = stats.pending()
+    # The extension-pinned rule is only tested on .pdf files
+    assert pending["pdfs"]["evaluations"] == 1
+    assert pending["pdfs"]["hits"] == 1
+    # Not tested once the pdf rule matched
+    assert pending["reports"]["evaluations"] == 2
+    assert pending["reports"]["hits"] == 1
+    assert pending["reports"]["eval_ns"] > 0
+
+
+def test_failed_flush_keeps_counts_for_the_next_round():
+    flushed = []
+
+    def flusher(deltas):
+        if not flushed:
+            flushed.append(None)
+            raise NotApplied("firestore unavailable")
+        flushed.append(deltas)
+
+    stats = RuleStats(flusher)
+    stats.record([("r1", True, 100)])
+    with pytest.raises(NotApplied):
+        stats.flush()
+    stats.record([("r1", False, 50)])
+
+    assert stats.flush() == 1
+    assert flushed[-1] == {"r1": {"evaluations": 2, "hits": 1, "eval_ns": 150}}
+    assert stats.flush() == 0
+
+
+def test_partial_flush_retries_only_the_uncommitted_batches():
+    committed, calls = [], []
+
+    def flusher(deltas):
+        calls.append(deltas)
+        if len(calls) == 2:
+            raise NotApplied("second batch failed")
+        committed.append(deltas)
+
+    stats = RuleStats(flusher, batch_size=2)
+    stats.record([("r1", True, 10), ("r2", False, 10), ("r3", True, 10)])
+    with pytest.raises(NotApplied):
+        stats.flush()
+
+    # r1 and r2 were committed; counting them again would double them
+    assert sorted(committed[0]) == ["r1", "r2"]
+    assert sorted(stats.pending()) == ["r3"]
+    assert stats.flush() == 1
+    assert committed[-1] == {"r3": {"evaluations": 1, "hits": 1, "eval_ns": 10}}
+
+
+def test_batch_that_may_have_landed_is_not_counted_again():
+    calls = []
+
+    def flusher(deltas):
+        calls.append(deltas)
+        if len(calls) == 2:
+            raise RuntimeError("deadline exceeded")
+
+    stats = RuleStats(flusher, batch_size=2)
+    stats.record([(f"r{i}", True, 10) for i in range(1, 6)])
+    with pytest.raises(RuntimeError):
+        stats.flush()
+
+    # r3 and r4 are dropped (at most once); r5 was never handed over
+    assert sorted(calls[1]) == ["r3", "r4"]
+    assert sorted(stats.pending()) == ["r5"]
+
+
+def test_summarize_reports_rates_and_costs():
+    summary = summarize({"evaluations": 200, "hits": 50, "eval_ns": 400_000})
+    assert summary["hit_rate"] == 0.25
+    assert summary["avg_eval_us"] == 2.0
+    assert summary["total_eval_ms"] == 0.4
+    assert summarize(None)["hit_rate"] is None
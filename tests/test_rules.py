@@ -0,0 +1,166 @@
+# tests/test_rules.py
+
+from common.rules import (
+    METADATA_ATTRIBUTES,
+    STAGE_ACT,
+    STAGE_CLASSIFY,
+    STAGE_INSPECT,
+    RuleSetCache,
+    compile_rules,
+    explain_rule,
+    rule_matches,
+)
+
+RULES = [
+    {
+        "id": "big-csv",
+        "priority": 0,
+        "conditions": [
+            {"type": "extension", "value": "csv"},
+            {"type": "size_gt_mb", "value": "1"},
+        ],
+        "actions": [],
+    },
+    {
+        "id": "reports",
+        "priority": 1,
+        "conditions": [{"type": "name_contains", "value": "Report"}],
+        "actions": [],
+    },
+    {
+        "id": "disabled",
+        "priority": 2,
+        "enabled": False,
+        "conditions": [],
+        "actions": [],
+    },
+    {
+        "id": "catch-all",
+        "priority": 3,
+        "conditions": [{"type": "size_lt_mb", "value": "not-a-number"}],
+        "actions": [],
+    },
+]
+
+
+def test_compiled_ruleset_agrees_with_rule_matches():
+    """
+    The compiled ruleset must pick the same rule as sequential rule_matches().
+    """
+    ruleset = compile_rules(RULES)
+    files = [
+        {"name": "uploads/data.csv", "ext": ".csv", "file_size": 5 * 1024 * 1024},
+        {"name": "uploads/small.csv", "ext": ".csv", "file_size": 10},
+        {"name": "uploads/q1-report.pdf", "ext": ".pdf", "file_size": 10},
+        {"name": "uploads/photo.png", "ext": ".png", "file_size": 0},
+    ]
+    for meta in files:
+        expected = next((r for r in RULES if rule_matches(r, meta)), None)
+        assert ruleset.first_match(meta) is expected
+
+
+def test_ruleset_cache_is_per_tenant():
+    loads = []
+
+    def loader(tenant_id):
+        loads.append(tenant_id)
+        return [
+            r
+            for r in RULES
+            if r["id"] == ("reports" if tenant_id == "a" else "big-csv")
+        ]
+
+    cache = RuleSetCache(loader, ttl_seconds=60)
+    assert cache.get("a").first_match({"name": "Q1 report.pdf"})["id"] == "reports"
+    assert cache.get("b").first_match({"name": "Q1 report.pdf"}) is None
+    cache.get("a")
+    assert loads == ["a", "b"]
+
+    cache.invalidate("a")
+    cache.get("a")
+    assert loads == ["a", "b", "a"]
+
+
+def test_route_skips_stages_only_when_metadata_decides_the_file():
+    ruleset = compile_rules(
+        [
+            {
+                "priority": 0,
+                "conditions": [{"type": "extension", "value": "log"}],
+                "actions": [{"type": "delete", "value": "true"}],
+            },
+            {
+                "priority": 1,
+                "conditions": [{"type": "name_contains", "value": "invoice"}],
+                "actions": [{"type": "move_to_folder", "value": "finance"}],
+            },
+            {
+                "priority": 2,
+                "conditions": [{"type": "size_gt_mb", "value": "100"}],
+                "actions": [{"type": "compress", "value": "zstd"}],
+            },
+        ]
+    )
+    with_content = METADATA_ATTRIBUTES | {"content"}
+
+    assert ruleset.route({"name": "app.log", "file_size": 10}) == STAGE_ACT
+    assert ruleset.route({"name": "invoice-7.pdf", "file_size": 10}) == STAGE_ACT
+    # Compression and the default classification folder need the real MIME
+    big = {"name": "dump.bin", "file_size": 200 * 1024 * 1024}
+    assert ruleset.route(big) == STAGE_INSPECT
+    assert ruleset.route({"name": "cat.png", "file_size": 10}) == STAGE_INSPECT
+    assert ruleset.route({"name": "cat.png", "file_size": 10}, with_content) == (
+        STAGE_CLASSIFY
+    )
+
+    # Any rule change gives a new version
+    rules = [c.rule for c in ruleset.rules]
+    assert compile_rules(rules).version == ruleset.version
+    rules[1] = dict(rules[1], actions=[{"type": "tag", "value": "finance"}])
+    assert compile_rules(rules).version != ruleset.version
+
+
+def test_explain_names_the_rejecting_condition():
+    ruleset = compile_rules(RULES)
+    meta = {"name": "uploads/small.csv", "ext": ".csv", "file_size": 10}
+    explained = {e["id"]: e for e in ruleset.explain(meta)}
+
+    assert explained["big-csv"]["rejected_by"]["type"] == "size_gt_mb"
+    assert explained["reports"]["rejected_by"]["type"] == "name_contains"
+    assert explained["disabled"]["rejected_by"]["type"] == "enabled"
+    assert explained["catch-all"]["matched"] and explained["catch-all"]["selected"]
+    # Agrees with the matcher for every rule
+    for rule in RULES:
+        assert (explain_rule(rule, meta) is None) == rule_matches(rule, meta)
+
+
+def test_archive_conditions_need_a_listed_archive():
+    rules = [
+        {
+            "id": "workbooks",
+            "priority": 0,
+            "conditions": [{"type": "archive_contains", "value": "XL/workbook.xml"}],
+            "actions": [],
+        },
+        {
+            "id": "bulk",
+            "priority": 1,
+            "conditions": [{"type": "archive_entries_gt", "value": "100"}],
+            "actions": [],
+        },
+    ]
+    ruleset = compile_rules(rules)
+    files = [
+        {"name": "a.xlsx", "archive_names": ["xl/workbook.xml"], "archive_entries": 9},
+        {"name": "b.zip", "archive_names": ["x.csv"], "archive_entries": 5000},
+        {"name": "c.zip", "archive_names": [], "archive_entries": 0},
+        {"name": "d.csv"},
+    ]
+    picked = [(ruleset.first_match(meta) or {}).get("id") for meta in files]
+    assert picked == ["workbooks", "bulk", None, None]
+    for meta in files:
+        for rule in rules:
+            assert rule_matches(rule, meta) == (explain_rule(rule, meta) is None)
+    assert explain_rule(rules[0], files[3])["reason"] == "not a listed archive"
+    # Entries are only known after the inspect stage reads the archive
+    assert ruleset.route({"name": "a.xlsx", "file_size": 10}) == STAGE_INSPECT
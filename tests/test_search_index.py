@@ -0,0 +1,57 @@
+# tests/test_search_index.py
+
+import datetime as dt
+
+from common.search_index import SearchIndex, display_name
+
+
+def _record(job_id, blob, classification, day, **extra):
+    return {
+        "job_id": job_id,
+        "tenant_id": "acme",
+        "completed_at": dt.datetime(2026, 3, day, tzinfo=dt.timezone.utc),
+        "action": "move",
+        "source_bucket": "drbfo-uploads",
+        "source_blob": blob,
+        "dest_bucket": "drbfo-organized",
+        "dest_blob": f"{classification}/{blob.rsplit('/', 1)[-1]}",
+        "classification": classification,
+        "rule_id": extra.get("rule_id", "r1"),
+        "tags": extra.get("tags", []),
+    }
+
+
+def test_display_name_strips_the_upload_prefix():
+    assert display_name("uploads/" + "a" * 32 + "__Q1 Report.xlsx") == "Q1 Report.xlsx"
+    assert display_name("inbox/scan.pdf") == "scan.pdf"
+
+
+def test_search_by_prefix_substring_and_filters():
+    index = SearchIndex()
+    index.upsert(
+        [
+            _record("j1", "uploads/" + "a" * 32 + "__Invoice-2026-03.pdf", "pdfs", 1),
+            _record(
+                "j2", "uploads/q1_invoices.csv", "spreadsheets", 2, tags=["finance"]
+            ),
+            _record("j3", "uploads/cat.png", "images", 3, rule_id="r2"),
+            {**_record("j4", "uploads/invoice.pdf", "pdfs", 4), "tenant_id": "globex"},
+        ]
+    )
+
+    def ids(**kwargs):
+        return [r["job_id"] for r in index.search("acme", **kwargs)]
+
+    assert ids(q="INVOICE", mode="prefix") == ["j1"]
+    # Substring matches anywhere, newest first; other tenants never match
+    assert ids(q="invoice") == ["j2", "j1"]
+    assert ids(q="invoice", classification="pdfs") == ["j1"]
+    assert ids(q="financ") == ["j2"]
+    assert ids(q="at") == ["j3"]
+    assert ids(rule_id="r2") == ["j3"]
+    assert ids(since="2026-03-02", until="2026-03-03") == ["j2"]
+
+    # Re-processing a file replaces its row
+    index.upsert([_record("j3", "uploads/cat.png", "archive", 5)])
+    assert index.count() == 4
+    assert index.search("acme", q="cat.png")[0]["classification"] == "archive"
@@ -0,0 +1,62 @@
+# tests/test_tracing.py
+
+import json
+
+import pytest
+
+from common import messages, tracing
+from common.resilience import Dependency
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    spans = []
+    monkeypatch.setattr(tracing, "_exporter", spans.append)
+    return spans
+
+
+def test_parse_traceparent():
+    tp = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    assert tracing.parse_traceparent(tp) == (
+        "4bf92f3577b34da6a3ce929d0e0e4736",
+        "00f067aa0ba902b7",
+        True,
+    )
+    assert tracing.parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+    assert tracing.parse_traceparent("garbage") is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_trace_continues_across_a_pubsub_hop(exported):
+    event = {"job_id": "b__a.csv", "bucket": "b", "blob": "a.csv"}
+    with tracing.span("api upload") as upload:
+        data, attributes = messages.encode(event)
+    assert attributes["traceparent"] == upload.traceparent
+
+    payload = messages.decode(data, attributes)
+    with tracing.span("inspect", parent=payload["traceparent"]):
+        Dependency("gcs").call(lambda: None)
+
+    root, call, inspect = exported
+    assert root["parent_id"] is None
+    assert inspect["trace_id"] == root["trace_id"]
+    assert inspect["parent_id"] == root["span_id"]
+    assert call["parent_id"] == inspect["span_id"]
+    assert call["attributes"]["dependency"] == "gcs"
+
+
+def test_failed_span_is_exported_as_error(exported):
+    with pytest.raises(ValueError):
+        with tracing.span("act"):
+            raise ValueError("boom")
+    assert exported[0]["status"] == "error"
+    assert "boom" in exported[0]["attributes"]["error"]
+
+
+def test_file_exporter_writes_json_lines(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "_exporter", tracing.FileExporter(str(path)))
+    with tracing.span("classify", job_id="j1"):
+        pass
+    (line,) = path.read_text().splitlines()
+    assert json.loads(line)["attributes"] == {"job_id": "j1"}
@@ -15,16 +15,33 @@ interface ActivityPanelProps {
   apiBase: string;
 }
 
+const MAX_EVENTS = 20;
+
+// Newest first, one row per job
+function mergeEvents(
+  current: ActivityEvent[],
+  updates: ActivityEvent[]
+): ActivityEvent[] {
+  const byId = new Map(current.map((ev) => [ev.id, ev]));
+  for (const ev of updates) byId.set(ev.id, ev);
+  return Array.from(byId.values())
+    .sort(
+      (a, b) => new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime()
+    )
+    .slice(0, MAX_EVENTS);
+}
+
 export function ActivityPanel({ apiBase }: ActivityPanelProps) {
   const [events, setEvents] = useState<ActivityEvent[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [live, setLive] = useState(false);
 
   async function loadActivity() {
     setLoading(true);
     setError(null);
     try {
-      const res = await fetch(`${apiBase}/activity?limit=20`);
+      const res = await fetch(`${apiBase}/activity?limit=${MAX_EVENTS}`);
       if (!res.ok) throw new Error(`Failed to load activity (${res.status})`);
       const data = (await res.json()) as ActivityEvent[];
       setEvents(data);
@@ -37,6 +54,23 @@ export function ActivityPanel({ apiBase }: ActivityPanelProps) {
 
   useEffect(() => {
     loadActivity();
+
+    // Live updates; the browser reconnects on its own if the stream drops
+    const source = new EventSource(`${apiBase}/activity/stream`);
+    source.onopen = () => setLive(true);
+    source.onerror = () => setLive(false);
+    source.addEventListener("snapshot", (msg) => {
+      const snapshot = JSON.parse((msg as MessageEvent).data) as ActivityEvent[];
+      setEvents((current) => mergeEvents(current, snapshot));
+    });
+    source.addEventListener("activity", (msg) => {
+      const ev = JSON.parse((msg as MessageEvent).data) as ActivityEvent;
+      setEvents((current) => mergeEvents(current, [ev]));
+    });
+    // We fell behind and missed updates: start over from the full list
+    source.addEventListener("dropped", () => loadActivity());
+
+    return () => source.close();
   }, [apiBase]);
 
   return (
@@ -66,6 +100,9 @@ export function ActivityPanel({ apiBase }: ActivityPanelProps) {
           {loading && (
             <span style={{ fontSize: 11, color: "#6b7280" }}>Loading...</span>
           )}
+          {live && (
+            <span style={{ fontSize: 11, color: "#4ade80" }}>● Live</span>
+          )}
           <button
             type="button"
             onClick={loadActivity}
@@ -4,13 +4,18 @@ export type ConditionType =
   | "extension"
   | "name_contains"
   | "size_gt_mb"
-  | "size_lt_mb";
+  | "size_lt_mb"
+  | "archive_contains"
+  | "archive_entries_gt";
 
 export type ActionType =
   | "move_to_folder"
   | "tag"
   | "delete"
-  | "copy_to_bucket";
+  | "copy_to_bucket"
+  | "storage_class"
+  | "hold"
+  | "compress";
 
 export interface RuleCondition {
   type: ConditionType;
@@ -41,13 +46,21 @@ const CONDITION_OPTIONS: { label: string; value: ConditionType }[] = [
   { label: "Name contains", value: "name_contains" },
   { label: "Size > (MB)", value: "size_gt_mb" },
   { label: "Size < (MB)", value: "size_lt_mb" },
+  {
+    label: "Archive has entry containing (first 1000 entry names only)",
+    value: "archive_contains",
+  },
+  { label: "Archive entries >", value: "archive_entries_gt" },
 ];
 
 const ACTION_OPTIONS: { label: string; value: ActionType }[] = [
   { label: "Move to folder", value: "move_to_folder" },
   { label: "Add tag", value: "tag" },
   { label: "Delete", value: "delete" },
-  { label: "Copy to bucket", value: "copy_to_bucket" },
+  { label: "Copy to bucket (bucket or bucket/folder; repeatable)", value: "copy_to_bucket" },
+  { label: "Storage class (NEARLINE, COLDLINE, ARCHIVE)", value: "storage_class" },
+  { label: "Hold (event / temporary)", value: "hold" },
+  { label: "Compress (gzip / zstd)", value: "compress" },
 ];
 
 export function RuleForm({ initial, onSubmit }: RuleFormProps) {